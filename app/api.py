@@ -1,44 +1,47 @@
 # api.py
+import asyncio
+import hmac
 import json
-from fastapi import FastAPI, HTTPException, Request, Depends, Form, status, Body
-from pydantic import BaseModel
-from fastapi.responses import RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from starlette.middleware.sessions import SessionMiddleware
+from fastapi import APIRouter, HTTPException, Request, Depends, Form, Query, status, Body, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, root_validator
+from fastapi.responses import PlainTextResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
-from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 import logging
 from threading import Thread
 import os
 
+from backfill import BackfillConflict, BackfillError, backfill_runner, backfill_summary, create_backfill
+from backfill import DEFAULT_PARALLELISM as DEFAULT_BACKFILL_PARALLELISM, MAX_PARALLELISM as MAX_BACKFILL_PARALLELISM
+from catalog import CatalogError, apply_batch, sync_catalog
+from events import event_bus
+from executor import JOB_TYPES
+from fairshare import owner_policies, usage_report
+from profiling import MAX_SECONDS as MAX_PROFILE_SECONDS, ProfiledRoute, ProfilerBusy, collapsed, memory_diff, request_profiles, stack_sampler
+from pyworkers import validate_entrypoint
+from readmodel import job_state
 from scheduler import job_scheduler
-from models import Job, SessionLocal, User, create_user, get_user
-from passlib.context import CryptContext
+from simulate import DEFAULT_DURATION, DEFAULT_WORKERS, MAX_HOURS as MAX_SIMULATION_HOURS, load_jobs, simulate
+from serialization import JSONResponseClass, dumps, loads, parse_cached
+from stats import GLOBAL_JOB_ID, GRANULARITIES, MAX_BUCKETS, sparklines, stats_report
+from startup import startup_report
+from tracing import span
+from models import Backfill, Job, JobDeletion, OwnerQuota, SessionLocal, User, create_user, current_change_version, get_user, password_context
 
-# Configure FastAPI app
-app = FastAPI()
+class AdminProfiledRoute(ProfiledRoute):
+    # Requests with "X-Profile: 1" are profiled for admins (bearer token) only
+    def authorize(self, request: Request):
+        return bearer_admin(request.headers.get("authorization")) is not None
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],  # Allow React app
-    allow_credentials=True,
-    allow_methods=["*"],  # Allow all HTTP methods
-    allow_headers=["*"],  # Allow all headers
-)
-
-# Add session middleware with environment variable
-app.add_middleware(SessionMiddleware, secret_key=os.environ.get("SECRET_KEY", "default-secret-key"))
-
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Every route; app.create_app() builds the application around it
+router = APIRouter(route_class=AdminProfiledRoute)
 
 # Configure templates
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory="templates")
 
 logger = logging.getLogger('uvicorn.error')
 logger.setLevel(logging.DEBUG)
@@ -49,9 +52,24 @@ class StatusUpdate(BaseModel):
 # Pydantic model for job creation
 class JobModel(BaseModel):
     name: str
-    schedule: str  # JSON string for cron parameters, e.g., '{"minute": "*/5"}'
+    schedule: str  # JSON string: cron fields, e.g. '{"minute": "*/5"}', or an interval/date/file/webhook trigger
     command: str
     dependencies: list[int] = []  # List of job IDs
+    job_type: str = "shell"  # "shell", or "python" where command is a 'module:callable' entrypoint
+    timeout: Optional[int] = None  # Seconds; None uses the default/adaptive limit, 0 disables it
+    owner: Optional[str] = None  # User or team for fair sharing; defaults to the creator, kept on update
+
+    @root_validator(skip_on_failure=True)
+    def check_job_type(cls, values):
+        if values["job_type"] not in JOB_TYPES:
+            raise ValueError(f"job_type must be one of {JOB_TYPES}")
+        if values["job_type"] == "python":
+            validate_entrypoint(values["command"])
+        if values["timeout"] is not None and values["timeout"] < 0:
+            raise ValueError("timeout must be 0 (no limit) or a number of seconds")
+        if values["owner"] is not None and not values["owner"].strip():
+            raise ValueError("owner must be a user or team name")
+        return values
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/login")
 
@@ -77,17 +95,17 @@ def require_authentication(token: str = Depends(oauth2_scheme)):
         )
 
 # Health Check Endpoint
-@app.get("/health")
+@router.get("/health")
 def health_check():
     return {"status": "success"}
 
 # Route: Login Page
-@app.get("/login")
+@router.get("/login")
 def login_form(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 # Route: Handle Login
-@app.post("/login")
+@router.post("/login")
 def login(request: Request, username: str = Form(...), password: str = Form(...)):
     print("login function called")
     session = SessionLocal()
@@ -101,24 +119,17 @@ def login(request: Request, username: str = Form(...), password: str = Form(...)
     logger.info(f"User '{username}' logged in successfully.")
     session.close()
     print("redirecting to dashboard")
-    return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
+    return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
 # Route: Logout
-@app.get("/logout")
+@router.get("/logout")
 def logout(request: Request):
     request.session.pop("user", None)
     logger.info("User logged out.")
     return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
-# Route: Dashboard
-@app.get("/dashboard")
-def dashboard(request: Request, user: User = Depends(require_authentication)):
-    print("dashboard function called")
-    print("User:", user)
-    return templates.TemplateResponse("dashboard.html", {"request": request, "user": user})
-
 # Route: Create Job
-@app.post("/jobs")
+@router.post("/jobs")
 def create_job(job: JobModel, user: str = Depends(require_authentication)):
     session = SessionLocal()
     existing_job = session.query(Job).filter(Job.name == job.name).first()
@@ -130,8 +141,11 @@ def create_job(job: JobModel, user: str = Depends(require_authentication)):
         name=job.name,
         schedule=job.schedule,
         command=job.command,
+        job_type=job.job_type,
+        timeout=job.timeout,
         dependencies=json.dumps(job.dependencies),
-        status="scheduled"
+        status="scheduled",
+        owner=job.owner or user,
     )
     session.add(new_job)
     session.commit()
@@ -141,52 +155,482 @@ def create_job(job: JobModel, user: str = Depends(require_authentication)):
     # Schedule the job
     job_scheduler.schedule_job(new_job)
     
+    job_scheduler.publish(new_job.id, "created", name=new_job.name)
+    
     logger.info(f"Job '{new_job.name}' created with ID {new_job.id}.")
     return {"message": f"Job '{new_job.name}' created successfully.", "job_id": new_job.id}
 
+def serialize_job(job: Job):
+    try:
+        logs = loads(job.logs) if job.logs else []
+    except json.JSONDecodeError:
+        logs = []
+        logger.error(f"Invalid JSON in logs for job {job.id}")
+
+    job_data = {
+        "id": job.id,
+        "name": job.name,
+        "schedule": parse_cached(job.schedule),
+        "command": job.command,
+        "job_type": job.job_type or "shell",
+        "timeout": job.timeout,
+        "dependencies": parse_cached(job.dependencies or "[]"),
+        "status": job.status,
+        "last_run": job.last_run.isoformat() if job.last_run else None,
+        "logs": logs,
+        "run_count": len(logs),
+        "version": job.version or 0,
+        "owner": job.owner,
+    }
+
+    # Calculate average execution time
+    execution_times = [log.get('execution_time') for log in logs 
+                      if isinstance(log.get('execution_time'), (int, float))]
+    job_data["average_execution_time"] = (
+        sum(execution_times) / len(execution_times) if execution_times else 0
+    )
+
+    # Get next run time from scheduler
+    next_run = job_scheduler.get_next_run_time(job.id)
+    job_data["next_run"] = next_run
+    return job_data
+
+def jobs_etag(version: int, schedule_version: int):
+    # Jobs carry next_run, which moves on every fire without a change version bump
+    return f'W/"jobs-{version}-{schedule_version}"'
+
+def etag_matches(request: Request, etag: str):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+class BatchOperation(BaseModel):
+    op: str  # "create", "update" or "delete"
+    id: Optional[int] = None  # Target job for update/delete
+    job: Optional[JobModel] = None  # Job definition for create/update
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation]
+
+class CatalogSyncRequest(BaseModel):
+    jobs: list[dict]  # Catalog entries keyed by name; dependencies may be names or IDs
+    prune: bool = False  # Delete jobs that are not in the catalog
+    dry_run: bool = False
+
+# Route: Create, update and delete many jobs in one transaction
+@router.post("/jobs:batch")
+def batch_jobs(batch: BatchRequest, user: str = Depends(require_authentication)):
+    operations = [
+        {"op": operation.op, "id": operation.id, "job": operation.job.dict() if operation.job else None}
+        for operation in batch.operations
+    ]
+    for operation in operations:
+        if operation["op"] == "create" and operation["job"] and not operation["job"]["owner"]:
+            operation["job"]["owner"] = user
+    session = SessionLocal(expire_on_commit=False)
+    try:
+        results, to_schedule, deleted_ids = apply_batch(session, operations)
+    finally:
+        session.close()
+
+    job_scheduler.schedule_jobs(to_schedule)
+    job_scheduler.delete_jobs(deleted_ids)
+
+    failed = sum(1 for result in results if not result["ok"])
+    logger.info(f"Batch of {len(results)} job operations applied ({failed} failed).")
+    return {"results": results, "failed": failed}
+
+# Route: Sync the job catalog to a declarative definition; only changed jobs are rescheduled
+@router.post("/jobs:sync")
+def sync_jobs(catalog: CatalogSyncRequest, user: str = Depends(require_authentication)):
+    session = SessionLocal(expire_on_commit=False)
+    try:
+        summary, to_schedule, to_unschedule = sync_catalog(
+            session, catalog.jobs, prune=catalog.prune, dry_run=catalog.dry_run
+        )
+    except CatalogError as e:
+        session.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        session.close()
+
+    job_scheduler.schedule_jobs(to_schedule)
+    job_scheduler.delete_jobs(to_unschedule)
+    return summary
+
 # Route: Get All Jobs
-@app.get("/jobs")
-def get_jobs(user: str = Depends(require_authentication)):
+# With ?since=<version> only jobs changed after that version are returned, plus deleted job IDs,
+# and next_runs has the next run of other jobs whose next run moved after ?schedule_since=
+# (the schedule_version of the previous response). since=0 returns the whole catalog in the
+# same shape.
+@router.get("/jobs")
+def get_jobs(
+    request: Request,
+    response: Response,
+    since: Optional[int] = None,
+    schedule_since: int = Query(0, ge=0),
+    user: str = Depends(require_authentication),
+):
     session = SessionLocal()
-    jobs = session.query(Job).all()
-    job_list = []
-    for job in jobs:
+    try:
+        # Read before the jobs, so a reschedule meanwhile is picked up by the next request
+        schedule_version = job_scheduler.schedule_version
+        version = current_change_version(session)
+        etag = jobs_etag(version, schedule_version)
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+        query = session.query(Job)
+        if since:
+            query = query.filter(Job.version > since)
+        jobs = query.all()
+        with span("serialize_jobs", **{"jobs.count": len(jobs)}):
+            job_list = [serialize_job(job) for job in jobs]
+        # Returned as a response so the list skips jsonable_encoder; it is already JSON-safe
+        if since is None:
+            return JSONResponseClass(job_list, headers={"ETag": etag})
+
+        changed_ids = {job["id"] for job in job_list}
+        deleted = set()
+        next_runs = {}
+        if since:
+            deletions = session.query(JobDeletion.job_id).filter(JobDeletion.version > since).all()
+            deleted = {job_id for (job_id,) in deletions} - changed_ids
+            next_runs = {
+                job_id: next_run
+                for job_id, next_run in job_scheduler.next_runs_since(schedule_since).items()
+                if job_id not in changed_ids and job_id not in deleted
+            }
+        return JSONResponseClass(
+            {
+                "version": version,
+                "schedule_version": schedule_version,
+                "jobs": job_list,
+                "deleted": sorted(deleted),
+                "next_runs": next_runs,
+            },
+            headers={"ETag": etag},
+        )
+    finally:
+        session.close()
+
+# Largest page GET /jobs:page returns
+MAX_PAGE_SIZE = 500
+
+def page_etag(matches, page):
+    # Changes whenever a matching job is written, created or deleted (a count and the highest
+    # version would miss one job deleted and another added), or the next run of a job on the
+    # page moves
+    catalog = hash(tuple((record.id, record.version) for record in matches))
+    schedule = hash(tuple(job_scheduler.timers.generation_of(record.id) for record in page))
+    return f'W/"jobs-page-{len(matches)}-{catalog & 0xffffffffffffffff:x}-{schedule & 0xffffffffffffffff:x}"'
+
+def load_page(session, records):
+    # Serialized jobs for records, in the same order; only these rows and their logs are read
+    rows = {job.id: job for job in session.query(Job).filter(Job.id.in_([record.id for record in records]))}
+    return [serialize_job(rows[record.id]) for record in records if record.id in rows]
+
+# Route: One page of jobs, searched and filtered on the server
+# Dashboards with large catalogs load the pages they show instead of the whole catalog.
+@router.get("/jobs:page")
+def get_jobs_page(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    q: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    owner: Optional[str] = None,
+    dependency: Optional[int] = None,
+    logs: bool = False,
+    user: str = Depends(require_authentication),
+):
+    matches = job_state.search(q, status=status_filter, owner=owner, dependency=dependency)
+    page = matches[offset:offset + limit]
+    etag = page_etag(matches, page)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    session = SessionLocal()
+    try:
+        with span("serialize_jobs", **{"jobs.count": len(page)}):
+            job_list = load_page(session, page)
+    finally:
+        session.close()
+    for job in job_list:
+        if not logs:
+            del job["logs"]  # run_count and average_execution_time summarize them
+        names = {}
+        for dependency_id in job["dependencies"]:
+            record = job_state.get(dependency_id)
+            if record is not None:
+                names[dependency_id] = record.name
+        job["dependency_names"] = names  # So cards needn't fetch the catalog to label dependencies
+    return JSONResponseClass(
+        {"total": len(matches), "offset": offset, "limit": limit, "jobs": job_list}, headers={"ETag": etag}
+    )
+
+# WebSocket: stream job state changes (status transitions, runs, next_run) to dashboards.
+# Browsers can't set headers on a WebSocket, so the JWT is passed as ?token=.
+@router.websocket("/ws/jobs")
+async def jobs_websocket(websocket: WebSocket, token: str = ""):
+    try:
+        require_authentication(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = event_bus.subscribe()
+
+    async def forward_events():
+        while True:
+            await websocket.send_text(dumps(await subscription.get()))
+
+    sender = asyncio.create_task(forward_events())
+    try:
+        while True:
+            # Nothing is expected from the client; this just notices the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        event_bus.unsubscribe(subscription)
+
+# Route: Fire-time forecast for all active jobs, with per-minute load
+@router.get("/schedule/forecast")
+def schedule_forecast(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(1000, ge=0, le=100000),
+    user: str = Depends(require_authentication),
+):
+    start = start or datetime.now().astimezone()
+    end = end or start + timedelta(hours=1)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'.")
+    if end - start > timedelta(days=7):
+        raise HTTPException(status_code=400, detail="Forecast range is limited to 7 days.")
+    return job_scheduler.forecast(start, end, limit)
+
+def _utc_naive(value: Optional[datetime]):
+    # Rollup buckets are stored as naive UTC, like last_run
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+# Route: Run statistics from the hourly/daily rollups (job_id omitted: all jobs)
+@router.get("/stats")
+def get_stats(
+    job_id: Optional[int] = Query(None, ge=1),
+    granularity: str = Query("hour"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    user: str = Depends(require_authentication),
+):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {sorted(GRANULARITIES)}.")
+    end = _utc_naive(end) or datetime.utcnow()
+    start = _utc_naive(start) or end - (timedelta(hours=24) if granularity == "hour" else timedelta(days=30))
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'.")
+    if (end - start) / GRANULARITIES[granularity] > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_BUCKETS} {granularity} buckets.")
+    session = SessionLocal()
+    try:
+        return stats_report(session, job_id if job_id is not None else GLOBAL_JOB_ID, granularity, start, end)
+    finally:
+        session.close()
+
+# Route: Recent per-job series for the dashboard sparklines
+@router.get("/stats/sparklines")
+def get_sparklines(
+    granularity: str = Query("hour"),
+    buckets: int = Query(24, ge=1, le=MAX_BUCKETS),
+    job_ids: Optional[str] = None,  # Comma-separated; only these jobs (the cards on screen)
+    user: str = Depends(require_authentication),
+):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {sorted(GRANULARITIES)}.")
+    if job_ids is not None:
         try:
-            logs = json.loads(job.logs) if job.logs else []
-        except json.JSONDecodeError:
-            logs = []
-            logger.error(f"Invalid JSON in logs for job {job.id}")
+            job_ids = {int(job_id) for job_id in job_ids.split(",") if job_id.strip()}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="job_ids must be comma-separated job IDs.")
+        if len(job_ids) > MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} job_ids per request.")
+    session = SessionLocal()
+    try:
+        return sparklines(session, granularity, buckets, datetime.utcnow(), job_ids)
+    finally:
+        session.close()
 
-        job_data = {
-            "id": job.id,
-            "name": job.name,
-            "schedule": json.loads(job.schedule),
-            "command": job.command,
-            "dependencies": json.loads(job.dependencies),
-            "status": job.status,
-            "last_run": job.last_run.isoformat() if job.last_run else None,
-            "logs": logs,
-            "run_count": len(logs),
-        }
+# Admin routes are limited to the users listed in ADMIN_USERS
+ADMIN_USERS = set(os.environ.get("ADMIN_USERS", "admin").split(","))
 
-        # Calculate average execution time
-        execution_times = [log.get('execution_time') for log in logs 
-                          if isinstance(log.get('execution_time'), (int, float))]
-        job_data["average_execution_time"] = (
-            sum(execution_times) / len(execution_times) if execution_times else 0
-        )
+def require_admin(user: str = Depends(require_authentication)):
+    if user not in ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required.")
+    return user
 
-        # Get next run time from scheduler
-        next_run = job_scheduler.get_next_run_time(job.id)
-        job_data["next_run"] = next_run
+def bearer_admin(authorization: Optional[str]):
+    # The admin an "Authorization: Bearer <token>" header belongs to, or None; for checks
+    # outside dependency injection
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    try:
+        username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+    return username if username in ADMIN_USERS else None
+
+# Route: Dashboard event stream health: subscribers and events dropped for slow ones
+@router.get("/admin/events")
+def get_event_stats(user: str = Depends(require_admin)):
+    return event_bus.stats()
+
+# Route: Where startup time went: importing modules vs. each initialization step
+@router.get("/admin/startup")
+def get_startup_report(user: str = Depends(require_admin)):
+    return startup_report.as_dict()
+
+# Route: Stack samples of every thread over the next `seconds`, as collapsed stacks (one
+# "thread;frame;...;frame count" line per stack) for flame graph tools
+@router.get("/admin/profile/stacks", response_class=PlainTextResponse)
+def profile_stacks(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    interval: float = Query(0.01, ge=0.001, le=1),
+    idle: bool = False,
+    user: str = Depends(require_admin),
+):
+    try:
+        counts, rounds = stack_sampler.sample(seconds, interval, idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(collapsed(counts), headers={"X-Profile-Samples": str(rounds)})
+
+# Route: Memory allocated over the next `seconds` and still held at the end, by source line
+@router.get("/admin/profile/memory")
+def profile_memory(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    top: int = Query(50, ge=1, le=1000),
+    frames: int = Query(1, ge=1, le=50),
+    user: str = Depends(require_admin),
+):
+    try:
+        return memory_diff.capture(seconds, top, frames)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# Route: The kept per-request profiles (requests sent with "X-Profile: 1"), newest first
+@router.get("/admin/profile/requests")
+def list_request_profiles(user: str = Depends(require_admin)):
+    return [profile.summary() for profile in request_profiles.all()]
+
+# Route: One request's profile, as a pstats file or as a text report
+@router.get("/admin/profile/requests/{profile_id}")
+def get_request_profile(
+    profile_id: int,
+    format: str = Query("pstats"),
+    sort: str = Query("cumulative"),
+    limit: int = Query(50, ge=1, le=1000),
+    user: str = Depends(require_admin),
+):
+    profile = request_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Request profile not found.")
+    if format == "pstats":
+        return Response(profile.dump(), media_type="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="request-{profile_id}.pstats"'})
+    if format != "text":
+        raise HTTPException(status_code=400, detail="format must be 'pstats' or 'text'.")
+    try:
+        return PlainTextResponse(profile.report(sort, limit))
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key '{sort}'.")
+
+# Route: Worst fire-time collisions over the next hours (checks SCHEDULER_SPREAD_WINDOW / jitter)
+@router.get("/admin/schedule/collisions")
+def schedule_collisions(
+    hours: float = Query(24, gt=0, le=168),
+    top: int = Query(10, ge=1, le=1000),
+    user: str = Depends(require_admin),
+):
+    start = datetime.now().astimezone()
+    return job_scheduler.collisions(start, start + timedelta(hours=hours), top)
+
+# Route: Capacity simulation of the current catalog over the next hours with `workers` slots
+@router.get("/admin/schedule/simulate")
+def schedule_simulate(
+    workers: int = Query(DEFAULT_WORKERS, ge=1, le=10000),
+    hours: float = Query(24, gt=0, le=MAX_SIMULATION_HOURS),
+    default_duration: float = Query(DEFAULT_DURATION, ge=0),
+    seed: int = 0,
+    user: str = Depends(require_admin),
+):
+    session = SessionLocal()
+    try:
+        jobs, event_triggered, statuses = load_jobs(session, default_duration)
+    finally:
+        session.close()
+    report = simulate(jobs, datetime.now().astimezone(), hours, workers, seed, statuses)
+    report["event_triggered_jobs"] = event_triggered
+    return report
+
+# Route: Runs, failures, wall-clock and CPU seconds per job owner over the UTC days in
+# [from, to), with each owner's fair-share weight, running limit and current demand
+@router.get("/owners/usage")
+def get_owner_usage(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    user: str = Depends(require_authentication),
+):
+    end = _utc_naive(end) or datetime.utcnow()
+    start = _utc_naive(start) or end - timedelta(days=30)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'.")
+    session = SessionLocal()
+    try:
+        return usage_report(session, start, end, job_scheduler.owner_load())
+    finally:
+        session.close()
 
-        job_list.append(job_data)
-    
-    session.close()
-    return job_list
+class OwnerQuotaModel(BaseModel):
+    weight: Optional[float] = None  # Relative share of contended run slots; None: FAIR_SHARE_DEFAULT_WEIGHT
+    max_running: Optional[int] = None  # Runs at once, 0 for no limit; None: OWNER_MAX_RUNNING
+
+    @root_validator(skip_on_failure=True)
+    def check_quota(cls, values):
+        if values["weight"] is not None and values["weight"] <= 0:
+            raise ValueError("weight must be positive")
+        if values["max_running"] is not None and values["max_running"] < 0:
+            raise ValueError("max_running must be 0 (no limit) or a number of runs")
+        return values
+
+# Route: Set an owner's fair-share weight and running limit ("-" for unowned jobs)
+@router.put("/admin/owners/{owner}")
+def set_owner_quota(owner: str, quota: OwnerQuotaModel, user: str = Depends(require_admin)):
+    owner = "" if owner == "-" else owner
+    session = SessionLocal()
+    try:
+        row = session.query(OwnerQuota).filter(OwnerQuota.owner == owner).first()
+        if row is None:
+            row = OwnerQuota(owner=owner)
+            session.add(row)
+        row.weight, row.max_running = quota.weight, quota.max_running
+        session.commit()
+    finally:
+        session.close()
+    owner_policies.invalidate()
+    job_scheduler.dispatcher.wake()
+    logger.info(f"Fair-share settings of owner '{owner or '-'}' set to weight {quota.weight}, max_running {quota.max_running}.")
+    return {"owner": owner or None, "weight": owner_policies.weight(owner), "max_running": owner_policies.max_running(owner)}
 
 # Route: Delete Job
-@app.delete("/jobs/{job_id}")
+@router.delete("/jobs/{job_id}")
 def delete_job(job_id: int, user: User = Depends(require_authentication)):
     session = SessionLocal()
     job = session.query(Job).filter(Job.id == job_id).first()
@@ -200,12 +644,13 @@ def delete_job(job_id: int, user: User = Depends(require_authentication)):
     
     # Remove the job from scheduler
     job_scheduler.delete_job(job_id)
+    job_scheduler.publish(job_id, "deleted")
     
     logger.info(f"Job '{job.name}' (ID: {job.id}) deleted.")
     return {"message": f"Job '{job.name}' deleted successfully."}
 
 # Route: Run Job Ad-Hoc
-@app.post("/jobs/{job_id}/run")
+@router.post("/jobs/{job_id}/run")
 def run_job_adhoc(job_id: int, user: str = Depends(require_authentication)):
     session = SessionLocal()
     job = session.query(Job).filter(Job.id == job_id).first()
@@ -228,8 +673,116 @@ def run_job_adhoc(job_id: int, user: str = Depends(require_authentication)):
     finally:
         session.close()
 
+# Route: Backfill the job's schedule times in [from, to) (UTC), `parallelism` runs at a time.
+# Each run gets its schedule time in $JOB_LOGICAL_TIME; progress is kept and resumed on restart.
+@router.post("/jobs/{job_id}/backfill", status_code=status.HTTP_202_ACCEPTED)
+def backfill_job(
+    job_id: int,
+    start: datetime = Query(..., alias="from"),
+    end: datetime = Query(..., alias="to"),
+    parallelism: int = Query(DEFAULT_BACKFILL_PARALLELISM, ge=1, le=MAX_BACKFILL_PARALLELISM),
+    user: str = Depends(require_authentication),
+):
+    start, end = _utc_naive(start), _utc_naive(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'.")
+    if end > datetime.utcnow():
+        raise HTTPException(status_code=400, detail="Backfills cover past schedule times only; 'to' is in the future.")
+    session = SessionLocal()
+    try:
+        job = session.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found.")
+        try:
+            backfill = create_backfill(session, job, start, end, parallelism, user)
+        except BackfillConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except BackfillError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        backfill_runner.start(backfill)
+        return backfill_summary(session, backfill)
+    finally:
+        session.close()
+
+# Route: Backfills of a job, newest first
+@router.get("/jobs/{job_id}/backfills")
+def list_job_backfills(job_id: int, user: str = Depends(require_authentication)):
+    session = SessionLocal()
+    try:
+        backfills = session.query(Backfill).filter(Backfill.job_id == job_id).order_by(Backfill.id.desc()).limit(100)
+        return [backfill_summary(session, backfill, failed_limit=0) for backfill in backfills]
+    finally:
+        session.close()
+
+def _get_backfill(session, backfill_id: int):
+    backfill = session.query(Backfill).filter(Backfill.id == backfill_id).first()
+    if not backfill:
+        raise HTTPException(status_code=404, detail="Backfill not found.")
+    return backfill
+
+# Route: Backfill progress (run counts by status, failed runs)
+@router.get("/backfills/{backfill_id}")
+def get_backfill(backfill_id: int, user: str = Depends(require_authentication)):
+    session = SessionLocal()
+    try:
+        return backfill_summary(session, _get_backfill(session, backfill_id))
+    finally:
+        session.close()
+
+# Route: Stop starting new runs; running ones finish. Pending runs are kept for /resume.
+@router.post("/backfills/{backfill_id}/cancel")
+def cancel_backfill(backfill_id: int, user: str = Depends(require_authentication)):
+    session = SessionLocal()
+    try:
+        backfill = _get_backfill(session, backfill_id)
+        if backfill.status != "running":
+            raise HTTPException(status_code=409, detail=f"Backfill is {backfill.status}.")
+        backfill_runner.cancel(session, backfill)
+        return backfill_summary(session, backfill)
+    finally:
+        session.close()
+
+# Route: Restart a cancelled or failed backfill; failed runs are retried
+@router.post("/backfills/{backfill_id}/resume")
+def resume_backfill(backfill_id: int, user: str = Depends(require_authentication)):
+    session = SessionLocal()
+    try:
+        backfill = _get_backfill(session, backfill_id)
+        if backfill.status == "complete":
+            raise HTTPException(status_code=409, detail="Backfill is already complete.")
+        if not backfill_runner.resume(session, backfill):
+            raise HTTPException(status_code=409, detail="Backfill is still running.")
+        return backfill_summary(session, backfill)
+    finally:
+        session.close()
+
+# Webhook callers either log in like any API client or send the shared WEBHOOK_TOKEN
+WEBHOOK_TOKEN = os.environ.get("WEBHOOK_TOKEN")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/login", auto_error=False)
+
+def require_webhook_authentication(request: Request, token: Optional[str] = Depends(optional_oauth2_scheme)):
+    supplied = request.headers.get("X-Webhook-Token")
+    if WEBHOOK_TOKEN and supplied and hmac.compare_digest(supplied.encode(), WEBHOOK_TOKEN.encode()):
+        return "webhook"
+    if token:
+        return require_authentication(token)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+# Route: Fire the jobs whose schedule is {"type": "webhook", "name": <name>}
+@router.post("/triggers/{name}", status_code=status.HTTP_202_ACCEPTED)
+def fire_webhook(name: str, user: str = Depends(require_webhook_authentication)):
+    job_ids = job_scheduler.trigger_webhook(name)
+    if not job_ids:
+        raise HTTPException(status_code=404, detail=f"No active job has webhook trigger '{name}'.")
+    logger.info(f"Webhook '{name}' fired jobs {job_ids}.")
+    return {"message": f"Webhook '{name}' fired {len(job_ids)} job(s).", "jobs": job_ids}
+
 # Route: Update Job Status
-@app.put("/jobs/{job_id}/status")
+@router.put("/jobs/{job_id}/status")
 def update_job_status(job_id: int, status_update: StatusUpdate, user: User = Depends(require_authentication)):
     allowed_statuses = {"scheduled", "complete", "inactive"}
     if status_update.status not in allowed_statuses:
@@ -255,13 +808,14 @@ def update_job_status(job_id: int, status_update: StatusUpdate, user: User = Dep
         # Reschedule the job
         job_scheduler.schedule_job(job)
     # If status is "complete", no action needed for scheduler
+    job_scheduler.publish(job_id, "status", status=status_update.status)
     
     session.close()
     logger.info(f"Job ID {job_id} status updated to '{status_update.status}'.")
     return {"message": f"Job ID {job_id} status updated to '{status_update.status}'."}
 
 # Route: Delete Log Entry
-@app.delete("/jobs/{job_id}/logs/{log_index}")
+@router.delete("/jobs/{job_id}/logs/{log_index}")
 def delete_log_entry(job_id: int, log_index: int, user: User = Depends(require_authentication)):
     session = SessionLocal()
     job = session.query(Job).filter(Job.id == job_id).first()
@@ -283,7 +837,7 @@ def delete_log_entry(job_id: int, log_index: int, user: User = Depends(require_a
     return {"message": f"Log entry {log_index + 1} for job '{job.name}' deleted successfully."}
 
 # Route: Purge Logs (Keep only the last 10 entries)
-@app.post("/jobs/{job_id}/purge_logs")
+@router.post("/jobs/{job_id}/purge_logs")
 def purge_logs(job_id: int, user: User = Depends(require_authentication)):
     session = SessionLocal()
     job = session.query(Job).filter(Job.id == job_id).first()
@@ -305,44 +859,32 @@ def purge_logs(job_id: int, user: User = Depends(require_authentication)):
     logger.info(f"Purged logs for job '{job.name}' (ID: {job.id}), keeping last 10 entries.")
     return {"message": f"Logs purged for job '{job.name}'. Kept the last 10 entries."}
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Utility function to verify passwords
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-# Event handler to start the scheduler when the app starts
-@app.on_event("startup")
-def startup_event():
-    logger.info("Starting the Job Scheduler...")
-    job_scheduler.start()
+    return password_context().verify(plain_password, hashed_password)
 
-# Event handler to shut down the scheduler when the app shuts down
-@app.on_event("shutdown")
-def shutdown_event():
-    logger.info("Shutting down the Job Scheduler...")
-    job_scheduler.stop()
-
-@app.get("/jobs/{job_id}")
+@router.get("/jobs/{job_id}")
 def get_job(job_id: int):
+    # Metadata and status come from the read model; only the logs are read from the database
+    job = job_state.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
     session = SessionLocal()
     try:
-        job = session.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
-        
-        # Convert dependencies from JSON string to list
-        dependencies = json.loads(job.dependencies) if job.dependencies else []
+        logs = session.query(Job.logs).filter(Job.id == job_id).scalar()
         
         return {
             "id": job.id,
             "name": job.name,
             "schedule": job.schedule,
             "command": job.command,
-            "dependencies": dependencies,
+            "job_type": job.job_type,
+            "timeout": job.timeout,
+            "dependencies": list(job.dependencies),
             "status": job.status,
             "last_run": job.last_run.isoformat() if job.last_run else None,
-            "logs": json.loads(job.logs) if job.logs else [],
+            "owner": job.owner,
+            "logs": loads(logs) if logs else [],
         }
     except Exception as e:
         logger.error(f"Error fetching job details for ID {job_id}: {e}")
@@ -358,7 +900,7 @@ class JobUpdateModel(BaseModel):
     dependencies: list[int]  # List of job IDs
 
 # Route: Update Job
-@app.put("/jobs/{job_id}")
+@router.put("/jobs/{job_id}")
 def update_job(job_id: int, job: JobModel, user: str = Depends(require_authentication)):
     session = SessionLocal()
     existing_job = session.query(Job).filter(Job.id == job_id).first()
@@ -369,7 +911,11 @@ def update_job(job_id: int, job: JobModel, user: str = Depends(require_authentic
     existing_job.name = job.name
     existing_job.schedule = job.schedule
     existing_job.command = job.command
+    existing_job.job_type = job.job_type
+    existing_job.timeout = job.timeout
     existing_job.dependencies = json.dumps(job.dependencies)
+    if job.owner is not None:
+        existing_job.owner = job.owner
     
     session.commit()
     session.refresh(existing_job)
@@ -377,6 +923,7 @@ def update_job(job_id: int, job: JobModel, user: str = Depends(require_authentic
     
     # Update the job in the scheduler
     job_scheduler.schedule_job(existing_job)
+    job_scheduler.publish(existing_job.id, "updated", name=existing_job.name)
     
     logger.info(f"Job '{existing_job.name}' (ID: {existing_job.id}) updated.")
     return {"message": f"Job '{existing_job.name}' updated successfully."}
@@ -399,7 +946,7 @@ class Token(BaseModel):
     token_type: str
 
 # New endpoint for React login
-@app.post("/api/login", response_model=Token)
+@router.post("/api/login", response_model=Token)
 async def react_login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = fake_users_db.get(form_data.username)
     if not user or user["password"] != form_data.password:
@@ -421,7 +968,7 @@ async def react_login(form_data: OAuth2PasswordRequestForm = Depends()):
 
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.delete("/jobs/{job_id}/logs")
+@router.delete("/jobs/{job_id}/logs")
 def purge_job_logs(job_id: int, user: str = Depends(require_authentication)):
     session = SessionLocal()
     job = session.query(Job).filter(Job.id == job_id).first()
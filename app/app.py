@@ -1,4 +1,88 @@
-# app_instance.py
+# app.py
+import time
+
+_imports_started = time.perf_counter()
+
+import logging
+import os
+
 from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
+from starlette.middleware.sessions import SessionMiddleware
+
+import api
+import ui
+from backfill import backfill_runner
+from catalog import CatalogError, load_catalog, sync_catalog
+from compression import CompressionMiddleware, PrecompressedStaticFiles
+from models import SessionLocal, get_engine
+from scheduler import job_scheduler
+from serialization import JSONResponseClass
+from startup import startup_report
+from tracing import TracingMiddleware
+
+startup_report.imported(_imports_started)
+
+logger = logging.getLogger('uvicorn.error')
+
+# Production build of the React app (npm run build), served with its precompressed assets
+REACT_BUILD_DIR = os.environ.get("REACT_BUILD_DIR", "job-scheduler-react/build")
+
+def create_app():
+    # The application: every route, the middleware stack and the startup/shutdown hooks.
+    # Building it touches nothing; the database and the scheduler start with the server.
+    app = FastAPI(default_response_class=JSONResponseClass)
+
+    # Allow the React dev server
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag"],  # Let the React app read the job list version
+    )
+    app.add_middleware(SessionMiddleware, secret_key=os.environ.get("SECRET_KEY", "default-secret-key"))
+    # Compress responses above COMPRESSION_MIN_SIZE (brotli when available, else gzip)
+    app.add_middleware(CompressionMiddleware)
+    # Outermost, so request spans include compression and every other middleware
+    app.add_middleware(TracingMiddleware)
+
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+    if os.path.isdir(REACT_BUILD_DIR):
+        app.mount("/ui", PrecompressedStaticFiles(directory=REACT_BUILD_DIR, html=True), name="ui")
+
+    app.include_router(api.router)
+    app.include_router(ui.router)
+    app.add_event_handler("startup", startup)
+    app.add_event_handler("shutdown", shutdown)
+    return app
+
+def startup():
+    with startup_report.phase("database"):
+        get_engine()
+    catalog_path = os.environ.get("JOB_CATALOG")
+    if catalog_path:
+        # Declarative mode: bring the database in line with the catalog file before loading jobs
+        logger.info(f"Syncing job catalog from '{catalog_path}'...")
+        with startup_report.phase("catalog_sync"):
+            session = SessionLocal(expire_on_commit=False)
+            try:
+                sync_catalog(session, load_catalog(catalog_path), prune=os.environ.get("JOB_CATALOG_PRUNE") == "1")
+            except (CatalogError, OSError) as e:
+                session.rollback()
+                logger.error(f"Failed to sync job catalog '{catalog_path}': {e}")
+            finally:
+                session.close()
+    logger.info("Starting the Job Scheduler...")
+    with startup_report.phase("scheduler"):
+        job_scheduler.start()
+    with startup_report.phase("backfills"):
+        backfill_runner.resume_all()
+    startup_report.log("API")
 
-app = FastAPI()
+def shutdown():
+    logger.info("Shutting down the Job Scheduler...")
+    backfill_runner.stop()
+    job_scheduler.stop()
@@ -0,0 +1,401 @@
+# backfill.py
+import datetime
+import json
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from sqlalchemy import func
+
+from executor import TimedOut, execute
+from fairshare import owner_key
+from forecast import fire_times_between
+from models import Backfill, BackfillRun, Job, SessionLocal
+from readmodel import job_state
+from scheduler import job_scheduler
+from timeouts import resolve_timeout, uses_history
+from tracing import span
+from triggers import EventTrigger, build_trigger
+from writebehind import run_state_writer
+
+logger = logging.getLogger('uvicorn.error')
+
+DEFAULT_PARALLELISM = int(os.environ.get("BACKFILL_PARALLELISM", "4"))
+MAX_PARALLELISM = int(os.environ.get("BACKFILL_MAX_PARALLELISM", "32"))
+MAX_RUNS = int(os.environ.get("BACKFILL_MAX_RUNS", "10000"))
+DEPENDENCY_POLL_SECONDS = 1.0  # How often runs waiting on a parent's backfill are rechecked
+# Environment variables every backfill run gets
+LOGICAL_TIME_ENV = "JOB_LOGICAL_TIME"
+BACKFILL_ID_ENV = "JOB_BACKFILL_ID"
+
+FINISHED_RUN_STATUSES = {"complete", "failed", "timed_out", "upstream_failed"}
+FAILED_RUN_STATUSES = {"failed", "timed_out", "upstream_failed"}
+
+class BackfillError(ValueError):
+    pass
+
+class BackfillConflict(BackfillError):
+    pass
+
+def _as_utc(value: datetime.datetime):
+    return value.replace(tzinfo=datetime.timezone.utc)
+
+def logical_times(schedule: str, start: datetime.datetime, end: datetime.datetime, limit: int = MAX_RUNS):
+    # The schedule's fire times in [start, end) (naive UTC), without spreading: a backfill run
+    # stands in for the schedule time itself
+    try:
+        params = json.loads(schedule)
+    except (json.JSONDecodeError, TypeError) as e:
+        raise BackfillError(f"Invalid schedule format: {e}")
+    if isinstance(params, dict) and params.get("type") == "interval" and "start_date" not in params:
+        # Intervals are otherwise counted from when the job was scheduled
+        params["start_date"] = _as_utc(start).isoformat()
+    try:
+        trigger = build_trigger(json.dumps(params))
+    except ValueError as e:
+        raise BackfillError(str(e))
+    if isinstance(trigger, EventTrigger):
+        raise BackfillError(f"Jobs with {trigger.type} triggers have no schedule times to backfill.")
+    times = [
+        fire_time.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        for fire_time in fire_times_between(trigger, _as_utc(start), _as_utc(end), limit + 1)
+    ]
+    if len(times) > limit:
+        raise BackfillError(f"Backfills are limited to {limit} runs; narrow the range.")
+    return times
+
+def create_backfill(session, job: Job, start: datetime.datetime, end: datetime.datetime,
+                    parallelism: int = DEFAULT_PARALLELISM, user: str = None):
+    # Record a backfill and one pending run per logical time; BackfillRunner.start runs it
+    times = logical_times(job.schedule, start, end)
+    if not times:
+        raise BackfillError("The job's schedule has no run times in that range.")
+    overlapping = session.query(Backfill.id).filter(
+        Backfill.job_id == job.id,
+        Backfill.status == "running",
+        Backfill.range_start < end,
+        Backfill.range_end > start,
+    ).first()
+    if overlapping:
+        raise BackfillConflict(f"Backfill {overlapping.id} of this job is already running over part of that range.")
+    backfill = Backfill(job_id=job.id, range_start=start, range_end=end, parallelism=parallelism,
+                        status="running", created_by=user)
+    session.add(backfill)
+    session.flush()
+    session.bulk_insert_mappings(BackfillRun, [
+        {"backfill_id": backfill.id, "job_id": job.id, "logical_time": logical_time, "status": "pending", "attempts": 0}
+        for logical_time in times
+    ])
+    session.commit()
+    logger.info(f"Backfill {backfill.id} of job '{job.name}': {len(times)} runs from {times[0]} to {times[-1]}.")
+    return backfill
+
+def backfill_summary(session, backfill: Backfill, failed_limit: int = 100):
+    counts = dict(
+        session.query(BackfillRun.status, func.count(BackfillRun.id))
+        .filter(BackfillRun.backfill_id == backfill.id)
+        .group_by(BackfillRun.status)
+    )
+    failed = (
+        session.query(BackfillRun)
+        .filter(BackfillRun.backfill_id == backfill.id, BackfillRun.status.in_(FAILED_RUN_STATUSES))
+        .order_by(BackfillRun.logical_time)
+        .limit(failed_limit)
+    )
+    total = sum(counts.values())
+    finished = sum(count for status, count in counts.items() if status in FINISHED_RUN_STATUSES)
+    return {
+        "id": backfill.id,
+        "job_id": backfill.job_id,
+        "from": backfill.range_start.isoformat(),
+        "to": backfill.range_end.isoformat(),
+        "parallelism": backfill.parallelism,
+        "status": backfill.status,
+        "created_by": backfill.created_by,
+        "created_at": backfill.created_at.isoformat() if backfill.created_at else None,
+        "finished_at": backfill.finished_at.isoformat() if backfill.finished_at else None,
+        "runs": total,
+        "progress": round(finished / total, 4) if total else None,
+        "counts": counts,
+        "failed_runs": [
+            {"logical_time": run.logical_time.isoformat(), "status": run.status,
+             "returncode": run.returncode, "attempts": run.attempts}
+            for run in failed
+        ],
+    }
+
+def _dependency_state(session, parents, logical_time: datetime.datetime):
+    # "ready", "wait" or "upstream_failed" for a run at logical_time. A parent only gates the
+    # run if it is itself being backfilled over that time: then the parent's run for the same
+    # or the latest earlier logical time must have completed.
+    for parent_id in parents:
+        parent_run = (
+            session.query(BackfillRun.status)
+            .join(Backfill, Backfill.id == BackfillRun.backfill_id)
+            .filter(
+                Backfill.job_id == parent_id,
+                Backfill.status != "cancelled",
+                Backfill.range_start <= logical_time,
+                Backfill.range_end > logical_time,
+                BackfillRun.logical_time <= logical_time,
+            )
+            .order_by(BackfillRun.logical_time.desc(), Backfill.id.desc())
+            .first()
+        )
+        if parent_run is None or parent_run.status == "complete":
+            continue
+        if parent_run.status in FAILED_RUN_STATUSES:
+            return "upstream_failed"
+        return "wait"
+    return "ready"
+
+class _BackfillThread:
+    # Coordinates one backfill: starts runs oldest first, up to `parallelism` at a time. Runs go
+    # through the scheduler's FairDispatcher, so they share run slots with every other run in
+    # fair order across owners and count against the job owner's running limit.
+    def __init__(self, runner, backfill_id: int, job_id: int, parallelism: int):
+        self.runner = runner
+        self.backfill_id = backfill_id
+        self.job_id = job_id
+        self.parallelism = parallelism
+        self.cancelled = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"backfill-{backfill_id}", daemon=True)
+
+    def _run(self):
+        in_flight = {}  # future -> run ID
+        try:
+            while True:
+                stopping = self.cancelled.is_set() or self.stopping.is_set()
+                remaining = 0
+                if not stopping:
+                    remaining = self._dispatch(in_flight)
+                else:
+                    self._withdraw(in_flight)
+                if not in_flight:
+                    if stopping or remaining == 0:
+                        break
+                    self.stopping.wait(DEPENDENCY_POLL_SECONDS)  # Every pending run is waiting on a parent
+                    continue
+                done, _ = wait(list(in_flight), timeout=DEPENDENCY_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    run_id = in_flight.pop(future)
+                    if not future.cancelled() and future.exception() is not None:
+                        logger.error(f"Backfill {self.backfill_id} run {run_id} failed: {future.exception()}")
+            if not self.stopping.is_set():
+                self._finish("cancelled" if self.cancelled.is_set() else None)
+        except Exception as e:
+            logger.error(f"Backfill {self.backfill_id} stopped: {e}")
+        finally:
+            self._withdraw(in_flight)
+            wait(list(in_flight))
+            self.runner._finished(self.backfill_id, self)
+
+    def _withdraw(self, in_flight):
+        # Runs still waiting for a slot stay "running" in backfill_runs and are redone on resume
+        waiting = {("backfill", run_id): future for future, run_id in in_flight.items() if not future.done()}
+        for key in job_scheduler.dispatcher.withdraw(waiting):
+            waiting[key].cancel()
+            waiting[key].set_running_or_notify_cancel()  # Done, for wait()
+
+    def _submit(self, run_id: int, logical_time: datetime.datetime, owner):
+        future = Future()
+
+        def run(job_id):
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._execute(run_id, logical_time))
+            except Exception as e:
+                future.set_exception(e)
+
+        job_scheduler.dispatcher.submit(self.job_id, owner, "backfill", run=run, key=("backfill", run_id))
+        return future
+
+    def _dispatch(self, in_flight):
+        # Start ready runs in free slots; returns how many runs are still pending
+        session = SessionLocal()
+        try:
+            job = job_state.get(self.job_id)
+            if job is None:
+                logger.error(f"Backfill {self.backfill_id}: job ID {self.job_id} was deleted; cancelling.")
+                self.cancelled.set()
+                return 0
+            pending = (
+                session.query(BackfillRun)
+                .filter(BackfillRun.backfill_id == self.backfill_id, BackfillRun.status == "pending")
+                .order_by(BackfillRun.logical_time)
+            )
+            remaining = pending.count()
+            free = self.parallelism - len(in_flight)
+            if free <= 0:
+                return remaining
+            starting = []
+            for run in pending.limit(free * 4):
+                state = _dependency_state(session, job.dependencies, run.logical_time)
+                if state == "wait":
+                    continue
+                if state == "upstream_failed":
+                    run.status = "upstream_failed"
+                    run.finished_at = datetime.datetime.utcnow()
+                    remaining -= 1
+                    continue
+                run.status = "running"
+                run.attempts = (run.attempts or 0) + 1
+                run.started_at = datetime.datetime.utcnow()
+                starting.append((run.id, run.logical_time))
+                if len(starting) == free:
+                    break
+            # Committed before the runs start, so a quick run's result can't be overwritten
+            session.commit()
+            for run_id, logical_time in starting:
+                in_flight[self._submit(run_id, logical_time, owner_key(job.owner))] = run_id
+            return remaining - len(starting)
+        finally:
+            session.close()
+
+    def _execute(self, run_id: int, logical_time: datetime.datetime):
+        logical_iso = _as_utc(logical_time).isoformat()
+        try:
+            status, returncode, end_time = self._run_once(logical_iso)
+        except Exception as e:
+            logger.error(f"Backfill {self.backfill_id} run for {logical_iso} could not run: {e}")
+            status, returncode, end_time = "failed", None, datetime.datetime.utcnow()
+        session = SessionLocal()
+        try:
+            session.query(BackfillRun).filter(BackfillRun.id == run_id).update({
+                "status": status, "returncode": returncode, "finished_at": end_time,
+            })
+            session.commit()
+        finally:
+            session.close()
+        if status != "complete":
+            logger.error(f"Backfill {self.backfill_id} run for {logical_iso} {status.replace('_', ' ')} (return code {returncode}).")
+
+    def _run_once(self, logical_iso: str):
+        job = job_state.get(self.job_id)
+        with span("backfill.run", root=True, **{"job.id": self.job_id, "backfill.id": self.backfill_id,
+                                                  "backfill.logical_time": logical_iso}):
+            timeout = resolve_timeout(job, _load_logs(self.job_id) if uses_history(job) else [])
+            env = {LOGICAL_TIME_ENV: logical_iso, BACKFILL_ID_ENV: str(self.backfill_id)}
+            start_time = datetime.datetime.utcnow()
+            result = execute(job, timeout=timeout, env=env)
+            end_time = datetime.datetime.utcnow()
+        if isinstance(result, TimedOut):
+            status = "timed_out"
+        else:
+            status = "complete" if result.returncode == 0 else "failed"
+        log_entry = {
+            "timestamp": end_time.isoformat(),
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+            "execution_time": (end_time - start_time).total_seconds(),
+            "cpu_seconds": result.cpu_seconds,
+            "timeout": timeout,
+            "timed_out": status == "timed_out",
+            "logical_time": logical_iso,
+            "backfill_id": self.backfill_id,
+        }
+        # Logged and counted like any run, without touching the job's live status
+        run_state_writer.record_run(self.job_id, status, end_time, log_entry, apply_state=False)
+        return status, result.returncode, end_time
+
+    def _finish(self, status=None):
+        session = SessionLocal()
+        try:
+            backfill = session.query(Backfill).filter(Backfill.id == self.backfill_id).first()
+            if backfill is None:
+                return
+            if status is None:
+                failed = session.query(BackfillRun.id).filter(
+                    BackfillRun.backfill_id == self.backfill_id, BackfillRun.status.in_(FAILED_RUN_STATUSES)
+                ).first()
+                status = "failed" if failed else "complete"
+            backfill.status = status
+            backfill.finished_at = datetime.datetime.utcnow()
+            session.commit()
+            logger.info(f"Backfill {self.backfill_id} of job ID {self.job_id} {status}.")
+        finally:
+            session.close()
+
+def _load_logs(job_id: int):
+    session = SessionLocal()
+    try:
+        logs = session.query(Job.logs).filter(Job.id == job_id).scalar()
+        return json.loads(logs) if logs else []
+    finally:
+        session.close()
+
+class BackfillRunner:
+    # Runs backfills in this process. Progress is kept in backfill_runs, so a backfill that was
+    # running when the process stopped picks up where it left off on the next start.
+    def __init__(self):
+        self._active = {}  # backfill ID -> _BackfillThread
+        self._lock = threading.Lock()
+
+    def start(self, backfill: Backfill):
+        with self._lock:
+            if backfill.id in self._active:
+                return False
+            worker = _BackfillThread(self, backfill.id, backfill.job_id, backfill.parallelism)
+            self._active[backfill.id] = worker
+        worker.thread.start()
+        return True
+
+    def _finished(self, backfill_id: int, worker):
+        with self._lock:
+            if self._active.get(backfill_id) is worker:
+                del self._active[backfill_id]
+
+    def is_active(self, backfill_id: int):
+        with self._lock:
+            return backfill_id in self._active
+
+    def cancel(self, session, backfill: Backfill):
+        # Pending runs stay pending, so a cancelled backfill can be resumed
+        with self._lock:
+            worker = self._active.get(backfill.id)
+        if worker is not None:
+            worker.cancelled.set()
+        backfill.status = "cancelled"
+        backfill.finished_at = datetime.datetime.utcnow()
+        session.commit()
+
+    def resume(self, session, backfill: Backfill, retry_failed: bool = True):
+        # Restart a backfill; runs interrupted mid-flight (and failed ones, with retry_failed) run again
+        if self.is_active(backfill.id):
+            return False
+        statuses = {"running"} | (FAILED_RUN_STATUSES if retry_failed else set())
+        session.query(BackfillRun).filter(
+            BackfillRun.backfill_id == backfill.id, BackfillRun.status.in_(statuses)
+        ).update({"status": "pending"}, synchronize_session=False)
+        backfill.status = "running"
+        backfill.finished_at = None
+        session.commit()
+        return self.start(backfill)
+
+    def resume_all(self):
+        # On startup: continue every backfill that was running when the process stopped
+        session = SessionLocal()
+        try:
+            resumed = 0
+            for backfill in session.query(Backfill).filter(Backfill.status == "running").all():
+                if self.resume(session, backfill, retry_failed=False):
+                    resumed += 1
+            if resumed:
+                logger.info(f"Resumed {resumed} backfills.")
+        finally:
+            session.close()
+
+    def stop(self):
+        # Stop dispatching; in-flight runs finish and the backfills stay "running" for resume_all
+        with self._lock:
+            workers = list(self._active.values())
+        for worker in workers:
+            worker.stopping.set()
+        for worker in workers:
+            worker.thread.join(timeout=5)
+
+# Create a singleton runner for the API process.
+backfill_runner = BackfillRunner()
@@ -0,0 +1,349 @@
+# catalog.py
+import argparse
+import json
+import logging
+
+from sqlalchemy.orm import defer
+
+from executor import JOB_TYPES
+from models import Job, SessionLocal
+from pyworkers import validate_entrypoint
+from triggers import build_trigger
+
+try:
+    import yaml
+except ImportError:  # YAML catalogs are optional; JSON catalogs always work
+    yaml = None
+
+logger = logging.getLogger('uvicorn.error')
+
+CATALOG_STATUSES = {"scheduled", "inactive"}
+
+class CatalogError(ValueError):
+    pass
+
+def normalize_schedule(schedule):
+    # Accept a cron dict or its JSON string and store the JSON string form
+    if isinstance(schedule, dict):
+        schedule = json.dumps(schedule)
+    if not isinstance(schedule, str):
+        raise CatalogError("Schedule must be a JSON object or string.")
+    try:
+        build_trigger(schedule)
+    except ValueError as e:
+        raise CatalogError(str(e))
+    return schedule
+
+def same_schedule(left, right):
+    try:
+        return json.loads(left) == json.loads(right)
+    except (json.JSONDecodeError, TypeError):
+        return left == right
+
+def validate_job_fields(data):
+    if not isinstance(data, dict):
+        raise CatalogError("Job definition must be an object.")
+    name = data.get("name")
+    if not name or not isinstance(name, str):
+        raise CatalogError("Job name is required.")
+    command = data.get("command")
+    if not command or not isinstance(command, str):
+        raise CatalogError(f"Job '{name}' needs a command.")
+    dependencies = data.get("dependencies") or []
+    if not isinstance(dependencies, list) or not all(isinstance(dep, int) for dep in dependencies):
+        raise CatalogError(f"Dependencies of job '{name}' must be a list of job IDs.")
+    fields = {
+        "name": name,
+        "schedule": normalize_schedule(data.get("schedule")),
+        "command": command,
+        "job_type": validate_job_type(name, data.get("job_type", "shell"), command),
+        "timeout": validate_timeout(name, data.get("timeout")),
+        "dependencies": json.dumps(dependencies),
+    }
+    if data.get("owner") is not None:
+        # Left out, an update keeps the job's owner
+        fields["owner"] = validate_owner(name, data["owner"])
+    return fields
+
+def validate_job_type(name, job_type, command):
+    if job_type not in JOB_TYPES:
+        raise CatalogError(f"job_type of job '{name}' must be one of {JOB_TYPES}.")
+    if job_type == "python":
+        try:
+            validate_entrypoint(command)
+        except ValueError as e:
+            raise CatalogError(f"Job '{name}': {e}")
+    return job_type
+
+def validate_timeout(name, timeout):
+    if timeout is None:
+        return None
+    if not isinstance(timeout, int) or isinstance(timeout, bool) or timeout < 0:
+        raise CatalogError(f"timeout of job '{name}' must be 0 (no limit) or a number of seconds.")
+    return timeout
+
+def validate_owner(name, owner):
+    if not isinstance(owner, str) or not owner.strip():
+        raise CatalogError(f"owner of job '{name}' must be a non-empty user or team name.")
+    return owner.strip()
+
+def validate_dependencies(name, dependencies, job_id, graph):
+    # Dependencies must name jobs in `graph` (job ID -> dependency IDs) and, for an existing
+    # job, must not lead back to it
+    unknown = [dependency for dependency in dependencies if dependency not in graph]
+    if unknown:
+        raise CatalogError(f"Job '{name}' depends on unknown job IDs {unknown}.")
+    if job_id is None:
+        return
+    seen, pending = set(), list(dependencies)
+    while pending:
+        dependency = pending.pop()
+        if dependency == job_id:
+            raise CatalogError(f"Dependencies of job '{name}' form a cycle.")
+        if dependency not in seen:
+            seen.add(dependency)
+            pending.extend(graph.get(dependency, ()))
+
+def apply_batch(session, operations):
+    # Validate every operation against one snapshot of the catalog, write all valid ones in a
+    # single transaction and report a result per operation. Operations apply in order, so a
+    # job may depend on one created earlier in the batch.
+    names = {}
+    graph = {}
+    for job_id, name, dependencies in session.query(Job.id, Job.name, Job.dependencies):
+        names[name] = job_id
+        graph[job_id] = json.loads(dependencies) if dependencies else []
+    target_ids = {operation.get("id") for operation in operations if operation.get("op") in ("update", "delete")}
+    targets = {
+        job.id: job
+        for job in session.query(Job).options(defer(Job.logs)).filter(Job.id.in_(target_ids - {None}))
+    }
+
+    results = []
+    written = []
+    deleted_ids = []
+    for index, operation in enumerate(operations):
+        op = operation.get("op")
+        try:
+            if op == "create":
+                fields = validate_job_fields(operation.get("job"))
+                if fields["name"] in names:
+                    raise CatalogError("Job name already exists.")
+                dependencies = json.loads(fields["dependencies"])
+                validate_dependencies(fields["name"], dependencies, None, graph)
+                job = Job(status="scheduled", **fields)
+                session.add(job)
+                # Later operations may depend on the new job, by its ID
+                session.flush()
+            elif op == "update":
+                job = targets.get(operation.get("id"))
+                if job is None or job.id in deleted_ids:
+                    raise CatalogError("Job not found.")
+                fields = validate_job_fields(operation.get("job"))
+                if names.get(fields["name"], job.id) != job.id:
+                    raise CatalogError("Job name already exists.")
+                dependencies = json.loads(fields["dependencies"])
+                validate_dependencies(fields["name"], dependencies, job.id, graph)
+                names.pop(job.name, None)
+                for key, value in fields.items():
+                    setattr(job, key, value)
+            elif op == "delete":
+                job = targets.get(operation.get("id"))
+                if job is None or job.id in deleted_ids:
+                    raise CatalogError("Job not found.")
+                session.delete(job)
+                # Flush now so a later create can reuse the name (inserts flush before deletes)
+                session.flush()
+                names.pop(job.name, None)
+                graph.pop(job.id, None)
+                deleted_ids.append(job.id)
+            else:
+                raise CatalogError(f"Unknown operation '{op}'.")
+        except CatalogError as e:
+            results.append({"index": index, "op": op, "ok": False, "error": str(e)})
+            continue
+        if op != "delete":
+            names[job.name] = job.id
+            graph[job.id] = dependencies
+            written.append(job)
+        results.append({"index": index, "op": op, "ok": True, "job": job})
+
+    session.commit()
+    for result in results:
+        job = result.pop("job", None)
+        if job is not None:
+            result["job_id"] = job.id
+    to_schedule = [job for job in written if job.id not in deleted_ids]
+    return results, to_schedule, deleted_ids
+
+def load_catalog(path):
+    with open(path) as catalog_file:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise CatalogError("PyYAML is required to load YAML catalogs.")
+            data = yaml.safe_load(catalog_file)
+        else:
+            data = json.load(catalog_file)
+    if isinstance(data, dict):
+        data = data.get("jobs")
+    if not isinstance(data, list):
+        raise CatalogError("Catalog must be a list of jobs or an object with a 'jobs' list.")
+    return data
+
+def sync_catalog(session, entries, prune=False, dry_run=False):
+    # Diff a declarative catalog (jobs keyed by name) against the database. Returns a summary,
+    # the jobs whose trigger must be (re)added to the scheduler and the job IDs to remove from it.
+    desired = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("name"):
+            raise CatalogError("Every catalog entry needs a name.")
+        name = entry["name"]
+        if name in desired:
+            raise CatalogError(f"Job '{name}' appears more than once in the catalog.")
+        if not entry.get("command"):
+            raise CatalogError(f"Job '{name}' needs a command.")
+        status = entry.get("status", "scheduled")
+        if status not in CATALOG_STATUSES:
+            raise CatalogError(f"Status of job '{name}' must be one of {CATALOG_STATUSES}.")
+        try:
+            schedule = normalize_schedule(entry.get("schedule"))
+        except CatalogError as e:
+            raise CatalogError(f"Job '{name}': {e}")
+        desired[name] = {
+            "schedule": schedule,
+            "command": entry["command"],
+            "job_type": validate_job_type(name, entry.get("job_type", "shell"), entry["command"]),
+            "timeout": validate_timeout(name, entry.get("timeout")),
+            "status": status,
+            "dependencies": entry.get("dependencies") or [],
+            # Only managed when the catalog names an owner
+            "owner": validate_owner(name, entry["owner"]) if entry.get("owner") is not None else None,
+        }
+
+    existing = {job.name: job for job in session.query(Job).options(defer(Job.logs))}
+    created, updated, reschedule, unschedule = [], [], [], []
+    for name, spec in desired.items():
+        job = existing.get(name)
+        if job is None:
+            job = Job(name=name, schedule=spec["schedule"], command=spec["command"],
+                      job_type=spec["job_type"], timeout=spec["timeout"], dependencies="[]", status=spec["status"],
+                      owner=spec["owner"])
+            session.add(job)
+            existing[name] = job
+            created.append(job)
+            if spec["status"] != "inactive":
+                reschedule.append(job)
+            continue
+
+        changed = False
+        if not same_schedule(job.schedule, spec["schedule"]):
+            job.schedule = spec["schedule"]
+            changed = True
+            if spec["status"] != "inactive":
+                reschedule.append(job)
+        if job.command != spec["command"]:
+            job.command = spec["command"]
+            changed = True
+        if (job.job_type or "shell") != spec["job_type"]:
+            job.job_type = spec["job_type"]
+            changed = True
+        if job.timeout != spec["timeout"]:
+            job.timeout = spec["timeout"]
+            changed = True
+        if spec["owner"] is not None and job.owner != spec["owner"]:
+            job.owner = spec["owner"]
+            changed = True
+        # Run states (running/complete/failed) are left alone; only activation is declarative
+        if (job.status == "inactive") != (spec["status"] == "inactive"):
+            job.status = spec["status"]
+            changed = True
+            if spec["status"] == "inactive":
+                unschedule.append(job)
+            elif job not in reschedule:
+                reschedule.append(job)
+        if changed:
+            updated.append(job)
+
+    # New jobs need IDs before dependencies (by name or ID) can be resolved
+    session.flush()
+    resolved = {}
+    for name, spec in desired.items():
+        dependencies = []
+        for dependency in spec["dependencies"]:
+            if isinstance(dependency, str):
+                if dependency not in existing:
+                    raise CatalogError(f"Job '{name}' depends on unknown job '{dependency}'.")
+                dependency = existing[dependency].id
+            elif not isinstance(dependency, int) or isinstance(dependency, bool):
+                raise CatalogError(f"Dependencies of job '{name}' must be job names or IDs.")
+            dependencies.append(dependency)
+        resolved[name] = dependencies
+
+    # Check the catalog as it will be once applied: every dependency exists (and isn't pruned)
+    # and none leads back to its job
+    pruned = {name: job for name, job in existing.items() if prune and name not in desired}
+    graph = {
+        job.id: resolved[name] if name in resolved else (json.loads(job.dependencies) if job.dependencies else [])
+        for name, job in existing.items()
+        if name not in pruned
+    }
+    pruned_ids = {job.id: name for name, job in pruned.items()}
+    for name, job in existing.items():
+        if name in pruned:
+            continue
+        for dependency in graph[job.id]:
+            if dependency in pruned_ids:
+                raise CatalogError(f"Job '{name}' depends on job '{pruned_ids[dependency]}', which prune would delete.")
+    for name, dependencies in resolved.items():
+        validate_dependencies(name, dependencies, existing[name].id, graph)
+
+    for name, dependencies in resolved.items():
+        job = existing[name]
+        current = json.loads(job.dependencies) if job.dependencies else []
+        if current != dependencies:
+            job.dependencies = json.dumps(dependencies)
+            if job not in created and job not in updated:
+                updated.append(job)
+
+    deleted = []
+    for job in pruned.values():
+        session.delete(job)
+        deleted.append(job)
+
+    summary = {
+        "created": [job.name for job in created],
+        "updated": [job.name for job in updated],
+        "deleted": [job.name for job in deleted],
+        "unchanged": len(desired) - len(created) - len(updated),
+        "dry_run": dry_run,
+    }
+    if dry_run:
+        session.rollback()
+        return summary, [], []
+    deleted_ids = [job.id for job in deleted]
+    unschedule_ids = [job.id for job in unschedule] + deleted_ids
+    session.commit()
+    logger.info(
+        f"Catalog sync: {len(created)} created, {len(updated)} updated, "
+        f"{len(deleted)} deleted, {summary['unchanged']} unchanged."
+    )
+    return summary, reschedule, unschedule_ids
+
+def main():
+    # Sync a catalog file straight into the database. A running scheduler picks the changes up
+    # on restart; use POST /jobs:sync to apply a catalog to a live scheduler.
+    parser = argparse.ArgumentParser(description="Sync a declarative job catalog into the database.")
+    parser.add_argument("path", help="YAML or JSON catalog file")
+    parser.add_argument("--prune", action="store_true", help="delete jobs that are not in the catalog")
+    parser.add_argument("--dry-run", action="store_true", help="report the diff without writing it")
+    args = parser.parse_args()
+
+    session = SessionLocal(expire_on_commit=False)
+    try:
+        summary, _, _ = sync_catalog(session, load_catalog(args.path), prune=args.prune, dry_run=args.dry_run)
+    finally:
+        session.close()
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# compression.py
+import mimetypes
+import os
+import stat
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MINIMUM_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # Dynamic responses: fast settings. Prebuilt assets use the maximum.
+
+def choose_encoding(accept_encoding: str):
+    if brotli is not None and "br" in accept_encoding:
+        return "br"
+    if "gzip" in accept_encoding:
+        return "gzip"
+    return None
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._process, self._flush, self._finish = (
+                self._compressor.process, self._compressor.flush, self._compressor.finish
+            )
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._process = self._compressor.compress
+            self._flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+
+    def chunk(self, data: bytes, final: bool):
+        # Streamed chunks are flushed so each one reaches the client without waiting for the next
+        return self._process(data) + (self._finish() if final else self._flush())
+
+class CompressionMiddleware:
+    # Like starlette's GZipMiddleware, but prefers brotli when the client and server support it
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            if encoding:
+                await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+class _CompressionResponder:
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.initial_message = None
+        self.started = False
+        self.passthrough = False
+        self.compressor = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk shows whether to compress
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers or message["status"] in (204, 304)
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not self.started:
+            self.started = True
+            if self.passthrough or (len(body) < self.minimum_size and not more_body):
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            message["body"] = self.compressor.chunk(body, final=not more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(message["body"]))
+            await self.send(self.initial_message)
+            await self.send(message)
+        elif self.passthrough:
+            await self.send(message)
+        else:
+            message["body"] = self.compressor.chunk(body, final=not more_body)
+            await self.send(message)
+
+class PrecompressedStaticFiles(StaticFiles):
+    # Serves a built single-page app: file.br / file.gz next to a file are sent when the client
+    # accepts them, hashed build assets are cached forever, and unknown routes get index.html
+    # so client-side routing works on reload.
+    IMMUTABLE_PREFIX = "static" + os.sep  # create-react-app puts content-hashed files here
+
+    async def get_response(self, path: str, scope):
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code != 404 or "." in os.path.basename(path):
+                raise
+            return await super().get_response("index.html", scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        response = None
+        accept_encoding = request_headers.get("accept-encoding", "")
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in accept_encoding:
+                continue
+            try:
+                compressed_stat = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            if stat.S_ISREG(compressed_stat.st_mode):
+                response = FileResponse(
+                    f"{full_path}{suffix}", status_code=status_code, stat_result=compressed_stat, method=scope["method"],
+                    media_type=mimetypes.guess_type(full_path)[0] or "text/plain",
+                )
+                response.headers["Content-Encoding"] = encoding
+                break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, method=scope["method"])
+        response.headers.add_vary_header("Accept-Encoding")
+        relative_path = os.path.relpath(full_path, self.directory)
+        if relative_path.startswith(self.IMMUTABLE_PREFIX):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            # index.html and friends must be revalidated so new builds are picked up
+            response.headers["Cache-Control"] = "no-cache"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,85 @@
+# events.py
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger('uvicorn.error')
+
+# Per-subscriber queue bound; a client that falls this far behind is told to resync instead
+SUBSCRIBER_QUEUE_SIZE = 256
+
+class Subscription:
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0  # Events thrown away because the consumer fell behind
+        self.resyncs = 0  # Times that happened (each one makes the client refetch)
+
+    def offer(self, event):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            # Slow consumer: throw away its backlog and make it refetch the job list
+            self.dropped += self.queue.qsize()
+            self.resyncs += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+            return
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+class EventBus:
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        # Drops by subscribers that have since unsubscribed
+        self._dropped = 0
+        self._resyncs = 0
+
+    def subscribe(self):
+        # Must be called from the event loop that will consume the events
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.discard(subscription)
+                self._dropped += subscription.dropped
+                self._resyncs += subscription.resyncs
+        if subscription.dropped:
+            logger.info(f"Event subscriber left after dropping {subscription.dropped} events ({subscription.resyncs} resyncs).")
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stats(self):
+        # Subscribers now, and events dropped for slow subscribers since startup
+        with self._lock:
+            subscribers = list(self._subscribers)
+            dropped, resyncs = self._dropped, self._resyncs
+        return {
+            "subscribers": len(subscribers),
+            "dropped_events": dropped + sum(subscription.dropped for subscription in subscribers),
+            "slow_subscriber_resyncs": resyncs + sum(subscription.resyncs for subscription in subscribers),
+        }
+
+    def publish(self, event):
+        # Safe to call from any thread (APScheduler executor threads, API worker threads)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The subscriber's loop is closed
+                self.unsubscribe(subscription)
+
+# Create a singleton event bus shared by the scheduler and the API.
+event_bus = EventBus()
@@ -0,0 +1,90 @@
+# executor.py
+import os
+import signal
+import subprocess
+
+from pyworkers import python_pool
+from timeouts import KILL_GRACE_SECONDS
+from tracing import span
+
+JOB_TYPES = {"shell", "python"}
+
+class TimedOut(subprocess.CompletedProcess):
+    # Result of a run that was killed for exceeding its time limit
+    def __init__(self, args, returncode, stdout, stderr, timeout):
+        super().__init__(args, returncode, stdout or "", stderr or "")
+        self.timeout = timeout
+
+class _Process(subprocess.Popen):
+    # Reaps the shell with wait4(2) to keep its resource usage: CPU time of the shell and of
+    # every descendant it waited for
+    rusage = None
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            return self.pid, 0
+        if pid == self.pid:
+            self.rusage = rusage
+        return pid, status
+
+    @property
+    def cpu_seconds(self):
+        return self.rusage.ru_utime + self.rusage.ru_stime if self.rusage is not None else None
+
+def kill_process_group(process, grace: float = KILL_GRACE_SECONDS):
+    # SIGTERM the whole group (the shell and everything it started), SIGKILL whatever survives
+    # the grace period. Returns the output captured up to the kill.
+    for sig, wait in ((signal.SIGTERM, grace), (signal.SIGKILL, None)):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+        try:
+            return process.communicate(timeout=wait)
+        except subprocess.TimeoutExpired:
+            continue
+
+def run_command(command: str, timeout: float = None, env: dict = None):
+    # Own session, so the shell's children are in a process group we can kill as a unit.
+    # env adds to (not replaces) the scheduler's environment.
+    process = _Process(
+        command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, start_new_session=True,
+        env={**os.environ, **env} if env else None,
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        stdout, stderr = kill_process_group(process)
+        result = TimedOut(command, process.returncode, stdout, stderr, timeout)
+    except BaseException:
+        kill_process_group(process, grace=0)
+        raise
+    else:
+        result = subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+    result.cpu_seconds = process.cpu_seconds
+    return result
+
+def execute(job, timeout: float = None, env: dict = None):
+    # Run one job and return a CompletedProcess (returncode, stdout, stderr, cpu_seconds, None
+    # when unknown) whatever its type, or a TimedOut if it ran longer than timeout seconds.
+    # env: extra environment variables.
+    with span("execute", **{"job.type": job.job_type, "process.command": job.command}) as execute_span:
+        if timeout is not None:
+            execute_span.set_attribute("process.timeout", timeout)
+        if job.job_type == "python":
+            # command is a 'module:callable' entrypoint run in a preforked interpreter
+            try:
+                result = python_pool.run(job.command, timeout=timeout, env=env)
+            except subprocess.TimeoutExpired as e:
+                result = TimedOut(job.command, -signal.SIGKILL, e.output, e.stderr, timeout)
+                result.cpu_seconds = None  # The worker was killed before it could report
+        else:
+            result = run_command(job.command, timeout=timeout, env=env)
+        execute_span.set_attribute("process.exit_code", result.returncode)
+        if result.cpu_seconds is not None:
+            execute_span.set_attribute("process.cpu_seconds", result.cpu_seconds)
+        if isinstance(result, TimedOut):
+            execute_span.set_error(f"Timed out after {timeout:g}s")
+        return result
@@ -0,0 +1,193 @@
+# fairshare.py
+import collections
+import datetime
+import os
+import threading
+import time
+
+from sqlalchemy import func
+
+from models import Job, OwnerQuota, OwnerUsage, SessionLocal, add_counts
+
+# Owners without an OwnerQuota row (or with its fields unset) get these
+DEFAULT_WEIGHT = float(os.environ.get("FAIR_SHARE_DEFAULT_WEIGHT", "1"))
+DEFAULT_MAX_RUNNING = int(os.environ.get("OWNER_MAX_RUNNING", "0"))  # 0: no per-owner limit
+# Seconds before settings changed by another process are seen
+POLICY_REFRESH_SECONDS = float(os.environ.get("FAIR_SHARE_REFRESH_SECONDS", "5"))
+MIN_WEIGHT = 0.001
+
+UNOWNED = ""  # Owner key of jobs without an owner
+
+def owner_key(owner):
+    return owner or UNOWNED
+
+class OwnerPolicies:
+    # Weights and concurrency limits per owner, read from owner_quotas and cached
+    def __init__(self, refresh_interval: float = POLICY_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._quotas = {}
+        self._loaded = None  # None until loaded, or once invalidated
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        # Reload the settings once they are older than refresh_interval
+        with self._lock:
+            if self._loaded is None or time.monotonic() - self._loaded >= self.refresh_interval:
+                session = SessionLocal()
+                try:
+                    self._quotas = {
+                        row.owner: (row.weight, row.max_running) for row in session.query(OwnerQuota)
+                    }
+                finally:
+                    session.close()
+                self._loaded = time.monotonic()
+            return self._quotas
+
+    def _current(self, refresh=True):
+        # refresh=False never queries, for callers holding a lock others wait on (they call
+        # refresh() before taking it)
+        return self.refresh() if refresh else self._quotas
+
+    def weight(self, owner, refresh=True):
+        weight = self._current(refresh).get(owner_key(owner), (None, None))[0]
+        return max(weight if weight is not None else DEFAULT_WEIGHT, MIN_WEIGHT)
+
+    def max_running(self, owner, refresh=True):
+        limit = self._current(refresh).get(owner_key(owner), (None, None))[1]
+        return limit if limit is not None else DEFAULT_MAX_RUNNING
+
+    def configured(self):
+        return dict(self._current())
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = None
+
+# Create a singleton shared by the dispatcher, the run queue and the API.
+owner_policies = OwnerPolicies()
+
+def finish_tag(virtual_time: float, last_tag: float, weight: float):
+    # WFQ: an owner's next run finishes 1/weight after the later of now (in virtual time) and its
+    # previous run. Owners that were idle start from the current virtual time, so they get
+    # their share straight away but can't bank credit while away.
+    return max(virtual_time, last_tag or 0.0) + 1.0 / max(weight, MIN_WEIGHT)
+
+class FairQueue:
+    # Waiting runs in weighted fair order across owners. Each owner's runs stay in FIFO order;
+    # the next run is the lowest-tagged head among owners that may start one.
+    def __init__(self, weight=None):
+        self.weight = weight or owner_policies.weight
+        self.virtual_time = 0.0
+        self._last_tags = {}  # owner -> tag of its latest run
+        self._queues = {}  # owner -> deque of (tag, item)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def push(self, owner, item, weight: float = None):
+        owner = owner_key(owner)
+        weight = weight if weight is not None else self.weight(owner)
+        tag = finish_tag(self.virtual_time, self._last_tags.get(owner), weight)
+        self._last_tags[owner] = tag
+        self._queues.setdefault(owner, collections.deque()).append((tag, item))
+        self._size += 1
+        return tag
+
+    def pop(self, owner_ready=None, item_ready=None):
+        # (owner, item) of the next run, or None. owner_ready(owner) and item_ready(item) skip
+        # owners at their limit and runs that can't start yet; skipped runs keep their place.
+        best = None
+        for owner, items in self._queues.items():
+            if owner_ready is not None and not owner_ready(owner):
+                continue
+            for index, (tag, item) in enumerate(items):
+                if item_ready is None or item_ready(item):
+                    if best is None or tag < best[0]:
+                        best = (tag, owner, index)
+                    break
+        if best is None:
+            return None
+        tag, owner, index = best
+        items = self._queues[owner]
+        _, item = items[index]
+        del items[index]
+        if not items:
+            del self._queues[owner]
+        self._size -= 1
+        self.virtual_time = max(self.virtual_time, tag)
+        return owner, item
+
+    def remove(self, predicate):
+        # Drop waiting runs for which predicate(item) is true; returns how many
+        removed = 0
+        for owner in list(self._queues):
+            kept = collections.deque(entry for entry in self._queues[owner] if not predicate(entry[1]))
+            removed += len(self._queues[owner]) - len(kept)
+            if kept:
+                self._queues[owner] = kept
+            else:
+                del self._queues[owner]
+        self._size -= removed
+        return removed
+
+    def queued(self):
+        return {owner: len(items) for owner, items in self._queues.items()}
+
+def record_usage(session, runs):
+    # Add finished runs, given as (owner, finished_at, duration, cpu_seconds, status), to their
+    # owner's day. Called inside the transaction that writes the runs, like record_runs.
+    pending = {}
+    for owner, finished_at, duration, cpu_seconds, status in runs:
+        key = (owner_key(owner), finished_at.replace(hour=0, minute=0, second=0, microsecond=0))
+        totals = pending.setdefault(key, [0, 0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += status != "complete"
+        if isinstance(duration, (int, float)):
+            totals[2] += duration
+        if isinstance(cpu_seconds, (int, float)):
+            totals[3] += cpu_seconds
+    if not pending:
+        return 0
+    # Added in the database, so concurrent writers (or the first inserts of a day) can't
+    # overwrite each other
+    add_counts(session, OwnerUsage.__table__, ("owner", "day"), ("runs", "failures", "run_seconds", "cpu_seconds"), [
+        {"owner": owner, "day": day, "runs": count, "failures": failures,
+         "run_seconds": run_seconds, "cpu_seconds": cpu_seconds}
+        for (owner, day), (count, failures, run_seconds, cpu_seconds) in pending.items()
+    ])
+    return len(pending)
+
+def usage_report(session, start: datetime.datetime, end: datetime.datetime, load=None):
+    # Per owner: usage over the UTC days overlapping [start, end), job count, fair-share
+    # settings and, from load ({owner: {"running": n, "queued": n}}), current demand
+    first_day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    owners = {}
+
+    def entry(owner):
+        return owners.setdefault(owner, {
+            "owner": owner or None, "jobs": 0, "runs": 0, "failures": 0, "run_seconds": 0.0, "cpu_seconds": 0.0,
+        })
+
+    for owner, runs, failures, run_seconds, cpu_seconds in session.query(
+        OwnerUsage.owner, func.sum(OwnerUsage.runs), func.sum(OwnerUsage.failures),
+        func.sum(OwnerUsage.run_seconds), func.sum(OwnerUsage.cpu_seconds),
+    ).filter(OwnerUsage.day >= first_day, OwnerUsage.day < end).group_by(OwnerUsage.owner):
+        totals = entry(owner)
+        totals.update(runs=runs, failures=failures, run_seconds=round(run_seconds, 3), cpu_seconds=round(cpu_seconds, 3))
+    for owner, jobs in session.query(Job.owner, func.count(Job.id)).group_by(Job.owner):
+        entry(owner_key(owner))["jobs"] += jobs
+    for owner in owner_policies.configured():
+        entry(owner)
+    for owner, counts in (load or {}).items():
+        entry(owner).update(counts)
+    for owner, totals in owners.items():
+        totals.setdefault("running", 0)
+        totals.setdefault("queued", 0)
+        totals["weight"] = owner_policies.weight(owner)
+        totals["max_running"] = owner_policies.max_running(owner)
+    return {
+        "from": first_day.isoformat(),
+        "to": end.isoformat(),
+        "owners": sorted(owners.values(), key=lambda totals: (-totals["cpu_seconds"], totals["owner"] or "")),
+    }
@@ -0,0 +1,276 @@
+# filewatch.py
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+logger = logging.getLogger('uvicorn.error')
+
+# "auto": inotify on Linux, polling elsewhere. "poll": always poll (e.g. network filesystems,
+# where inotify doesn't see changes made on other hosts).
+BACKEND = os.environ.get("FILE_WATCH_BACKEND", "auto")
+POLL_INTERVAL = float(os.environ.get("FILE_WATCH_POLL_SECONDS", "2"))
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+def _load_inotify():
+    # The inotify syscalls through libc; None when unavailable (not Linux, or no libc symbols)
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        functions = libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    functions[0].argtypes, functions[0].restype = [ctypes.c_int], ctypes.c_int
+    functions[1].argtypes, functions[1].restype = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32], ctypes.c_int
+    functions[2].argtypes, functions[2].restype = [ctypes.c_int, ctypes.c_int], ctypes.c_int
+    return functions
+
+class _Watch:
+    def __init__(self, key, path: str, debounce: float, pattern: str, callback):
+        self.key = key
+        self.path = os.path.abspath(path)
+        self.debounce = debounce
+        self.callback = callback
+        if pattern is not None or os.path.isdir(self.path):
+            # A directory: any entry in it (matching pattern, if given)
+            self.directory, self.name, self.pattern = self.path, None, pattern
+        else:
+            # A file: its parent is watched, so atomic replaces (write + rename) and files that
+            # don't exist yet are seen too
+            self.directory, self.name, self.pattern = os.path.dirname(self.path), os.path.basename(self.path), None
+        self.due = None  # Monotonic time the callback is due, once a change was seen
+        self.polled = False
+        self.snapshot = None
+
+    def matches(self, name: str):
+        if self.name is not None:
+            return name == self.name
+        return self.pattern is None or not name or fnmatch.fnmatch(name, self.pattern)
+
+    def take_snapshot(self):
+        # What polling compares: the file's identity, size and mtime, or that of every matching entry
+        try:
+            if self.name is not None:
+                info = os.stat(self.path)
+                return info.st_ino, info.st_size, info.st_mtime_ns
+            entries = []
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if self.matches(entry.name):
+                        info = entry.stat(follow_symlinks=False)
+                        entries.append((entry.name, info.st_ino, info.st_size, info.st_mtime_ns))
+            return frozenset(entries)
+        except OSError:
+            return None
+
+class FileWatcher:
+    # Calls a callback once a watched file or directory has changed and then stayed quiet for
+    # the watch's debounce period. One background thread serves every watch: inotify where it
+    # is available (a single descriptor, one kernel watch per directory), stat polling
+    # every POLL_INTERVAL seconds otherwise.
+    def __init__(self, backend: str = BACKEND, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._inotify = _load_inotify() if backend != "poll" else None
+        self._fd = None
+        self._watches = {}  # key -> _Watch
+        self._directories = {}  # inotify wd -> set of keys watching that directory
+        self._wds = {}  # directory -> inotify wd
+        self._lock = threading.Lock()
+        self._wake_read, self._wake_write = None, None
+        self._thread = None
+        self._stopping = False
+        self._next_poll = 0.0
+
+    @property
+    def backend(self):
+        return "inotify" if self._inotify is not None else "poll"
+
+    def watch(self, key, path: str, debounce: float, callback, pattern: str = None):
+        # (Re)place the watch registered under key
+        watch = _Watch(key, path, debounce, pattern, callback)
+        with self._lock:
+            self._unwatch(key)
+            self._start()
+            self._watches[key] = watch
+            if not self._add_kernel_watch(watch):
+                watch.polled = True
+                watch.snapshot = watch.take_snapshot()
+        self._wake()
+        logger.info(f"Watching {watch.path}{'/' + pattern if pattern else ''} "
+                    f"({'polling' if watch.polled else 'inotify'}, debounce {debounce:g}s).")
+
+    def unwatch(self, key):
+        with self._lock:
+            found = self._unwatch(key)
+        self._wake()
+        return found
+
+    def _unwatch(self, key):
+        watch = self._watches.pop(key, None)
+        if watch is None:
+            return False
+        for wd, keys in list(self._directories.items()):
+            keys.discard(key)
+            if not keys:
+                del self._directories[wd]
+                self._wds = {directory: d for directory, d in self._wds.items() if d != wd}
+                self._inotify[2](self._fd, wd)
+        return True
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        if self._inotify is not None:
+            fd = self._inotify[0](IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                logger.warning(f"inotify unavailable ({os.strerror(ctypes.get_errno())}); polling watched files.")
+                self._inotify = None
+            else:
+                self._fd = fd
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+
+    def _add_kernel_watch(self, watch: _Watch):
+        if self._inotify is None:
+            return False
+        wd = self._wds.get(watch.directory)
+        if wd is None:
+            wd = self._inotify[1](self._fd, os.fsencode(watch.directory), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                level = logging.INFO if error == errno.ENOENT else logging.WARNING
+                logger.log(level, f"Can't watch {watch.directory} with inotify ({os.strerror(error)}); polling it.")
+                return False
+            self._wds[watch.directory] = wd
+        self._directories.setdefault(wd, set()).add(watch.key)
+        return True
+
+    def _wake(self):
+        if self._wake_write is not None:
+            try:
+                os.write(self._wake_write, b"\0")
+            except BlockingIOError:
+                pass
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stopping:
+                    self._close()
+                    return
+                timeout = self._timeout()
+            readers = [self._wake_read] + ([self._fd] if self._fd is not None else [])
+            ready, _, _ = select.select(readers, [], [], timeout)
+            if self._wake_read in ready:
+                try:
+                    while os.read(self._wake_read, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            with self._lock:
+                now = time.monotonic()
+                if self._fd is not None and self._fd in ready:
+                    self._read_events(now)
+                if now >= self._next_poll:
+                    self._poll(now)
+                due = [watch for watch in self._watches.values() if watch.due is not None and watch.due <= now]
+                for watch in due:
+                    watch.due = None
+            for watch in due:
+                try:
+                    watch.callback()
+                except Exception as e:
+                    logger.error(f"Error handling change to {watch.path}: {e}")
+
+    def _timeout(self):
+        now = time.monotonic()
+        deadlines = [watch.due for watch in self._watches.values() if watch.due is not None]
+        if any(watch.polled for watch in self._watches.values()):
+            deadlines.append(self._next_poll)
+        return max(min(deadlines) - now, 0) if deadlines else None
+
+    def _read_events(self, now: float):
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0").decode(errors="replace")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; treat every watch as changed
+                for watch in self._watches.values():
+                    watch.due = now + watch.debounce
+                continue
+            keys = self._directories.get(wd, ())
+            for key in keys:
+                watch = self._watches[key]
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF) or watch.matches(name):
+                    watch.due = now + watch.debounce  # Trailing debounce: restarts on every event
+            if mask & IN_IGNORED:
+                # The directory itself is gone; fall back to polling until it reappears
+                self._directories.pop(wd, None)
+                self._wds = {directory: d for directory, d in self._wds.items() if d != wd}
+                for key in keys:
+                    watch = self._watches[key]
+                    watch.polled = True
+                    watch.snapshot = watch.take_snapshot()
+
+    def _poll(self, now: float):
+        self._next_poll = now + self.poll_interval
+        for watch in self._watches.values():
+            if not watch.polled:
+                continue
+            snapshot = watch.take_snapshot()
+            if snapshot != watch.snapshot:
+                watch.snapshot = snapshot
+                watch.due = now + watch.debounce
+                if self._inotify is not None and os.path.isdir(watch.directory) and self._add_kernel_watch(watch):
+                    watch.polled = False  # The directory (re)appeared; back to inotify
+
+    def _close(self):
+        for fd in (self._fd, self._wake_read, self._wake_write):
+            if fd is not None:
+                os.close(fd)
+        self._fd, self._wake_read, self._wake_write = None, None, None
+        self._directories.clear()
+        self._wds.clear()
+        self._thread = None
@@ -0,0 +1,150 @@
+# forecast.py
+import datetime
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import repeat
+
+# Fire times are cached per job for the requested window rounded out to whole hours
+CACHE_ALIGNMENT = 3600
+# Upper bound on fire times computed for one job in one window (e.g. second="*" over a week)
+MAX_FIRES_PER_JOB = 10000
+
+def fire_times_between(trigger, start, end, limit=MAX_FIRES_PER_JOB):
+    # Yield the trigger's fire times in [start, end) by walking get_next_fire_time
+    previous = None
+    now = start
+    for _ in range(limit):
+        fire_time = trigger.get_next_fire_time(previous, now)
+        if fire_time is None or fire_time >= end:
+            return
+        yield fire_time
+        previous = fire_time
+        now = fire_time + datetime.timedelta(microseconds=1)
+
+class FireTimeCache:
+    def __init__(self):
+        # job_id -> (window start, window end, array of fire timestamps)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, job_id: int):
+        # Called whenever a job's trigger is added, replaced or removed
+        with self._lock:
+            self._entries.pop(job_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def fire_times(self, job_id: int, trigger, start: float, end: float):
+        # Fire timestamps of one job in [start, until), computed once per aligned window, and
+        # until: end, or the earlier time at which MAX_FIRES_PER_JOB cut the list short
+        with self._lock:
+            entry = self._entries.get(job_id)
+        if entry is None or entry[0] > start or entry[1] < end:
+            window_start = start - start % CACHE_ALIGNMENT
+            window_end = end - end % CACHE_ALIGNMENT + CACHE_ALIGNMENT
+            timezone = getattr(trigger, "timezone", datetime.timezone.utc)
+            times = array("d", (
+                fire_time.timestamp()
+                for fire_time in fire_times_between(
+                    trigger,
+                    datetime.datetime.fromtimestamp(window_start, timezone),
+                    datetime.datetime.fromtimestamp(window_end, timezone),
+                    MAX_FIRES_PER_JOB + 1,
+                )
+            ))
+            if len(times) > MAX_FIRES_PER_JOB:
+                # Truncated; the window covers the computed prefix only
+                window_end = times[MAX_FIRES_PER_JOB]
+                del times[MAX_FIRES_PER_JOB:]
+            entry = (window_start, window_end, times)
+            with self._lock:
+                self._entries[job_id] = entry
+        times = entry[2]
+        until = min(end, entry[1])
+        return times[bisect_left(times, start):bisect_left(times, until)], until
+
+def merged_fire_times(jobs, cache: FireTimeCache, start_ts: float, end_ts: float, capped=None):
+    # k-way heap merge of every job's fire times; yields (timestamp, job_id) in time order.
+    # Jobs with more than MAX_FIRES_PER_JOB fires in the window are added to `capped` as
+    # (job_id, timestamp their fires stop at).
+    streams = []
+    for job_id, _, trigger in jobs:
+        times, until = cache.fire_times(job_id, trigger, start_ts, end_ts)
+        if until < end_ts and capped is not None:
+            capped.append((job_id, until))
+        if times:
+            streams.append(zip(times, repeat(job_id)))
+    return heapq.merge(*streams)
+
+def capped_jobs(capped, names, tzinfo):
+    # Jobs whose fires were cut short, so counts and load above miss their later fires
+    return [
+        {"job_id": job_id, "name": names[job_id], "until": datetime.datetime.fromtimestamp(until, tzinfo).isoformat()}
+        for job_id, until in sorted(capped)
+    ]
+
+def forecast(jobs, cache: FireTimeCache, start: datetime.datetime, end: datetime.datetime, limit: int = 1000):
+    # jobs: list of (job_id, name, trigger). Lists fires in time order and builds a
+    # per-minute load histogram.
+    names = {job_id: name for job_id, name, _ in jobs}
+    fires = []
+    per_minute = Counter()
+    total = 0
+    capped = []
+    for timestamp, job_id in merged_fire_times(jobs, cache, start.timestamp(), end.timestamp(), capped):
+        total += 1
+        per_minute[int(timestamp // 60)] += 1
+        if len(fires) < limit:
+            fires.append({
+                "time": datetime.datetime.fromtimestamp(timestamp, start.tzinfo).isoformat(),
+                "job_id": job_id,
+                "name": names[job_id],
+            })
+
+    histogram = [
+        {"minute": datetime.datetime.fromtimestamp(minute * 60, start.tzinfo).isoformat(), "count": count}
+        for minute, count in sorted(per_minute.items())
+    ]
+    peak = max(histogram, key=lambda bucket: bucket["count"]) if histogram else None
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "total": total,
+        "truncated": total > len(fires),
+        "capped_jobs": capped_jobs(capped, names, start.tzinfo),
+        "fires": fires,
+        "histogram": histogram,
+        "peak": peak,
+    }
+
+def collisions(jobs, cache: FireTimeCache, start: datetime.datetime, end: datetime.datetime, top: int = 10):
+    # Busiest minutes and seconds in [start, end): where fires pile up on the same instant
+    per_minute = Counter()
+    per_second = Counter()
+    total = 0
+    capped = []
+    for timestamp, _ in merged_fire_times(jobs, cache, start.timestamp(), end.timestamp(), capped):
+        total += 1
+        per_minute[int(timestamp // 60)] += 1
+        per_second[int(timestamp)] += 1
+
+    def worst(counter, size):
+        return [
+            {"start": datetime.datetime.fromtimestamp(bucket * size, start.tzinfo).isoformat(), "count": count}
+            for bucket, count in counter.most_common(top)
+        ]
+
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "jobs": len(jobs),
+        "total": total,
+        "capped_jobs": capped_jobs(capped, {job_id: name for job_id, name, _ in jobs}, start.tzinfo),
+        "worst_minutes": worst(per_minute, 60),
+        "worst_seconds": worst(per_second, 1),
+    }
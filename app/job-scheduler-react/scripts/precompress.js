@@ -0,0 +1,32 @@
+// Writes .br and .gz copies of the compressible build assets, so the API can serve them
+// without compressing on every request (see PrecompressedStaticFiles in compression.py).
+const fs = require("fs");
+const path = require("path");
+const zlib = require("zlib");
+
+const BUILD_DIR = path.join(__dirname, "..", "build");
+const COMPRESSIBLE = /\.(js|css|html|json|svg|txt|map|ico)$/;
+const MINIMUM_SIZE = 1024;
+
+const walk = (dir) =>
+  fs.readdirSync(dir, { withFileTypes: true }).flatMap((entry) => {
+    const fullPath = path.join(dir, entry.name);
+    return entry.isDirectory() ? walk(fullPath) : [fullPath];
+  });
+
+let written = 0;
+for (const file of walk(BUILD_DIR)) {
+  if (!COMPRESSIBLE.test(file)) continue;
+  const content = fs.readFileSync(file);
+  if (content.length < MINIMUM_SIZE) continue;
+  // Built once, so use the slowest, smallest settings
+  fs.writeFileSync(`${file}.br`, zlib.brotliCompressSync(content, {
+    params: {
+      [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY,
+      [zlib.constants.BROTLI_PARAM_SIZE_HINT]: content.length,
+    },
+  }));
+  fs.writeFileSync(`${file}.gz`, zlib.gzipSync(content, { level: 9 }));
+  written += 1;
+}
+console.log(`Precompressed ${written} build assets in ${BUILD_DIR}`);
@@ -17,7 +17,8 @@ function App() {
   };
 
   return (
-    <Router>
+    // Served from /ui by the API in production (see "homepage" in package.json)
+    <Router basename={process.env.PUBLIC_URL}>
       <Routes>
         <Route
           path="/"
@@ -11,22 +11,135 @@ export const getJobs = async (token) => {
   return response;
 };
 
+// Local copy of the job catalog, kept current with delta requests (GET /jobs?since=<version>)
+const jobCache = {
+  version: null,
+  scheduleVersion: 0, // Next runs move without a version bump; tracked separately
+  etag: null,
+  jobs: new Map(),
+};
+
+export const resetJobCache = () => {
+  jobCache.version = null;
+  jobCache.scheduleVersion = 0;
+  jobCache.etag = null;
+  jobCache.jobs.clear();
+};
+
 export const fetchJobs = async () => {
   try {
     const token = localStorage.getItem("token");
-    console.log("Token being sent:", token);
+    const headers = {
+      Authorization: `Bearer ${token}`,
+    };
+    if (jobCache.etag !== null) {
+      headers["If-None-Match"] = jobCache.etag; // 304 when nothing changed
+    }
     const response = await axios.get(`${API_URL}/jobs`, {
-      headers: {
-        Authorization: `Bearer ${token}`,
-      },
+      headers,
+      params: { since: jobCache.version ?? 0, schedule_since: jobCache.scheduleVersion },
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
     });
-    return response.data;
+    if (response.status !== 304) {
+      const { version, schedule_version, jobs, deleted, next_runs } = response.data;
+      deleted.forEach((jobId) => jobCache.jobs.delete(jobId));
+      jobs.forEach((job) => jobCache.jobs.set(job.id, job));
+      Object.entries(next_runs).forEach(([jobId, nextRun]) => {
+        const job = jobCache.jobs.get(Number(jobId));
+        if (job) jobCache.jobs.set(job.id, { ...job, next_run: nextRun });
+      });
+      jobCache.version = version;
+      jobCache.scheduleVersion = schedule_version;
+      jobCache.etag = response.headers.etag ?? null;
+    }
+    return Array.from(jobCache.jobs.values()).sort((a, b) => a.id - b.id);
   } catch (error) {
     console.error("Error fetching jobs:", error);
     throw error; // Rethrow the error to handle it in the component
   }
 };
 
+// One page of jobs matching the dashboard filters (GET /jobs:page), searched on the server.
+// Logs are left out; run_count and average_execution_time summarize them.
+export const fetchJobPage = async ({ offset, limit, q, status, dependency }) => {
+  const token = localStorage.getItem("token");
+  const params = { offset, limit };
+  if (q) params.q = q;
+  if (status) params.status = status;
+  if (dependency) params.dependency = dependency;
+  const response = await axios.get(`${API_URL}/jobs:page`, {
+    headers: {
+      Authorization: `Bearer ${token}`,
+    },
+    params,
+  });
+  return response.data; // { total, offset, limit, jobs }
+};
+
+// One job with its logs
+export const fetchJob = async (jobId) => {
+  const token = localStorage.getItem("token");
+  const response = await axios.get(`${API_URL}/jobs/${jobId}`, {
+    headers: {
+      Authorization: `Bearer ${token}`,
+    },
+  });
+  return response.data;
+};
+
+// Per-job hourly series for the card sparklines. Cards that mount together (a page coming
+// into view) share one request for just their jobs, and each series is reused for a minute,
+// since the rollups only change as runs finish.
+const SPARKLINE_MAX_AGE_MS = 60 * 1000;
+const SPARKLINE_BATCH_LIMIT = 500; // job_ids per request, as limited by the API
+const sparklineCache = new Map(); // job ID -> { fetchedAt, request }
+let sparklineBatch = null; // Job IDs waiting for the next request
+
+const requestSparklines = (batch) => {
+  const token = localStorage.getItem("token");
+  return axios
+    .get(`${API_URL}/stats/sparklines`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+      params: { granularity: "hour", buckets: 24, job_ids: Array.from(batch.ids).join(",") },
+    })
+    .then((response) => response.data);
+};
+
+export const fetchSparkline = (jobId) => {
+  const cached = sparklineCache.get(jobId);
+  if (cached && Date.now() - cached.fetchedAt < SPARKLINE_MAX_AGE_MS) {
+    return cached.request;
+  }
+  if (!sparklineBatch || sparklineBatch.ids.size >= SPARKLINE_BATCH_LIMIT) {
+    const batch = { ids: new Set() };
+    // Sent once the cards rendered in this tick have all asked
+    batch.request = new Promise((resolve) => setTimeout(resolve, 0)).then(() => {
+      if (sparklineBatch === batch) sparklineBatch = null;
+      return requestSparklines(batch);
+    });
+    sparklineBatch = batch;
+  }
+  sparklineBatch.ids.add(jobId);
+  const request = sparklineBatch.request
+    .then((data) => data.jobs[jobId] || null)
+    .catch((error) => {
+      sparklineCache.delete(jobId); // Retry on the next call
+      console.error("Error fetching sparklines:", error);
+      throw error;
+    });
+  sparklineCache.set(jobId, { fetchedAt: Date.now(), request });
+  return request;
+};
+
+// Open the job event stream (status transitions, runs, next_run changes)
+export const openJobEvents = () => {
+  const token = localStorage.getItem("token");
+  const wsUrl = API_URL.replace(/^http/, "ws");
+  return new WebSocket(`${wsUrl}/ws/jobs?token=${encodeURIComponent(token)}`);
+};
+
 export const deleteJob = async (jobId) => {
   try {
     const token = localStorage.getItem("token");
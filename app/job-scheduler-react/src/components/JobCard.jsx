@@ -1,17 +1,57 @@
 import React, { useState, useEffect } from "react";
 import { motion } from "framer-motion";
-import { deleteJob, getJobs, runJobAdhoc, updateJobStatus } from "../api/jobService";
+import { deleteJob, fetchSparkline, runJobAdhoc, updateJobStatus } from "../api/jobService";
 import { useNavigate } from "react-router-dom";
 import { FontAwesomeIcon } from "@fortawesome/react-fontawesome";
 import { faEdit, faTrash, faArrowRight, faPlay, faFileAlt, faCopy } from "@fortawesome/free-solid-svg-icons";
 import { toast } from "react-hot-toast";
 import ConfirmationModal from "./ConfirmationModal";
 
+// Runs per hour over the last 24 hours as bars, with the p95 duration as a line on top
+const Sparkline = ({ series }) => {
+  const width = 120;
+  const height = 24;
+  const barWidth = width / series.runs.length;
+  const maxRuns = Math.max(1, ...series.runs);
+  const durations = series.p95.filter((value) => value !== null);
+  const maxDuration = Math.max(0, ...durations);
+  const total = series.runs.reduce((sum, runs) => sum + runs, 0);
+  const failures = series.failures.reduce((sum, count) => sum + count, 0);
+  const points = series.p95
+    .map((value, index) =>
+      value === null || maxDuration === 0
+        ? null
+        : `${(index + 0.5) * barWidth},${height - (value / maxDuration) * (height - 2) - 1}`
+    )
+    .filter((point) => point !== null)
+    .join(" ");
+
+  return (
+    <svg width={width} height={height} className="job-sparkline">
+      <title>
+        {total} runs in 24h, {total ? Math.round(((total - failures) / total) * 100) : 0}% succeeded
+        {durations.length ? `, p95 up to ${maxDuration.toFixed(2)}s` : ""}
+      </title>
+      {series.runs.map((runs, index) => (
+        <rect
+          key={index}
+          x={index * barWidth}
+          y={height - (runs / maxRuns) * height}
+          width={Math.max(1, barWidth - 1)}
+          height={(runs / maxRuns) * height}
+          fill={series.failures[index] ? "#ef5350" : "#90caf9"}
+        />
+      ))}
+      {points && <polyline points={points} fill="none" stroke="#ffffff" strokeWidth="1" />}
+    </svg>
+  );
+};
+
 const JobCard = ({ job, onClick, onDelete, onStatusUpdate }) => {
   const navigate = useNavigate();
-  const [dependencyNames, setDependencyNames] = useState([]);
   const [showDeleteModal, setShowDeleteModal] = useState(false);
   const [selectedStatus, setSelectedStatus] = useState(job.status);
+  const [sparkline, setSparkline] = useState(null);
 
   // Convert schedule to a string if it's an object
   const schedule = typeof job.schedule === "object" ? JSON.stringify(job.schedule) : job.schedule;
@@ -21,30 +61,23 @@ const JobCard = ({ job, onClick, onDelete, onStatusUpdate }) => {
     setSelectedStatus(job.status);
   }, [job.status]);
 
-  // Fetch job names for dependencies
+  // Dependency names come with the page (GET /jobs:page), so no catalog fetch is needed
+  const dependencyNames = (job.dependencies || []).map(
+    (id) => job.dependency_names?.[id] ?? `Unknown Job (ID: ${id})`
+  );
+
+  // Load this job's recent run history (batched with the other cards on screen)
   useEffect(() => {
-    const fetchDependencyNames = async () => {
-      if (job.dependencies && job.dependencies.length > 0) {
-        try {
-          const token = localStorage.getItem("token");
-          const response = await getJobs(token);
-          const jobs = response.data;
-
-          // Map dependency IDs to job names
-          const names = job.dependencies.map((id) => {
-            const dependentJob = jobs.find((j) => j.id === id);
-            return dependentJob ? dependentJob.name : `Unknown Job (ID: ${id})`;
-          });
-
-          setDependencyNames(names);
-        } catch (error) {
-          console.error("Error fetching dependency names:", error);
-        }
-      }
+    let cancelled = false;
+    fetchSparkline(job.id)
+      .then((series) => {
+        if (!cancelled) setSparkline(series);
+      })
+      .catch(() => {}); // Logged in fetchSparkline; the card just shows no sparkline
+    return () => {
+      cancelled = true;
     };
-
-    fetchDependencyNames();
-  }, [job.dependencies]);
+  }, [job.id, job.run_count]);
 
   const handleDelete = async () => {
     try {
@@ -121,6 +154,7 @@ const JobCard = ({ job, onClick, onDelete, onStatusUpdate }) => {
       case "running":
         return "#2e7d32"; // Darker green for running
       case "failed":
+      case "timed_out":
         return "#d32f2f"; // Darker red for failed
       default:
         return "#2d2d2d"; // Default color for other statuses
@@ -138,6 +172,8 @@ const JobCard = ({ job, onClick, onDelete, onStatusUpdate }) => {
         return "#2196f3"; // Blue for complete
       case "failed":
         return "#d32f2f"; // Darker red for failed
+      case "timed_out":
+        return "#8e24aa"; // Purple for timed out
       default:
         return "#ffffff"; // White for other statuses
     }
@@ -187,6 +223,12 @@ const JobCard = ({ job, onClick, onDelete, onStatusUpdate }) => {
           <span className="job-attribute-title">Command:</span>
           <span className="job-attribute-value">{job.command}</span>
         </div>
+        {job.owner && (
+          <div className="job-attribute">
+            <span className="job-attribute-title">Owner:</span>
+            <span className="job-attribute-value">{job.owner}</span>
+          </div>
+        )}
         <div className="job-attribute">
           <span className="job-attribute-title">Status:</span>
           <select
@@ -199,6 +241,7 @@ const JobCard = ({ job, onClick, onDelete, onStatusUpdate }) => {
             <option value="inactive">Inactive</option>
             <option value="complete">Complete</option>
             <option value="failed">Failed</option>
+            <option value="timed_out">Timed Out</option>
           </select>
         </div>
         <div className="job-attribute">
@@ -217,6 +260,12 @@ const JobCard = ({ job, onClick, onDelete, onStatusUpdate }) => {
           <span className="job-attribute-title">Run Count:</span>
           <span className="job-attribute-value">{job.run_count}</span>
         </div>
+        {sparkline && (
+          <div className="job-attribute">
+            <span className="job-attribute-title">Last 24h:</span>
+            <Sparkline series={sparkline} />
+          </div>
+        )}
         {job.dependencies && job.dependencies.length > 0 ? (
           <div className="dependency-arrow">
             <FontAwesomeIcon icon={faArrowRight} />
@@ -0,0 +1,89 @@
+import React, { useEffect, useRef, useState } from "react";
+
+// A scrolling grid of fixed-size cells that only mounts the cells in (or near) the viewport,
+// so the DOM stays the same size however many items there are. Items need not be loaded:
+// renderItem(index) may return a placeholder, and onRangeChange(first, last) reports which
+// indexes are on screen so the caller can fetch them.
+const VirtualJobGrid = ({
+  total,
+  renderItem,
+  onRangeChange,
+  rowHeight = 280,
+  minColumnWidth = 300,
+  gap = 16,
+  overscanRows = 2,
+}) => {
+  const containerRef = useRef(null);
+  const [viewport, setViewport] = useState({ width: 0, height: 0, scrollTop: 0 });
+
+  useEffect(() => {
+    const container = containerRef.current;
+    let frame = null;
+    const measure = () => {
+      frame = null;
+      setViewport({
+        width: container.clientWidth,
+        height: container.clientHeight,
+        scrollTop: container.scrollTop,
+      });
+    };
+    // At most one update per animation frame while scrolling
+    const scheduleMeasure = () => {
+      if (frame === null) frame = requestAnimationFrame(measure);
+    };
+    measure();
+    const observer = new ResizeObserver(scheduleMeasure);
+    observer.observe(container);
+    container.addEventListener("scroll", scheduleMeasure, { passive: true });
+    return () => {
+      observer.disconnect();
+      container.removeEventListener("scroll", scheduleMeasure);
+      if (frame !== null) cancelAnimationFrame(frame);
+    };
+  }, []);
+
+  const columns = Math.max(1, Math.floor((viewport.width + gap) / (minColumnWidth + gap)));
+  const columnWidth = Math.max(0, (viewport.width - gap * (columns - 1)) / columns);
+  const rowStride = rowHeight + gap;
+  const rows = Math.ceil(total / columns);
+  const firstRow = Math.max(0, Math.floor(viewport.scrollTop / rowStride) - overscanRows);
+  const lastRow = Math.min(rows - 1, Math.ceil((viewport.scrollTop + viewport.height) / rowStride) + overscanRows);
+  const first = firstRow * columns;
+  const last = Math.min(total - 1, (lastRow + 1) * columns - 1);
+
+  useEffect(() => {
+    if (viewport.height > 0 && last >= first) {
+      onRangeChange(first, last);
+    }
+  }, [first, last, viewport.height, onRangeChange]);
+
+  const cells = [];
+  for (let index = first; index <= last; index++) {
+    const row = Math.floor(index / columns);
+    const column = index % columns;
+    cells.push(
+      <div
+        key={index}
+        className="virtual-grid-cell"
+        style={{
+          top: row * rowStride,
+          left: column * (columnWidth + gap),
+          width: columnWidth,
+          height: rowHeight,
+        }}
+      >
+        {renderItem(index)}
+      </div>
+    );
+  }
+
+  return (
+    <div className="virtual-grid" ref={containerRef}>
+      <div className="virtual-grid-content" style={{ height: Math.max(0, rows * rowStride - gap) }}>
+        {cells}
+      </div>
+    </div>
+  );
+};
+
+export default VirtualJobGrid;
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from "react";
 import axios from "axios";
 import { useNavigate } from "react-router-dom";
 import Sidebar from "../components/Sidebar";
+import { fetchJobs as fetchJobCatalog } from "../api/jobService";
 import { toast } from "react-hot-toast";
 import { FontAwesomeIcon } from "@fortawesome/react-fontawesome";
 import { faTimes } from "@fortawesome/free-solid-svg-icons";
@@ -13,6 +14,8 @@ const CreateJob = () => {
     command: "",
     schedule: "",
     dependencies: [],
+    job_type: "shell",
+    timeout: "",
   });
   const [availableJobs, setAvailableJobs] = useState([]);
   const [error, setError] = useState("");
@@ -34,6 +37,8 @@ const CreateJob = () => {
             ? JSON.stringify(clonedJob.schedule) 
             : clonedJob.schedule,
           dependencies: clonedJob.dependencies || [],
+          job_type: clonedJob.job_type || "shell",
+          timeout: clonedJob.timeout ?? "",
         });
         // Clear the cloned job from local storage
         localStorage.removeItem("clonedJob");
@@ -45,13 +50,8 @@ const CreateJob = () => {
     // Fetch available jobs for dependencies
     const fetchJobs = async () => {
       try {
-        const token = localStorage.getItem("token");
-        const response = await axios.get("http://localhost:8000/jobs", {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
-        });
-        setAvailableJobs(response.data);
+        const jobs = await fetchJobCatalog(); // Delta request against the cached catalog
+        setAvailableJobs(jobs);
       } catch (error) {
         console.error("Error fetching jobs:", error);
         setError("Failed to fetch available jobs for dependencies.");
@@ -124,7 +124,8 @@ const CreateJob = () => {
       const token = localStorage.getItem("token");
       const response = await axios.post(
         "http://localhost:8000/jobs",
-        formData,
+        // An empty timeout falls back to the default/adaptive limit
+        { ...formData, timeout: formData.timeout === "" ? null : Number(formData.timeout) },
         {
           headers: {
             Authorization: `Bearer ${token}`,
@@ -159,6 +160,24 @@ const CreateJob = () => {
               required
             />
           </div>
+          <div>
+            <label htmlFor="job_type">Job Type:</label>
+            <select id="job_type" name="job_type" value={formData.job_type} onChange={handleChange}>
+              <option value="shell">Shell command</option>
+              <option value="python">Python callable (module:function)</option>
+            </select>
+          </div>
+          <div>
+            <label htmlFor="timeout">Timeout (seconds, blank for default, 0 for none):</label>
+            <input
+              type="number"
+              id="timeout"
+              name="timeout"
+              min="0"
+              value={formData.timeout}
+              onChange={handleChange}
+            />
+          </div>
           <div>
             <label htmlFor="command">Command:</label>
             <input
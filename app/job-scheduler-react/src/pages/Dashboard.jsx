@@ -1,91 +1,231 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef, useCallback } from "react";
 import { useNavigate } from "react-router-dom";
-import { fetchJobs, deleteJob } from "../api/jobService";
+import { fetchJob, fetchJobPage, openJobEvents } from "../api/jobService";
 import Sidebar from "../components/Sidebar";
 import JobCard from "../components/JobCard";
 import JobDetailsModal from "../components/JobDetailsModal";
+import VirtualJobGrid from "../components/VirtualJobGrid";
 import { toast } from "react-hot-toast";
 
+// Jobs per request. Only the pages covering the cards on screen are fetched, so the page
+// weight depends on the viewport rather than on the size of the catalog.
+const PAGE_SIZE = 60;
+const FILTER_DEBOUNCE_MS = 300;
+const RELOAD_DEBOUNCE_MS = 250; // Bursts of job events cause one reload
+
 const Dashboard = () => {
-  const [jobs, setJobs] = useState([]);
-  const [filteredJobs, setFilteredJobs] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [pages, setPages] = useState(new Map()); // page number -> jobs
   const [selectedJob, setSelectedJob] = useState(null);
   const [filters, setFilters] = useState({
     status: "",
     name: "",
     dependency: "",
   });
+  const [query, setQuery] = useState(filters); // The filters the loaded pages were fetched with
   const navigate = useNavigate();
+  const socketRef = useRef(null);
+  const queryRef = useRef(query);
+  const pagesRef = useRef(pages);
+  const loadingRef = useRef(new Set()); // Page numbers being fetched for the current query
+  const visibleRef = useRef({ first: 0, last: -1 });
+  const reloadTimerRef = useRef(null);
 
   useEffect(() => {
     const token = localStorage.getItem("token");
     if (!token) {
       navigate("/login"); // Redirect to login if no token is found
-      return;
     }
+  }, [navigate]);
 
-    const loadJobs = async () => {
-      try {
-        const data = await fetchJobs();
-        console.log("Jobs fetched:", data);
-        setJobs(data);
-        setFilteredJobs(data); // Initialize filtered jobs
-      } catch (error) {
-        console.error("Error loading jobs:", error);
+  const handleLoadError = useCallback(
+    (error) => {
+      console.error("Error loading jobs:", error);
+      if (error.response?.status === 401) {
         navigate("/login"); // Redirect to login if unauthorized
+      } else {
+        toast.error("Failed to fetch jobs.");
       }
-    };
-    loadJobs();
-  }, [navigate]);
+    },
+    [navigate]
+  );
 
-  const handleDeleteJob = (jobId) => {
-    setJobs((prevJobs) => prevJobs.filter((job) => job.id !== jobId));
-    setFilteredJobs((prevJobs) => prevJobs.filter((job) => job.id !== jobId));
-  };
+  const requestPage = (pageNumber, currentQuery) =>
+    fetchJobPage({
+      offset: pageNumber * PAGE_SIZE,
+      limit: PAGE_SIZE,
+      q: currentQuery.name,
+      status: currentQuery.status,
+      dependency: parseInt(currentQuery.dependency) || null,
+    });
 
-  const fetchJobsData = async () => {
-    try {
-      const jobs = await fetchJobs();
-      setJobs(jobs); // Only update the jobs state
-    } catch (error) {
-      console.error("Error fetching jobs:", error);
-      toast.error("Failed to fetch jobs.");
+  // Fetch the pages covering the cards first..last that aren't loaded or loading yet
+  const handleRangeChange = useCallback(
+    (first, last) => {
+      visibleRef.current = { first, last };
+      const currentQuery = queryRef.current;
+      const loading = loadingRef.current;
+      for (let page = Math.floor(first / PAGE_SIZE); page <= Math.floor(last / PAGE_SIZE); page++) {
+        if (pagesRef.current.has(page) || loading.has(page)) continue;
+        loading.add(page);
+        requestPage(page, currentQuery)
+          .then((data) => {
+            if (queryRef.current !== currentQuery) return; // The filters changed meanwhile
+            pagesRef.current = new Map(pagesRef.current).set(page, data.jobs);
+            setPages(pagesRef.current);
+            setTotal(data.total);
+          })
+          .catch(handleLoadError)
+          .finally(() => loading.delete(page));
+      }
+    },
+    [handleLoadError]
+  );
+
+  // Fetch the pages on screen again and drop the others, which are refetched when scrolled to
+  const reload = useCallback(() => {
+    const currentQuery = queryRef.current;
+    const { first, last } = visibleRef.current;
+    const firstPage = Math.floor(first / PAGE_SIZE);
+    const lastPage = Math.max(firstPage, Math.floor(last / PAGE_SIZE));
+    const requests = [];
+    for (let page = firstPage; page <= lastPage; page++) {
+      requests.push(requestPage(page, currentQuery).then((data) => [page, data]));
+    }
+    Promise.all(requests)
+      .then((results) => {
+        if (queryRef.current !== currentQuery) return;
+        pagesRef.current = new Map(results.map(([page, data]) => [page, data.jobs]));
+        loadingRef.current = new Set();
+        setPages(pagesRef.current);
+        setTotal(results[results.length - 1][1].total);
+      })
+      .catch(handleLoadError);
+  }, [handleLoadError]);
+
+  const scheduleReload = useCallback(() => {
+    clearTimeout(reloadTimerRef.current);
+    reloadTimerRef.current = setTimeout(reload, RELOAD_DEBOUNCE_MS);
+  }, [reload]);
+
+  // Apply filter edits once typing pauses; the grid starts again from the top
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      if (JSON.stringify(filters) === JSON.stringify(queryRef.current)) return;
+      queryRef.current = filters;
+      loadingRef.current = new Set();
+      visibleRef.current = { first: 0, last: -1 };
+      setQuery(filters);
+    }, FILTER_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [filters]);
+
+  // Load the first page for the current filters
+  useEffect(() => {
+    reload();
+  }, [query, reload]);
+
+  // Apply a pushed job event to the loaded pages
+  const applyJobEvent = (event) => {
+    if (event.type === "resync") {
+      scheduleReload(); // We fell behind the event stream; catch up
+      return;
+    }
+    if (event.type !== "job") return;
+
+    if (event.event === "created" || event.event === "updated" || event.event === "deleted" || queryRef.current.status) {
+      // The job may have moved into or out of the filtered list, or changed position
+      scheduleReload();
+      return;
+    }
+    // Status, run and next_run changes: patch the job where it is loaded; jobs off screen
+    // are fetched fresh when scrolled to
+    const { id } = event.job;
+    let found = false;
+    const updated = new Map();
+    pagesRef.current.forEach((jobs, page) => {
+      updated.set(
+        page,
+        jobs.map((job) => {
+          if (job.id !== id) return job;
+          found = true;
+          return { ...job, ...event.job };
+        })
+      );
+    });
+    if (found) {
+      pagesRef.current = updated;
+      setPages(updated);
     }
   };
 
   useEffect(() => {
-    fetchJobsData(); // Initial fetch
+    let closed = false;
+    let reconnectTimer = null;
+    const connect = () => {
+      const socket = openJobEvents();
+      socket.onopen = () => scheduleReload(); // Catch up on anything missed while disconnected
+      socket.onmessage = (message) => applyJobEvent(JSON.parse(message.data));
+      socket.onclose = () => {
+        if (!closed) {
+          reconnectTimer = setTimeout(connect, 5000);
+        }
+      };
+      socketRef.current = socket;
+    };
+    connect();
 
+    // Only poll while the event stream is down
     const interval = setInterval(() => {
-      fetchJobsData(); // Periodic fetch
+      if (socketRef.current?.readyState !== WebSocket.OPEN) {
+        reload(); // Periodic fetch of the pages on screen
+      }
     }, localStorage.getItem("refreshInterval") * 1000 || 10000); // Default to 10 seconds
 
-    return () => clearInterval(interval); // Cleanup on unmount
+    return () => {
+      // Cleanup on unmount
+      closed = true;
+      clearTimeout(reconnectTimer);
+      clearTimeout(reloadTimerRef.current);
+      clearInterval(interval);
+      socketRef.current?.close();
+    };
   }, []);
 
-  // Apply filters whenever filters change
-  useEffect(() => {
-    const filtered = jobs.filter((job) => {
-      const matchesStatus = filters.status ? job.status === filters.status : true;
-      const matchesName = filters.name
-        ? job.name.toLowerCase().includes(filters.name.toLowerCase())
-        : true;
-      const matchesDependency = filters.dependency
-        ? job.dependencies.includes(parseInt(filters.dependency))
-        : true;
-      return matchesStatus && matchesName && matchesDependency;
-    });
-    setFilteredJobs(filtered);
-  }, [filters, jobs]); // Reapply filters when filters or jobs change
+  // Pages leave the logs out; the details modal shows them
+  const openJobDetails = async (jobId) => {
+    try {
+      setSelectedJob(await fetchJob(jobId));
+    } catch (error) {
+      console.error("Error fetching job details:", error);
+      toast.error("Failed to fetch job details.");
+    }
+  };
+
+  const renderJob = (index) => {
+    const job = pages.get(Math.floor(index / PAGE_SIZE))?.[index % PAGE_SIZE];
+    if (!job) {
+      return <div className="job-card placeholder" />; // Its page is still loading
+    }
+    return (
+      <JobCard
+        key={job.id}
+        job={job}
+        onClick={() => openJobDetails(job.id)}
+        onDelete={scheduleReload}
+        onStatusUpdate={scheduleReload}
+      />
+    );
+  };
 
   return (
     <div className="dashboard">
       <Sidebar />
-      <div className="job-grid-container">
+      <div className="job-grid-container virtualized">
         <div className="filter-bar">
           <input
             type="text"
-            placeholder="Search by job name"
+            placeholder="Search by name, command or ID"
             value={filters.name}
             onChange={(e) => setFilters({ ...filters, name: e.target.value })}
           />
@@ -98,6 +238,7 @@ const Dashboard = () => {
             <option value="inactive">Inactive</option>
             <option value="complete">Complete</option>
             <option value="failed">Failed</option>
+            <option value="timed_out">Timed Out</option>
             <option value="running">Running</option>
           </select>
           <input
@@ -107,17 +248,13 @@ const Dashboard = () => {
             onChange={(e) => setFilters({ ...filters, dependency: e.target.value })}
           />
         </div>
-        <div className="job-grid">
-          {filteredJobs.map((job) => (
-            <JobCard
-              key={job.id}
-              job={job}
-              onClick={() => setSelectedJob(job)}
-              onDelete={handleDeleteJob}
-              onStatusUpdate={fetchJobsData}
-            />
-          ))}
-        </div>
+        <div className="job-grid-summary">{total} jobs</div>
+        <VirtualJobGrid
+          key={JSON.stringify(query)}
+          total={total}
+          renderItem={renderJob}
+          onRangeChange={handleRangeChange}
+        />
       </div>
       {selectedJob && (
         <JobDetailsModal
@@ -129,4 +266,4 @@ const Dashboard = () => {
   );
 };
 
-export default Dashboard; 
\ No newline at end of file
+export default Dashboard;
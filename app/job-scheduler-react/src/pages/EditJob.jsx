@@ -2,6 +2,7 @@ import React, { useState, useEffect } from "react";
 import { useParams, useNavigate } from "react-router-dom";
 import axios from "axios";
 import Sidebar from "../components/Sidebar";
+import { fetchJobs as fetchJobCatalog } from "../api/jobService";
 import { toast } from "react-hot-toast";
 import { FontAwesomeIcon } from "@fortawesome/react-fontawesome";
 import { faTimes } from "@fortawesome/free-solid-svg-icons";
@@ -14,6 +15,8 @@ const EditJob = () => {
     command: "",
     schedule: "",
     dependencies: [],
+    job_type: "shell",
+    timeout: "",
   });
   const [availableJobs, setAvailableJobs] = useState([]);
   const [error, setError] = useState("");
@@ -36,6 +39,8 @@ const EditJob = () => {
           command: job.command,
           schedule: typeof job.schedule === "object" ? JSON.stringify(job.schedule) : job.schedule,
           dependencies: job.dependencies || [],
+          job_type: job.job_type || "shell",
+          timeout: job.timeout ?? "",
         });
       } catch (error) {
         console.error("Error fetching job:", error);
@@ -45,14 +50,9 @@ const EditJob = () => {
 
     const fetchJobs = async () => {
       try {
-        const token = localStorage.getItem("token");
-        const response = await axios.get("http://localhost:8000/jobs", {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
-        });
+        const jobs = await fetchJobCatalog(); // Delta request against the cached catalog
         // Filter out the current job from available dependencies
-        setAvailableJobs(response.data.filter(job => job.id !== parseInt(id)));
+        setAvailableJobs(jobs.filter(job => job.id !== parseInt(id)));
       } catch (error) {
         console.error("Error fetching jobs:", error);
         setError("Failed to fetch available jobs for dependencies.");
@@ -127,7 +127,8 @@ const EditJob = () => {
       const token = localStorage.getItem("token");
       const response = await axios.put(
         `http://localhost:8000/jobs/${id}`,
-        formData,
+        // An empty timeout falls back to the default/adaptive limit
+        { ...formData, timeout: formData.timeout === "" ? null : Number(formData.timeout) },
         {
           headers: {
             Authorization: `Bearer ${token}`,
@@ -162,6 +163,24 @@ const EditJob = () => {
               required
             />
           </div>
+          <div>
+            <label htmlFor="job_type">Job Type:</label>
+            <select id="job_type" name="job_type" value={formData.job_type} onChange={handleChange}>
+              <option value="shell">Shell command</option>
+              <option value="python">Python callable (module:function)</option>
+            </select>
+          </div>
+          <div>
+            <label htmlFor="timeout">Timeout (seconds, blank for default, 0 for none):</label>
+            <input
+              type="number"
+              id="timeout"
+              name="timeout"
+              min="0"
+              value={formData.timeout}
+              onChange={handleChange}
+            />
+          </div>
           <div>
             <label htmlFor="command">Command:</label>
             <input
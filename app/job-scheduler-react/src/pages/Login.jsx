@@ -1,5 +1,6 @@
 import React, { useState } from "react";
 import axios from "axios";
+import { resetJobCache } from "../api/jobService";
 import { useNavigate } from "react-router-dom";
 
 const Login = () => {
@@ -30,6 +31,7 @@ const Login = () => {
 
       // Store the token in local storage
       localStorage.setItem("token", response.data.access_token);
+      resetJobCache(); // Don't reuse another session's job catalog
       console.log("Token stored:", response.data.access_token);
       navigate("/"); // Redirect to the dashboard after successful login
     } catch (error) {
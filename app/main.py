@@ -1,19 +1,6 @@
 # main.py
 import uvicorn
-import os
-from app import app  # use the shared app instance
-from models import SessionLocal, User, Base
-from passlib.context import CryptContext
-from sqlalchemy import Column, Integer, String, DateTime, Text, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-
-# Import routes to ensure they are registered.
-import api
-import ui
-
-# Create a password context for hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from models import SessionLocal, User, password_context
 
 def create_default_admin_user():
     session = SessionLocal()
@@ -21,7 +8,7 @@ def create_default_admin_user():
     admin_user = session.query(User).filter(User.username == "admin").first()
     if not admin_user:
         # Create a new admin user
-        hashed_password = pwd_context.hash("password")  # Hash the password
+        hashed_password = password_context().hash("password")  # Hash the password
         new_user = User(username="admin", hashed_password=hashed_password)
         session.add(new_user)
         session.commit()
@@ -31,13 +18,8 @@ def create_default_admin_user():
     session.close()
 
 if __name__ == "__main__":
-    # Create the database tables if they don't exist
-    DATABASE_URL = os.environ.get("DATABASE_URL","sqlite:///./scheduler.db")
-
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-    Base.metadata.create_all(bind=engine)
-    # Create the default admin user
+    # Create the default admin user (the first session creates the database tables)
     create_default_admin_user()
     
     # Start the application
-    uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("app:create_app", factory=True, host="0.0.0.0", port=8000, reload=True)
@@ -1,20 +1,59 @@
 # models.py
 import datetime
+import functools
 import json
 import os
-from sqlalchemy import Column, Integer, String, DateTime, Text, create_engine
+import threading
+from sqlalchemy import Column, Float, Index, Integer, String, DateTime, Text, UniqueConstraint, and_, create_engine, event, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from passlib.context import CryptContext
+
+from tracing import instrument_engine
 
 #DATABASE_URL = "sqlite:///./scheduler.db"
 DATABASE_URL = os.environ.get("DATABASE_URL","sqlite:///./scheduler.db")
 
 Base = declarative_base()
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+class _LazySessionmaker(sessionmaker):
+    # Binds to the engine when the first session is opened, so importing models (the API, the
+    # worker, the CLIs) never touches the database
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            get_engine()
+        return super().__call__(**local_kw)
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    # The one engine of this process, created on first use along with any missing tables/columns
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+                instrument_engine(engine)  # SQL statements become spans of the current trace
+                Base.metadata.create_all(bind=engine)
+                ensure_schema(engine)
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+def __getattr__(name):
+    # `from models import engine` still works; it initializes the database at that point
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@functools.lru_cache(maxsize=None)
+def password_context():
+    # Built on first use: only logins and new users need passlib and the bcrypt backend
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class Job(Base):
     __tablename__ = "jobs"
@@ -23,10 +62,14 @@ class Job(Base):
     name = Column(String, unique=True, index=True, nullable=False)
     schedule = Column(Text, nullable=False)  # JSON string for cron parameters
     command = Column(Text, nullable=False)
+    job_type = Column(String, default="shell")  # "shell" command, or "python" 'module:callable' entrypoint
     dependencies = Column(Text, default='[]')  # JSON list of job IDs
-    status = Column(String, default="scheduled")  # "scheduled", "running", "complete", "failed", "inactive"
+    timeout = Column(Integer, nullable=True)  # Seconds; None uses the default/adaptive limit, 0 means none
+    status = Column(String, default="scheduled")  # "scheduled", "running", "complete", "failed", "timed_out", "inactive"
     last_run = Column(DateTime, nullable=True)
     logs = Column(Text, default='[]')  # JSON list of logs
+    version = Column(Integer, default=0, index=True)  # Change version of the last write to this job
+    owner = Column(String, nullable=True, index=True)  # User or team the job's runs are accounted to; None: unowned
 
     def __repr__(self):
         return f"Job(id={self.id}, name={self.name}, schedule={self.schedule}, command={self.command}, dependencies={self.dependencies}, status={self.status}, last_run={self.last_run}, logs={self.logs})"
@@ -41,9 +84,192 @@ class User(Base):
     def __repr__(self):
         return f"User(id={self.id}, username={self.username})"
 
+class JobDeletion(Base):
+    __tablename__ = "job_deletions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, index=True)  # Change version of the delete
+
+    def __repr__(self):
+        return f"JobDeletion(job_id={self.job_id}, version={self.version})"
+
+class QueuedRun(Base):
+    __tablename__ = "run_queue"
+    __table_args__ = (
+        Index("ix_run_queue_status_lease_expires", "status", "lease_expires"),  # Expired lease sweeps
+        Index("ix_run_queue_status_finished_at", "status", "finished_at"),  # Retention sweeps
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, nullable=False, index=True)
+    status = Column(String, default="queued", index=True)  # "queued", "claimed", "done", "failed"
+    enqueued_at = Column(DateTime, default=datetime.datetime.utcnow)
+    worker_id = Column(String, nullable=True)  # Worker holding the lease
+    lease_expires = Column(DateTime, nullable=True)  # Re-queued if the worker stops heartbeating
+    attempts = Column(Integer, default=0)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    result = Column(Text, nullable=True)  # Outcome message from run_job
+    owner = Column(String, nullable=True, index=True)  # The job's owner when the run was enqueued
+    fair_tag = Column(Float, nullable=True, index=True)  # Weighted fair queuing finish tag; claimed lowest first
+
+    def __repr__(self):
+        return f"QueuedRun(id={self.id}, job_id={self.job_id}, status={self.status}, worker_id={self.worker_id}, attempts={self.attempts})"
+
+class Backfill(Base):
+    # A catch-up of a job's schedule over a past range; one BackfillRun per logical run time
+    __tablename__ = "backfills"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, nullable=False, index=True)
+    range_start = Column(DateTime, nullable=False)  # UTC
+    range_end = Column(DateTime, nullable=False)  # UTC, exclusive
+    parallelism = Column(Integer, nullable=False, default=1)
+    status = Column(String, default="running", index=True)  # "running", "complete", "failed", "cancelled"
+    created_by = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"Backfill(id={self.id}, job_id={self.job_id}, range_start={self.range_start}, range_end={self.range_end}, status={self.status})"
+
+class BackfillRun(Base):
+    __tablename__ = "backfill_runs"
+    __table_args__ = (UniqueConstraint("backfill_id", "logical_time"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    backfill_id = Column(Integer, nullable=False, index=True)
+    job_id = Column(Integer, nullable=False, index=True)
+    logical_time = Column(DateTime, nullable=False, index=True)  # UTC schedule time this run stands in for
+    status = Column(String, default="pending", index=True)  # "pending", "running", "complete", "failed", "timed_out", "upstream_failed"
+    attempts = Column(Integer, default=0)
+    returncode = Column(Integer, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"BackfillRun(id={self.id}, backfill_id={self.backfill_id}, logical_time={self.logical_time}, status={self.status})"
+
+class RunStat(Base):
+    # Rollup of finished runs per job (job_id 0 = all jobs) and hour or day, updated as runs finish
+    __tablename__ = "run_stats"
+    __table_args__ = (UniqueConstraint("job_id", "granularity", "bucket_start"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, nullable=False, index=True)
+    granularity = Column(String, nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False, index=True)  # UTC
+    count = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)  # Includes timeouts
+    timeouts = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Float, nullable=False, default=0.0)  # Seconds
+    duration_sketch = Column(Text, nullable=True)  # DurationSketch JSON; mergeable across buckets
+
+    def __repr__(self):
+        return f"RunStat(job_id={self.job_id}, granularity={self.granularity}, bucket_start={self.bucket_start}, count={self.count})"
+
+class OwnerQuota(Base):
+    # Fair-share settings of one owner; owners without a row get the defaults
+    __tablename__ = "owner_quotas"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner = Column(String, unique=True, index=True, nullable=False)
+    weight = Column(Float, nullable=True)  # Share of contended run slots relative to other owners
+    max_running = Column(Integer, nullable=True)  # Runs at once; 0 means no limit
+
+    def __repr__(self):
+        return f"OwnerQuota(owner={self.owner}, weight={self.weight}, max_running={self.max_running})"
+
+class OwnerUsage(Base):
+    # Runs and resources used per owner ("" = unowned jobs) and UTC day, updated as runs finish
+    __tablename__ = "owner_usage"
+    __table_args__ = (UniqueConstraint("owner", "day"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner = Column(String, nullable=False, index=True)
+    day = Column(DateTime, nullable=False, index=True)
+    runs = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+    run_seconds = Column(Float, nullable=False, default=0.0)  # Wall-clock
+    cpu_seconds = Column(Float, nullable=False, default=0.0)  # User + system time of the job's processes
+
+    def __repr__(self):
+        return f"OwnerUsage(owner={self.owner}, day={self.day}, runs={self.runs}, cpu_seconds={self.cpu_seconds})"
+
+class ChangeVersion(Base):
+    __tablename__ = "change_version"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)  # Monotonic counter bumped on every job write
+
+def next_change_version(session):
+    # The UPDATE takes the write lock first, so concurrent writers never see the same value
+    connection = session.connection()
+    result = connection.execute(
+        update(ChangeVersion.__table__).where(ChangeVersion.id == 1).values(value=ChangeVersion.value + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(ChangeVersion.__table__.insert().values(id=1, value=1))
+        return 1
+    return connection.execute(select(ChangeVersion.value).where(ChangeVersion.id == 1)).scalar()
+
+def current_change_version(session):
+    value = session.execute(select(ChangeVersion.value).where(ChangeVersion.id == 1)).scalar()
+    return value or 0
+
+def lock_for_write(session):
+    # Take SQLite's write lock at the start of the transaction rather than at its first write,
+    # so rows it reads can't be changed by another process before it commits
+    if session.get_bind().dialect.name == "sqlite":
+        session.execute(text("BEGIN IMMEDIATE"))
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def add_counts(session, table, key_columns, added_columns, rows):
+    # Insert each row (a dict of key and added columns), or add its added columns to those of
+    # the row with the same key. Done in the database, so concurrent writers can't overwrite
+    # each other; other databases get an UPDATE, then an INSERT if it matched nothing.
+    if not rows:
+        return
+    insert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(table)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[table.c[column] for column in key_columns],
+            set_={column: table.c[column] + statement.excluded[column] for column in added_columns},
+        ), rows)
+        return
+    for row in rows:
+        updated = session.execute(
+            update(table)
+            .where(and_(*(table.c[column] == row[column] for column in key_columns)))
+            .values({column: table.c[column] + row[column] for column in added_columns})
+        )
+        if updated.rowcount == 0:
+            session.execute(table.insert().values(row))
+
+@event.listens_for(SessionLocal, "before_flush")
+def stamp_change_version(session, flush_context, instances):
+    # Every flush that touches jobs (API edits, run status, logs) gets one new version
+    changed = [obj for obj in session.new if isinstance(obj, Job)]
+    changed += [obj for obj in session.dirty if isinstance(obj, Job) and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Job)]
+    if not changed and not deleted:
+        return
+    version = next_change_version(session)
+    for job in changed:
+        job.version = version
+    for job in deleted:
+        session.add(JobDeletion(job_id=job.id, version=version))
+    if deleted:
+        # Per-job rollups go with the job (SQLite may reuse its id); the global ones keep its runs
+        session.query(RunStat).filter(RunStat.job_id.in_([job.id for job in deleted])).delete(synchronize_session=False)
+
 def create_user(username: str, password: str):
     session = SessionLocal()
-    hashed_password = pwd_context.hash(password)
+    hashed_password = password_context().hash(password)
     user = User(username=username, hashed_password=hashed_password)
     session.add(user)
     session.commit()
@@ -56,5 +282,23 @@ def get_user(username: str):
     session.close()
     return user
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
+def ensure_schema(engine):
+    # create_all only creates missing tables, so add columns and indexes introduced after a
+    # table was created
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT {column.default.arg!r}"
+                connection.execute(text(ddl))
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
@@ -0,0 +1,331 @@
+# profiling.py
+import asyncio
+import contextvars
+import cProfile
+import datetime
+import functools
+import io
+import itertools
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger('uvicorn.error')
+
+# Longest stack sample or memory diff an admin can ask for, in seconds
+MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+# Per-request profiles kept for download; older ones are dropped
+REQUEST_PROFILES_KEPT = int(os.environ.get("PROFILE_REQUESTS_KEPT", "20"))
+# Request header that opts a request into cProfile (honoured for admins only)
+PROFILE_HEADER = "x-profile"
+# From Python 3.12 cProfile (on sys.monitoring) records every thread and only one profiler can
+# be active; before, a profiler only sees the thread that enabled it
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+# Leaf frames of threads that are waiting rather than working; left out of stack samples
+# unless idle threads are asked for
+IDLE_FRAMES = {
+    ("threading.py", "Condition.wait"),
+    ("threading.py", "Event.wait"),
+    ("threading.py", "Thread._wait_for_tstate_lock"),
+    ("queue.py", "Queue.get"),
+    ("selectors.py", "EpollSelector.select"),
+    ("selectors.py", "PollSelector.select"),
+    ("selectors.py", "SelectSelector.select"),
+    ("concurrent/futures/thread.py", "_worker"),
+    ("socket.py", "socket.accept"),
+}
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(filename: str):
+    # The file relative to the sys.path entry it was imported from
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry.rstrip(os.sep) + os.sep) and len(entry) > len(best):
+            best = entry.rstrip(os.sep) + os.sep
+    return filename[len(best):]
+
+def _frame_label(code):
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    # Samples the stack of every thread (scheduler dispatch, run workers, the event loop, the
+    # threadpool serving requests) at a fixed interval and counts identical stacks, rooted at
+    # the thread's name: the "collapsed" format flamegraph.pl, speedscope and similar tools read.
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float, interval: float = 0.01, idle: bool = False):
+        # Returns (collapsed stack -> samples, number of sampling rounds); blocks for `seconds`
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A stack sample is already being taken.")
+        try:
+            own = threading.get_ident()
+            counts = Counter()
+            rounds = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    if not idle and (_short_path(frame.f_code.co_filename), getattr(frame.f_code, "co_qualname", frame.f_code.co_name)) in IDLE_FRAMES:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, f"thread-{ident}"))
+                    counts[";".join(reversed(stack))] += 1
+                rounds += 1
+                time.sleep(interval)
+            return counts, rounds
+        finally:
+            self._lock.release()
+
+def collapsed(counts):
+    # One "frame;frame;frame count" line per distinct stack, most frequent first
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+class MemoryDiff:
+    # Allocations still alive after a time window that weren't there before it, grouped by
+    # source line (or by traceback with frames > 1). Tracing is switched on for the window
+    # only, unless the process already traces (PYTHONTRACEMALLOC).
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def capture(self, seconds: float, top: int = 50, frames: int = 1):
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A memory diff is already being taken.")
+        try:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start(frames)
+            try:
+                before = tracemalloc.take_snapshot()
+                time.sleep(seconds)
+                after = tracemalloc.take_snapshot()
+                traced, peak = tracemalloc.get_traced_memory()
+            finally:
+                if started:
+                    tracemalloc.stop()
+        finally:
+            self._lock.release()
+
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        differences = after.filter_traces(ignored).compare_to(
+            before.filter_traces(ignored), "traceback" if frames > 1 else "lineno"
+        )
+        return {
+            "seconds": seconds,
+            "traced_mb": round(traced / 2**20, 2),
+            "peak_mb": round(peak / 2**20, 2),
+            "growth_mb": round(sum(stat.size_diff for stat in differences) / 2**20, 3),
+            "top": [
+                {
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size": stat.size,
+                    "count": stat.count,
+                    "traceback": [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback],
+                }
+                for stat in differences[:top]
+            ],
+        }
+
+class RequestProfile:
+    # cProfile data for one request. Where cProfile follows a single thread, the request's steps
+    # on the event loop and its endpoint call in the threadpool get a profiler each, merged at
+    # the end.
+    def __init__(self, profile_id: int, method: str, path: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.duration = None
+        self.status_code = None
+        self.stats = None
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def profiler(self):
+        profiler = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profiler)
+        return profiler
+
+    def finish(self, duration: float, status_code):
+        self.duration = duration
+        self.status_code = status_code
+        stats = pstats.Stats()
+        for profiler in self._profiles:
+            try:
+                stats.add(profiler)
+            except TypeError:
+                pass  # Nothing was recorded on that thread
+        self.stats = stats
+        self._profiles = []
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": datetime.datetime.fromtimestamp(self.started_at, datetime.timezone.utc).isoformat(),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status_code": self.status_code,
+        }
+
+    def dump(self):
+        # The profile as a file pstats.Stats() (or snakeviz, etc.) can load
+        return marshal.dumps(self.stats.stats)
+
+    def report(self, sort: str = "cumulative", limit: int = 50):
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.add(self.stats)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+class RequestProfiles:
+    # The last REQUEST_PROFILES_KEPT per-request profiles, by ID. One request is profiled at a
+    # time; others asking meanwhile are served without a profile.
+    def __init__(self, kept: int = REQUEST_PROFILES_KEPT):
+        self.kept = kept
+        self._profiles = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+
+    def start(self, method: str, path: str):
+        # A new profile, or None while another request is being profiled
+        if not self._active.acquire(blocking=False):
+            return None
+        return RequestProfile(next(self._ids), method, path)
+
+    def finish(self, profile: RequestProfile, duration: float, status_code):
+        try:
+            profile.finish(duration, status_code)
+            with self._lock:
+                self._profiles[profile.id] = profile
+                while len(self._profiles) > self.kept:
+                    self._profiles.popitem(last=False)
+        finally:
+            self._active.release()
+
+    def get(self, profile_id: int):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def all(self):
+        with self._lock:
+            return list(reversed(self._profiles.values()))
+
+# The request being profiled in this context, if any
+_current = contextvars.ContextVar("request_profile", default=None)
+
+class _ProfiledSteps:
+    # Awaits a coroutine with the profiler on only while the coroutine itself runs, so other
+    # requests the event loop serves in between don't end up in this request's profile
+    def __init__(self, coroutine, profiler):
+        self.coroutine = coroutine
+        self.profiler = profiler
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            self.profiler.enable()
+            try:
+                if error is not None:
+                    step = self.coroutine.throw(error)
+                else:
+                    step = self.coroutine.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profiler.disable()
+            try:
+                value, error = (yield step), None
+            except BaseException as e:
+                value, error = None, e
+
+def _profiled_call(call):
+    # Sync endpoints run in the threadpool, outside the event loop's profiler
+    @functools.wraps(call)
+    def profiled(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return call(*args, **kwargs)
+        profiler = profile.profiler()
+        profiler.enable()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profiler.disable()
+    return profiled
+
+class ProfiledRoute(APIRoute):
+    # A route that profiles a request with cProfile when it carries "X-Profile: 1" and
+    # authorize(request) allows it (subclasses decide; nobody by default). The response gets
+    # an X-Profile-Id header naming the profile in request_profiles.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The request handler looks the endpoint up on the dependant at call time
+        if not PROFILES_ALL_THREADS and not asyncio.iscoroutinefunction(self.dependant.call):
+            self.dependant.call = _profiled_call(self.dependant.call)
+
+    def authorize(self, request):
+        return False
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            if request.headers.get(PROFILE_HEADER) not in ("1", "true") or not self.authorize(request):
+                return await handler(request)
+            profile = request_profiles.start(request.method, request.url.path)
+            if profile is None:
+                logger.info(f"Not profiling {request.method} {request.url.path}: another request is being profiled.")
+                return await handler(request)
+            token = _current.set(profile)
+            started = time.perf_counter()
+            status_code = None
+            try:
+                if PROFILES_ALL_THREADS:
+                    profiler = profile.profiler()
+                    profiler.enable()
+                    try:
+                        response = await handler(request)
+                    finally:
+                        profiler.disable()
+                else:
+                    response = await _ProfiledSteps(handler(request), profile.profiler())
+                status_code = response.status_code
+                response.headers["X-Profile-Id"] = str(profile.id)
+                return response
+            except HTTPException as e:
+                status_code = e.status_code
+                raise
+            finally:
+                _current.reset(token)
+                request_profiles.finish(profile, time.perf_counter() - started, status_code)
+                logger.info(f"Profiled {request.method} {request.url.path} as request profile {profile.id}.")
+
+        return profiled_handler
+
+# Create singletons
+stack_sampler = StackSampler()
+memory_diff = MemoryDiff()
+request_profiles = RequestProfiles()
@@ -0,0 +1,255 @@
+# pyworkers.py
+import atexit
+import importlib
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+from contextlib import contextmanager
+
+from timeouts import KILL_GRACE_SECONDS
+
+logger = logging.getLogger('uvicorn.error')
+
+# Modules imported once in the fork server, so every worker starts with them loaded
+PRELOAD_MODULES = [
+    name for name in os.environ.get("PYWORKER_PRELOAD", "requests,numpy,plotly.graph_objects").split(",") if name
+]
+POOL_SIZE = int(os.environ.get("PYWORKER_POOL_SIZE", "2"))
+# Workers are replaced after this many runs, or once their peak RSS passes the limit
+MAX_RUNS_PER_WORKER = int(os.environ.get("PYWORKER_MAX_RUNS", "100"))
+MAX_RSS_MB = float(os.environ.get("PYWORKER_MAX_RSS_MB", "512"))
+
+ENTRYPOINT_PATTERN = re.compile(r"^[A-Za-z_][\w.]*:[A-Za-z_][\w.]*$")
+
+def validate_entrypoint(entrypoint: str):
+    if not ENTRYPOINT_PATTERN.match(entrypoint or ""):
+        raise ValueError("Python jobs need a 'module.path:callable' entrypoint, e.g. 'jobs.generate_html:generate_html'")
+
+def resolve_entrypoint(entrypoint: str):
+    module_name, _, attribute_path = entrypoint.partition(":")
+    target = importlib.import_module(module_name)
+    for attribute in attribute_path.split("."):
+        target = getattr(target, attribute)
+    return target
+
+def preload(modules):
+    for module_name in modules:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"pyworkers: could not preload '{module_name}': {e}", file=sys.stderr)
+
+def _cpu_seconds():
+    # CPU time of this worker plus the subprocesses it has reaped
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return sum(entry.ru_utime + entry.ru_stime for entry in usage)
+
+def _flush_standard_streams():
+    for stream in (sys.stdout, sys.stderr):
+        if stream is not None:
+            stream.flush()
+
+@contextmanager
+def _captured_output(output):
+    # Point fds 1 and 2 at temporary files for one run, so what C extensions and subprocesses
+    # started by the entrypoint write is captured along with print(). Appends stdout and
+    # stderr to output on exit.
+    files = [tempfile.TemporaryFile(), tempfile.TemporaryFile()]
+    _flush_standard_streams()
+    saved = [os.dup(1), os.dup(2)]
+    try:
+        os.dup2(files[0].fileno(), 1)
+        os.dup2(files[1].fileno(), 2)
+        yield
+    finally:
+        _flush_standard_streams()
+        for fd, saved_fd in zip((1, 2), saved):
+            os.dup2(saved_fd, fd)
+            os.close(saved_fd)
+        for file in files:
+            file.seek(0)
+            output.append(file.read().decode(errors="replace"))
+            file.close()
+
+def _worker_main(connection, modules):
+    # Runs in the worker process: execute entrypoints sent by the pool until told to stop
+    os.setsid()  # Own process group, so a timeout also kills whatever the job started
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())  # Job modules (jobs.*) live next to the app
+    preload(modules)
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if message is None:
+            return
+        entrypoint, env = message
+        # Extra environment for this run only (e.g. a backfill's logical time)
+        saved_env = {name: os.environ.get(name) for name in env}
+        os.environ.update(env)
+        output = []
+        returncode = 0
+        cpu_before = _cpu_seconds()
+        with _captured_output(output):
+            # The return value is ignored; like a script, the entrypoint exits non-zero with sys.exit()
+            try:
+                resolve_entrypoint(entrypoint)()
+            except SystemExit as e:
+                returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException:
+                traceback.print_exc()
+                returncode = 1
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        cpu_seconds = _cpu_seconds() - cpu_before
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        stdout, stderr = output
+        connection.send((returncode, stdout, stderr, peak_rss_mb, cpu_seconds))
+
+class _Worker:
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.runs = 0
+
+    def retire(self):
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.connection.close()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+    def kill(self, grace: float = KILL_GRACE_SECONDS):
+        # Stop a worker stuck in a run: SIGTERM its process group, SIGKILL it after the grace period
+        self.connection.close()
+        for sig, wait in ((signal.SIGTERM, grace), (signal.SIGKILL, None)):
+            try:
+                os.killpg(self.process.pid, sig)
+            except ProcessLookupError:
+                pass
+            self.process.join(timeout=wait)
+            if not self.process.is_alive():
+                return
+
+class PythonWorkerPool:
+    # Preforked interpreters for "python" jobs. Runs get a CompletedProcess like shell jobs.
+    def __init__(self, size=POOL_SIZE, modules=PRELOAD_MODULES, max_runs=MAX_RUNS_PER_WORKER, max_rss_mb=MAX_RSS_MB):
+        self.size = size
+        self.modules = modules
+        self.max_runs = max_runs
+        self.max_rss_mb = max_rss_mb
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.RLock()
+        self._context = None
+
+    def _ensure_started(self):
+        # Started lazily, so processes without Python jobs never fork anything
+        with self._lock:
+            if self._context is not None:
+                return
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                self._context = multiprocessing.get_context("forkserver")
+                # Workers fork from a server that already imported these, so recycling is cheap
+                self._context.set_forkserver_preload(["pyworkers", *self.modules])
+            else:
+                self._context = multiprocessing.get_context("spawn")
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            logger.info(f"Started {self.size} Python workers (preloaded: {', '.join(self.modules) or 'nothing'}).")
+
+    def _spawn(self):
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_connection, self.modules), name="pyworker"
+        )
+        process.start()
+        child_connection.close()
+        worker = _Worker(process, parent_connection)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _replace(self, worker, kill=False):
+        with self._lock:
+            self._workers.discard(worker)
+        if kill:
+            worker.kill()
+        else:
+            worker.retire()
+        with self._lock:
+            if self._context is not None:  # Not after shutdown()
+                self._idle.put(self._spawn())
+
+    def _release(self, worker):
+        # Back to the idle queue, unless shutdown() ran while the worker was busy
+        with self._lock:
+            if worker in self._workers:
+                self._idle.put(worker)
+                return
+        worker.retire()
+
+    def run(self, entrypoint: str, timeout: float = None, env: dict = None):
+        # Raises subprocess.TimeoutExpired (after killing and replacing the worker) if the
+        # entrypoint is still running after timeout seconds
+        self._ensure_started()
+        worker = self._idle.get()  # Blocks while every worker is busy
+        try:
+            worker.connection.send((entrypoint, env or {}))
+            if not worker.connection.poll(timeout):
+                logger.error(f"Python worker {worker.process.pid} timed out after {timeout}s running '{entrypoint}'.")
+                self._replace(worker, kill=True)
+                raise subprocess.TimeoutExpired(entrypoint, timeout)
+            returncode, stdout, stderr, peak_rss_mb, cpu_seconds = worker.connection.recv()
+        except (EOFError, OSError) as e:
+            # The worker died mid-run (crash, OOM kill)
+            logger.error(f"Python worker {worker.process.pid} died running '{entrypoint}': {e}")
+            self._replace(worker)
+            result = subprocess.CompletedProcess(entrypoint, -1, "", f"Python worker exited unexpectedly: {e}")
+            result.cpu_seconds = None
+            return result
+
+        worker.runs += 1
+        if worker.runs >= self.max_runs or peak_rss_mb > self.max_rss_mb:
+            logger.info(f"Recycling Python worker {worker.process.pid} after {worker.runs} runs ({peak_rss_mb:.0f} MB peak RSS).")
+            self._replace(worker)
+        else:
+            self._release(worker)
+        result = subprocess.CompletedProcess(entrypoint, returncode, stdout, stderr)
+        result.cpu_seconds = cpu_seconds
+        return result
+
+    def shutdown(self):
+        # Retire every worker; a later run() starts the pool again
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+            self._context = None
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+        for worker in workers:
+            worker.retire()
+
+# Create a singleton pool shared by every executor thread.
+python_pool = PythonWorkerPool()
+atexit.register(python_pool.shutdown)
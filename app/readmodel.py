@@ -0,0 +1,225 @@
+# readmodel.py
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import defer
+
+from models import Job, JobDeletion, SessionLocal, current_change_version
+
+logger = logging.getLogger('uvicorn.error')
+
+# Seconds between checks for job writes made by other processes (queue workers, catalog CLI)
+REFRESH_INTERVAL = float(os.environ.get("READ_MODEL_REFRESH_SECONDS", "1"))
+
+RECORD_FIELDS = ("id", "name", "schedule", "command", "job_type", "timeout", "dependencies", "status", "last_run", "version", "owner")
+
+class JobRecord:
+    # Job metadata and run status without logs; one per job, so keep it compact
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, id, name, schedule, command, job_type, timeout, dependencies, status, last_run, version, owner):
+        self.id = id
+        self.name = name
+        self.schedule = schedule
+        self.command = command
+        self.job_type = job_type or "shell"
+        self.timeout = timeout
+        self.dependencies = tuple(json.loads(dependencies)) if dependencies else ()
+        self.status = status
+        self.last_run = last_run
+        self.version = version or 0
+        self.owner = owner
+
+    @classmethod
+    def from_values(cls, values):
+        return cls(*(values[field] for field in RECORD_FIELDS))
+
+class JobStateCache:
+    # Authoritative in-process view of every job's metadata and status. Writes made through
+    # SessionLocal in this process are applied when they commit; writes from other processes
+    # are picked up by change version (the same counter GET /jobs?since= uses).
+    def __init__(self, refresh_interval: float = REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._records = None
+        self._synced_version = 0
+        self._deleted = {}  # job ID -> version of the delete, until a refresh has seen it
+        self._checked = 0.0
+        self._lock = threading.RLock()
+        self._refreshing = threading.Lock()
+
+    def get(self, job_id: int):
+        self._ensure_fresh()
+        record = self._records.get(job_id)
+        if record is None:
+            record = self._load_one(job_id)
+        return record
+
+    def status(self, job_id: int):
+        record = self.get(job_id)
+        return record.status if record else None
+
+    def all(self):
+        self._ensure_fresh()
+        return list(self._records.values())
+
+    def search(self, text: str = None, status: str = None, owner: str = None, dependency: int = None):
+        # Records matching every given filter, by job ID. text matches the ID exactly, or the
+        # name or command case-insensitively.
+        text = text.strip().lower() if text else None
+        matches = []
+        for record in self.all():
+            if status and record.status != status:
+                continue
+            if owner and record.owner != owner:
+                continue
+            if dependency is not None and dependency not in record.dependencies:
+                continue
+            if text and not (
+                str(record.id) == text or text in record.name.lower() or text in (record.command or "").lower()
+            ):
+                continue
+            matches.append(record)
+        matches.sort(key=lambda record: record.id)
+        return matches
+
+    def _ensure_fresh(self):
+        if self._records is None:
+            self.load()
+        elif time.monotonic() - self._checked >= self.refresh_interval and self._refreshing.acquire(blocking=False):
+            # Only one thread refreshes; the others keep reading the current records
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing job read model: {e}")
+            finally:
+                self._refreshing.release()
+
+    def load(self):
+        session = SessionLocal()
+        try:
+            version = current_change_version(session)
+            records = {
+                job.id: self._record(job)
+                for job in session.query(Job).options(defer(Job.logs))
+            }
+        finally:
+            session.close()
+        with self._lock:
+            if self._records is None:
+                self._records = records
+                self._synced_version = version
+                self._checked = time.monotonic()
+                logger.info(f"Job read model loaded {len(records)} jobs at version {version}.")
+
+    def _load_one(self, job_id: int):
+        # Cache miss: a job created elsewhere since the last refresh, or a record dropped as stale
+        session = SessionLocal()
+        try:
+            job = session.query(Job).options(defer(Job.logs)).filter(Job.id == job_id).first()
+            record = self._record(job) if job else None
+        finally:
+            session.close()
+        if record is not None:
+            self._apply(record)
+        return record
+
+    def refresh(self):
+        # Apply job rows and deletions with a version newer than the last refresh
+        self._checked = time.monotonic()
+        session = SessionLocal()
+        try:
+            version = current_change_version(session)
+            if version <= self._synced_version:
+                return 0
+            since = self._synced_version
+            changed = [
+                self._record(job)
+                for job in session.query(Job).options(defer(Job.logs)).filter(Job.version > since)
+            ]
+            deletions = session.query(JobDeletion.job_id, JobDeletion.version).filter(JobDeletion.version > since).all()
+        finally:
+            session.close()
+        for record in changed:
+            self._apply(record)
+        with self._lock:
+            for job_id, deleted_version in deletions:
+                self._remove(job_id, deleted_version)
+            self._synced_version = max(self._synced_version, version)
+            # Rows read from now on were read after these deletes committed
+            self._deleted = {job_id: v for job_id, v in self._deleted.items() if v > version}
+        return len(changed) + len(deletions)
+
+    def _record(self, job):
+        return JobRecord.from_values({field: getattr(job, field) for field in RECORD_FIELDS})
+
+    def _apply(self, record):
+        # Never let an older read overwrite a newer write
+        with self._lock:
+            if self._records is None:
+                return
+            if self._deleted.get(record.id, -1) >= record.version:
+                return
+            current = self._records.get(record.id)
+            if current is None or current.version <= record.version:
+                self._records[record.id] = record
+
+    def _remove(self, job_id: int, version: int):
+        with self._lock:
+            if self._records is None:
+                return
+            current = self._records.get(job_id)
+            if current is None or current.version <= version:
+                self._records.pop(job_id, None)
+                self._deleted[job_id] = max(version, self._deleted.get(job_id, 0))
+
+    def _forget(self, job_id: int):
+        with self._lock:
+            if self._records is not None:
+                self._records.pop(job_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._records = None
+            self._deleted = {}
+            self._synced_version = 0
+
+# Create a singleton read model shared by the scheduler and the API.
+job_state = JobStateCache()
+
+@event.listens_for(SessionLocal, "after_flush")
+def collect_job_changes(session, flush_context):
+    # Snapshot the jobs this flush wrote; they are applied to the read model on commit
+    changes = session.info.setdefault("job_state_changes", {})
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Job):
+            continue
+        values = dict(inspect(obj).dict)
+        if obj in session.new:
+            # Columns never set on a new job were inserted as NULL
+            values = {field: values.get(field) for field in RECORD_FIELDS}
+        # An attribute that is expired would need a query here; drop the record instead
+        changes[obj.id] = JobRecord.from_values(values) if all(field in values for field in RECORD_FIELDS) else None
+    # stamp_change_version left a tombstone carrying the version of each delete
+    deleted_versions = {obj.job_id: obj.version for obj in session.new if isinstance(obj, JobDeletion)}
+    for obj in session.deleted:
+        if isinstance(obj, Job):
+            changes[obj.id] = ("deleted", deleted_versions.get(obj.id, obj.version or 0))
+
+@event.listens_for(SessionLocal, "after_commit")
+def apply_job_changes(session):
+    changes = session.info.pop("job_state_changes", None)
+    for job_id, change in (changes or {}).items():
+        if change is None:
+            job_state._forget(job_id)
+        elif isinstance(change, tuple):
+            job_state._remove(job_id, change[1])
+        else:
+            job_state._apply(change)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def discard_job_changes(session):
+    session.info.pop("job_state_changes", None)
@@ -0,0 +1,220 @@
+# runqueue.py
+import datetime
+import logging
+import os
+
+from sqlalchemy import and_, exists, func
+from sqlalchemy.orm import aliased
+
+from fairshare import finish_tag, owner_key, owner_policies
+from models import Job, QueuedRun, SessionLocal
+
+logger = logging.getLogger('uvicorn.error')
+
+# Seconds a claimed run stays leased without a heartbeat before it is re-queued
+LEASE_SECONDS = int(os.environ.get("RUN_LEASE_SECONDS", "60"))
+# Claims per run before an expired lease marks the run failed instead of re-queueing it
+MAX_ATTEMPTS = int(os.environ.get("RUN_MAX_ATTEMPTS", "3"))
+# Hours finished (done/failed) runs stay in run_queue; job logs and run stats keep their history
+RETENTION_HOURS = float(os.environ.get("RUN_QUEUE_RETENTION_HOURS", "24"))
+
+def enqueue_run(job_id: int):
+    # Queue one run of the job unless a run is already waiting (coalesces missed fires). A
+    # fire while the job runs queues one run behind it; claim_run holds it until the run ends.
+    session = SessionLocal()
+    try:
+        pending = session.query(QueuedRun.id).filter(
+            QueuedRun.job_id == job_id, QueuedRun.status == "queued"
+        ).first()
+        if pending:
+            logger.debug(f"Job ID {job_id} already has queued run {pending.id}; not enqueuing another.")
+            return None
+        owner = owner_key(session.query(Job.owner).filter(Job.id == job_id).scalar())
+        run = QueuedRun(job_id=job_id, status="queued", owner=owner, fair_tag=_fair_tag(session, owner))
+        session.add(run)
+        session.commit()
+        logger.info(f"Enqueued run {run.id} for job ID {job_id}.")
+        return run.id
+    finally:
+        session.close()
+
+def enqueue_runs(job_ids):
+    # enqueue_run for every job fired at one timer wakeup, in one transaction; returns the
+    # IDs of the runs queued
+    session = SessionLocal()
+    try:
+        pending = set()
+        owners = {}
+        for start in range(0, len(job_ids), 500):  # Stay under SQLite's bound-parameter limit
+            chunk = job_ids[start:start + 500]
+            pending.update(job_id for job_id, in session.query(QueuedRun.job_id).filter(
+                QueuedRun.job_id.in_(chunk), QueuedRun.status == "queued"
+            ))
+            owners.update(session.query(Job.id, Job.owner).filter(Job.id.in_(chunk)))
+        runs = []
+        for job_id in job_ids:
+            if job_id in pending:
+                logger.debug(f"Job ID {job_id} already has a queued run; not enqueuing another.")
+                continue
+            pending.add(job_id)
+            owner = owner_key(owners.get(job_id))
+            run = QueuedRun(job_id=job_id, status="queued", owner=owner, fair_tag=_fair_tag(session, owner))
+            session.add(run)
+            session.flush()  # The next run's fair tag builds on this one
+            runs.append(run)
+        session.commit()
+        if runs:
+            logger.info(f"Enqueued {len(runs)} runs for {len(job_ids)} fired jobs.")
+        return [run.id for run in runs]
+    finally:
+        session.close()
+
+def _fair_tag(session, owner: str):
+    # Virtual time is the tag of the next run to be claimed (the highest tag handed out, once
+    # the queue is empty); the owner's previous tag is that of its last waiting run
+    virtual_time = session.query(func.min(QueuedRun.fair_tag)).filter(QueuedRun.status == "queued").scalar()
+    if virtual_time is None:
+        virtual_time = session.query(func.max(QueuedRun.fair_tag)).scalar()
+    last_tag = session.query(func.max(QueuedRun.fair_tag)).filter(
+        QueuedRun.status == "queued", QueuedRun.owner == owner
+    ).scalar()
+    return finish_tag(virtual_time or 0.0, last_tag, owner_policies.weight(owner))
+
+def _job_idle():
+    # No run of the queued run's job is claimed: a job never runs twice at once
+    claimed = aliased(QueuedRun)
+    return ~exists().where(and_(claimed.job_id == QueuedRun.job_id, claimed.status == "claimed"))
+
+def _next_candidate(session):
+    # The lowest-tagged queued run of an idle job among owners below their running limit (runs
+    # queued before fair tags existed go first, oldest first)
+    running = dict(session.query(QueuedRun.owner, func.count(QueuedRun.id)).filter(
+        QueuedRun.status == "claimed"
+    ).group_by(QueuedRun.owner))
+    heads = session.query(QueuedRun.owner, func.min(func.coalesce(QueuedRun.fair_tag, 0.0))).filter(
+        QueuedRun.status == "queued", _job_idle()
+    ).group_by(QueuedRun.owner).all()
+    for owner, tag in sorted(heads, key=lambda head: head[1]):
+        limit = owner_policies.max_running(owner)
+        if limit and running.get(owner, 0) >= limit:
+            continue
+        return session.query(QueuedRun.id, QueuedRun.job_id).filter(
+            QueuedRun.status == "queued", QueuedRun.owner.is_(owner) if owner is None else QueuedRun.owner == owner,
+            _job_idle(),
+        ).order_by(func.coalesce(QueuedRun.fair_tag, 0.0), QueuedRun.id).first()
+    return None
+
+def claim_run(worker_id: str, lease_seconds: int = LEASE_SECONDS):
+    # Claim the next queued run in weighted fair order across owners. The conditional UPDATE
+    # makes the claim atomic: if another worker took the candidate, or another run of its job,
+    # first, the row count is 0 and we try the next one.
+    session = SessionLocal()
+    try:
+        while True:
+            candidate = _next_candidate(session)
+            if candidate is None:
+                return None
+            now = datetime.datetime.utcnow()
+            claimed = session.query(QueuedRun).filter(
+                QueuedRun.id == candidate.id, QueuedRun.status == "queued", _job_idle()
+            ).update({
+                QueuedRun.status: "claimed",
+                QueuedRun.worker_id: worker_id,
+                QueuedRun.lease_expires: now + datetime.timedelta(seconds=lease_seconds),
+                QueuedRun.attempts: QueuedRun.attempts + 1,
+                QueuedRun.started_at: now,
+            }, synchronize_session=False)
+            session.commit()
+            if claimed:
+                return candidate
+    finally:
+        session.close()
+
+def heartbeat(run_id: int, worker_id: str, lease_seconds: int = LEASE_SECONDS):
+    # Extend the lease; returns False if the lease was lost (expired and re-queued)
+    session = SessionLocal()
+    try:
+        extended = session.query(QueuedRun).filter(
+            QueuedRun.id == run_id, QueuedRun.worker_id == worker_id, QueuedRun.status == "claimed"
+        ).update({
+            QueuedRun.lease_expires: datetime.datetime.utcnow() + datetime.timedelta(seconds=lease_seconds),
+        }, synchronize_session=False)
+        session.commit()
+        return bool(extended)
+    finally:
+        session.close()
+
+def finish_run(run_id: int, worker_id: str, succeeded: bool, message: str):
+    session = SessionLocal()
+    try:
+        finished = session.query(QueuedRun).filter(
+            QueuedRun.id == run_id, QueuedRun.worker_id == worker_id, QueuedRun.status == "claimed"
+        ).update({
+            QueuedRun.status: "done" if succeeded else "failed",
+            QueuedRun.finished_at: datetime.datetime.utcnow(),
+            QueuedRun.lease_expires: None,
+            QueuedRun.result: message,
+        }, synchronize_session=False)
+        session.commit()
+        if not finished:
+            logger.warning(f"Run {run_id} finished on '{worker_id}' after its lease was lost.")
+        return bool(finished)
+    finally:
+        session.close()
+
+def requeue_expired(max_attempts: int = MAX_ATTEMPTS, retention_hours: float = RETENTION_HOURS):
+    # Put runs whose worker stopped heartbeating back in the queue (or fail them after
+    # max_attempts), and delete finished runs older than retention_hours
+    session = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        expired = session.query(QueuedRun).filter(
+            QueuedRun.status == "claimed", QueuedRun.lease_expires < now
+        )
+        failed = expired.filter(QueuedRun.attempts >= max_attempts).update({
+            QueuedRun.status: "failed",
+            QueuedRun.finished_at: now,
+            QueuedRun.lease_expires: None,
+            QueuedRun.result: "Lease expired too many times",
+        }, synchronize_session=False)
+        requeued = expired.filter(QueuedRun.attempts < max_attempts).update({
+            QueuedRun.status: "queued",
+            QueuedRun.worker_id: None,
+            QueuedRun.lease_expires: None,
+        }, synchronize_session=False)
+        purged = session.query(QueuedRun).filter(
+            QueuedRun.status.in_(("done", "failed")),
+            QueuedRun.finished_at < now - datetime.timedelta(hours=retention_hours),
+        ).delete(synchronize_session=False)
+        session.commit()
+        if failed or requeued:
+            logger.warning(f"Expired leases: {requeued} runs re-queued, {failed} runs failed.")
+        if purged:
+            logger.info(f"Deleted {purged} finished runs older than {retention_hours:g} hours from the run queue.")
+        return requeued, failed
+    finally:
+        session.close()
+
+def owner_load():
+    # {owner: {"running": n, "queued": n}} across all workers
+    session = SessionLocal()
+    try:
+        load = {}
+        for owner, run_status, count in session.query(QueuedRun.owner, QueuedRun.status, func.count(QueuedRun.id)).filter(
+            QueuedRun.status.in_(("queued", "claimed"))
+        ).group_by(QueuedRun.owner, QueuedRun.status):
+            counts = load.setdefault(owner_key(owner), {"running": 0, "queued": 0})
+            counts["running" if run_status == "claimed" else "queued"] += count
+        return load
+    finally:
+        session.close()
+
+def queue_depth():
+    session = SessionLocal()
+    try:
+        counts = {"queued": 0, "claimed": 0}
+        for status in counts:
+            counts[status] = session.query(QueuedRun).filter(QueuedRun.status == status).count()
+        return counts
+    finally:
+        session.close()
@@ -1,75 +1,321 @@
 # scheduler.py
+import collections
+import contextvars
 import datetime
 import json
-import subprocess
-from threading import Thread
+import os
+from threading import Condition, Event, Lock, Thread
 import logging
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from apscheduler.jobstores.base import JobLookupError
-from apscheduler.job import Job as APSJob
+from apscheduler.util import localize
 
-from models import Job, SessionLocal
+from events import event_bus
+from executor import TimedOut, execute
+from fairshare import POLICY_REFRESH_SECONDS, FairQueue, owner_key, owner_policies
+from filewatch import FileWatcher
+from forecast import FireTimeCache, collisions, forecast
+from models import Job, SessionLocal, current_change_version
+from pyworkers import python_pool
+from readmodel import job_state
+from runqueue import LEASE_SECONDS, enqueue_run, enqueue_runs, owner_load, requeue_expired
+from timeouts import resolve_timeout, uses_history
+from timerqueue import TimerQueue
+from tracing import span
+from triggers import EventTrigger, FileTrigger, WebhookTrigger, build_trigger
+from writebehind import run_state_writer
 
 # Configure logger
 logger = logging.getLogger('uvicorn.error')
 logger.setLevel(logging.DEBUG)
 
+# "inline": fires run in this process. "queue": fires are only enqueued in run_queue and
+# executed by separate worker processes (python -m worker).
+EXECUTION_MODE = os.environ.get("SCHEDULER_EXECUTION_MODE", "inline")
+# Runs executed at once in inline mode, whatever triggered them
+RUN_WORKERS = int(os.environ.get("SCHEDULER_RUN_WORKERS", "10"))
+
+class FairDispatcher:
+    # Inline execution: fires wait in a FairQueue and `workers` threads run them in weighted
+    # fair order across job owners, each owner held to its max_running. Like APScheduler's
+    # max_instances=1 a job never runs twice at once, but a fire arriving while it runs isn't
+    # dropped: the job runs once more afterwards, however many fires arrived meanwhile.
+    def __init__(self, run, workers: int = RUN_WORKERS, policies=owner_policies):
+        self._run = run
+        self.workers = workers
+        self._policies = policies
+        self._queue = FairQueue(policies.weight)
+        self._condition = Condition()
+        self._waiting = set()  # Keys (job IDs, unless given) of runs in the queue
+        self._running = {}  # key -> owner
+        self._running_by_owner = collections.Counter()
+        self._threads = []
+        self._stopping = False
+
+    def submit(self, job_id: int, owner, source: str, run=None, key=None):
+        # Returns False when the fire was folded into a run already waiting. run(job_id) stands
+        # in for the dispatcher's run function (backfill runs); key, the job ID by default,
+        # names the run for folding and for never running it twice at once.
+        key = job_id if key is None else key
+        weight = self._policies.weight(owner)
+        # The run stays in the caller's trace (the scheduler fire or webhook request)
+        context = contextvars.copy_context()
+        with self._condition:
+            if key in self._waiting:
+                return False
+            if not self._threads:
+                self._threads = [
+                    Thread(target=self._work, name=f"run-worker-{index}", daemon=True)
+                    for index in range(self.workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+            self._waiting.add(key)
+            self._queue.push(owner, (key, job_id, source, context, run or self._run), weight=weight)
+            self._condition.notify()
+        return True
+
+    def _owner_ready(self, owner):
+        # Called holding the condition: the cached settings only
+        limit = self._policies.max_running(owner, refresh=False)
+        return not limit or self._running_by_owner[owner] < limit
+
+    def _work(self):
+        while True:
+            # Outside the condition, so a settings query doesn't hold up submit() and the other workers
+            self._policies.refresh()
+            with self._condition:
+                if self._stopping:
+                    return
+                entry = self._queue.pop(self._owner_ready, lambda item: item[0] not in self._running)
+                if entry is None:
+                    # Runs held back by a limit are retried when settings may have changed
+                    self._condition.wait(POLICY_REFRESH_SECONDS if self._queue else None)
+                    continue
+                owner, (key, job_id, source, context, run) = entry
+                self._waiting.discard(key)
+                self._running[key] = owner
+                self._running_by_owner[owner] += 1
+            try:
+                context.run(run, job_id)
+            except Exception as e:
+                logger.error(f"Error running job ID {job_id} for {source} trigger: {e}")
+            finally:
+                with self._condition:
+                    del self._running[key]
+                    self._running_by_owner[owner] -= 1
+                    if not self._running_by_owner[owner]:
+                        del self._running_by_owner[owner]
+                    self._condition.notify_all()
+
+    def withdraw(self, keys):
+        # Drop waiting runs by key (a stopped backfill's); returns the keys of those that were
+        # still waiting, the others having started already
+        with self._condition:
+            withdrawn = self._waiting & set(keys)
+            self._queue.remove(lambda item: item[0] in withdrawn)
+            self._waiting -= withdrawn
+        return withdrawn
+
+    def wake(self):
+        # Re-check waiting runs, e.g. after an owner's limit was raised
+        with self._condition:
+            self._condition.notify_all()
+
+    def load(self):
+        # {owner: {"running": n, "queued": n}}
+        with self._condition:
+            load = {owner: {"running": count, "queued": 0} for owner, count in self._running_by_owner.items()}
+            for owner, count in self._queue.queued().items():
+                load.setdefault(owner, {"running": 0, "queued": 0})["queued"] = count
+        return load
+
+    def shutdown(self):
+        # Runs in progress finish; waiting ones are dropped
+        with self._condition:
+            self._stopping = True
+            self._queue.remove(lambda item: True)
+            self._waiting.clear()
+            self._condition.notify_all()
+
 class JobScheduler:
-    def __init__(self):
-        self.scheduler = BackgroundScheduler()
+    def __init__(self, execution_mode: str = EXECUTION_MODE):
+        # Next fire times of cron, interval and date schedules
+        self.timers = TimerQueue(self._fire_due, self._on_rescheduled)
+        self.execution_mode = execution_mode
+        self._monitor_stop = Event()
+        # Precomputed fire times per job for forecasts; entries are dropped on schedule edits
+        self.fire_times = FireTimeCache()
+        # File and webhook triggers live outside the timer queue
+        self.file_watcher = FileWatcher()
+        # Inline runs from every trigger, in fair order across owners
+        self.dispatcher = FairDispatcher(self.run_job)
+        self.event_triggers = {}  # job_id -> EventTrigger
+        self._event_lock = Lock()
+    
+    def publish(self, job_id: int, event: str, **fields):
+        # Push a job state change to the event bus (consumed by /ws/jobs)
+        event_bus.publish({"type": "job", "event": event, "job": {"id": job_id, **fields}})
+    
+    def _on_rescheduled(self, job_ids):
+        # After fires (run or skipped) the timer queue has moved these jobs' next fire times
+        for job_id in job_ids:
+            self.publish(job_id, "next_run", next_run=self.get_next_run_time(job_id))
     
     def start(self):
         try:
-            self.scheduler.start()
+            self.timers.start()
             self.load_jobs()
-            logger.info("Scheduler started.")
+            if self.execution_mode == "queue":
+                self._monitor_stop.clear()
+                Thread(target=self._monitor_queue, name="run-queue-monitor", daemon=True).start()
+            logger.info(f"Scheduler started ({self.execution_mode} execution).")
         except Exception as e:
             logger.error(f"Failed to start scheduler: {e}")
     
+    def _fire_due(self, batch):
+        # Called by the timer queue with every (job ID, fire time) due at one wakeup
+        if self.execution_mode == "queue" and len(batch) > 1:
+            with span("scheduler.fire", root=True,
+                      **{"scheduler.mode": self.execution_mode, "trigger.source": "schedule", "fire.batch": len(batch)}):
+                enqueue_runs([job_id for job_id, _ in batch])
+            return
+        for job_id, _ in batch:
+            self.fire(job_id)
+    
+    def fire(self, job_id: int, source: str = "schedule"):
+        # Called by the timer queue when a job's trigger fires, or by a file/webhook trigger;
+        # each fire is a trace root
+        with span("scheduler.fire", root=True,
+                  **{"job.id": job_id, "scheduler.mode": self.execution_mode, "trigger.source": source}):
+            if self.execution_mode == "queue":
+                enqueue_run(job_id)
+            else:
+                record = job_state.get(job_id)
+                if not self.dispatcher.submit(job_id, owner_key(record.owner if record else None), source):
+                    logger.debug(f"Job ID {job_id} already has a run waiting; {source} fire folded into it.")
+    
+    def _monitor_queue(self):
+        # Queue mode: re-queue runs whose worker died, and since workers write job state in
+        # their own processes, tell dashboards to resync whenever the change version moves
+        last_version = None
+        ticks = 0
+        while not self._monitor_stop.wait(1):
+            try:
+                ticks += 1
+                if ticks % max(LEASE_SECONDS // 4, 1) == 0:
+                    requeue_expired()
+                session = SessionLocal()
+                try:
+                    version = current_change_version(session)
+                finally:
+                    session.close()
+                if last_version is not None and version != last_version:
+                    event_bus.publish({"type": "resync"})
+                last_version = version
+            except Exception as e:
+                logger.error(f"Run queue monitor error: {e}")
+    
     def load_jobs(self):
-        # Load jobs from the database and schedule them
+        # Schedule the jobs in the read model (loading it from the database now rather than
+        # at the first fire, which needs it for the job's owner)
         try:
-            session = SessionLocal()
-            jobs = session.query(Job).filter(Job.status != "inactive").all()
+            jobs = [record for record in job_state.all() if record.status != "inactive"]
             logger.info(f"Loaded {len(jobs)} jobs from the database.")
-            for job in jobs:
-                self.schedule_job(job)
-            session.close()
+            self.schedule_jobs(jobs)
         except Exception as e:
             logger.error(f"Error loading jobs: {e}")
     
     def schedule_job(self, job: Job):
-        # Parse the schedule JSON
-        try:
-            schedule_params = json.loads(job.schedule)
-            trigger = CronTrigger(**schedule_params)
-        except json.JSONDecodeError:
-            logger.error(f"Invalid schedule format for job '{job.name}'. Skipping scheduling.")
-            return
-        except TypeError as e:
-            logger.error(f"Error parsing schedule for job '{job.name}': {e}")
-            return
-        
-        # Add the job to APScheduler
-        try:
-            self.scheduler.add_job(
-                func=self.run_job,
-                trigger=trigger,
-                args=[job.id],
-                id=str(job.id),
-                replace_existing=True,
-                name=job.name
-            )
+        if self.schedule_jobs([job], publish=False):
             logger.info(f"Scheduled job '{job.name}' with ID {job.id}.")
+            self.publish(job.id, "scheduled", name=job.name, status=job.status, next_run=self.get_next_run_time(job.id))
+    
+    def schedule_jobs(self, jobs, publish: bool = True):
+        # Bulk (re)schedule; time-based jobs go into the timer queue in one batch, and
+        # dashboards get one resync event instead of one event per job
+        timers = []
+        scheduled = 0
+        for job in jobs:
+            # One bad schedule mustn't keep every other job from being scheduled
+            try:
+                trigger = self._prepare_trigger(job)
+                if trigger is None:
+                    continue
+                if isinstance(trigger, EventTrigger):
+                    self._add_event_trigger(job, trigger)
+                else:
+                    timers.append((job.id, trigger, job.name))
+            except Exception as e:
+                logger.error(f"Error scheduling job '{job.name}' with ID {job.id}: {e}. Skipping scheduling.")
+                continue
+            scheduled += 1
+        try:
+            self.timers.add_many(timers)
         except Exception as e:
-            logger.error(f"Failed to schedule job '{job.name}' (ID: {job.id}): {e}")
+            logger.error(f"Failed to schedule {len(timers)} jobs: {e}")
+            scheduled -= len(timers)
+        if len(jobs) > 1:
+            logger.info(f"Scheduled {scheduled} of {len(jobs)} jobs.")
+        if scheduled and publish:
+            event_bus.publish({"type": "resync"})
+        return scheduled
+    
+    def _prepare_trigger(self, job: Job):
+        # The job's parsed trigger, with its previous trigger (of either kind) removed;
+        # None if the schedule isn't usable
+        try:
+            trigger = build_trigger(job.schedule, spread_key=job.id)
+        except ValueError as e:
+            logger.error(f"Error parsing schedule for job '{job.name}': {e}. Skipping scheduling.")
+            return None
+        self.fire_times.invalidate(job.id)
+        self._remove_event_trigger(job.id)
+        if isinstance(trigger, EventTrigger):
+            self.timers.remove(job.id)  # Switching from a time-based schedule
+        return trigger
     
+    def _add_event_trigger(self, job: Job, trigger: EventTrigger):
+        job_id = job.id
+        with self._event_lock:
+            self.event_triggers[job_id] = trigger
+        if isinstance(trigger, FileTrigger):
+            self.file_watcher.watch(
+                job_id, trigger.path, trigger.debounce,
+                lambda: self.fire(job_id, "file"), pattern=trigger.pattern,
+            )
+        logger.info(f"Job '{job.name}' with ID {job_id} fires on {trigger}.")
+
+    def _remove_event_trigger(self, job_id: int):
+        with self._event_lock:
+            trigger = self.event_triggers.pop(job_id, None)
+        if isinstance(trigger, FileTrigger):
+            self.file_watcher.unwatch(job_id)
+        return trigger
+
+    def trigger_webhook(self, name: str):
+        # Fire every active job with a webhook trigger of this name; returns their IDs
+        with self._event_lock:
+            job_ids = [
+                job_id for job_id, trigger in self.event_triggers.items()
+                if isinstance(trigger, WebhookTrigger) and trigger.name == name
+            ]
+        job_ids = [job_id for job_id in job_ids if job_state.status(job_id) != "inactive"]
+        for job_id in job_ids:
+            self.fire(job_id, "webhook")
+        return job_ids
+
     def run_job(self, job_id: int):
-        session = SessionLocal()
+        # A child of the API request or scheduler fire that called it, else a trace of its own
+        with span("run_job", root=True, **{"job.id": job_id}) as run_span:
+            rc, message = self._run_job(job_id, run_span)
+            run_span.set_attribute("run.result", message)
+            return rc, message
+
+    def _run_job(self, job_id: int, run_span):
+        job = None
         try:
-            job = session.query(Job).filter(Job.id == job_id).first()
+            # Status and dependency checks are read model lookups; the DB only sees the writes
+            job = job_state.get(job_id)
             if not job:
                 logger.error(f"Job with ID {job_id} not found.")
                 return 8,"Job not found"
@@ -80,124 +326,175 @@ class JobScheduler:
                 return 8,"Job is inactive"
             
             # Check dependencies
-            dependencies = json.loads(job.dependencies) if job.dependencies else []
-            if dependencies:
-                parent_jobs = session.query(Job).filter(Job.id.in_(dependencies)).all()
+            if job.dependencies:
+                parent_jobs = [parent for parent in map(job_state.get, job.dependencies) if parent]
                 incomplete_deps = [parent.name for parent in parent_jobs if parent.status != "complete"]
                 if incomplete_deps:
                     logger.debug(f"Job '{job.name}' is waiting for dependencies to complete: {', '.join(incomplete_deps)}.")
                     return 8,"Dependencies not complete"
             
-            job.status = "running"
-            session.commit()
+            job_id, job_name = job.id, job.name
+            run_span.set_attribute("job.name", job_name)
+            run_state_writer.set_status(
+                job_id, "running", on_commit=lambda _: self.publish(job_id, "status", status="running")
+            )
 
             rc = 0
             message = "Job started"
+            # Run history is only read when an adaptive limit needs it
+            timeout = resolve_timeout(job, self._load_logs(job_id) if uses_history(job) else [])
             # Execute the command
             start_time = datetime.datetime.utcnow()
-            logger.info(f"Executing job '{job.name}' (ID: {job.id})...")
-            result = subprocess.run(job.command, shell=True, capture_output=True, text=True)
+            logger.info(f"Executing job '{job_name}' (ID: {job_id})...")
+            result = execute(job, timeout=timeout)
             end_time = datetime.datetime.utcnow()
             execution_time = (end_time - start_time).total_seconds()
+            timed_out = isinstance(result, TimedOut)
             
             # Update job logs
             log_entry = {
                 "timestamp": end_time.isoformat(),
                 "stdout": result.stdout,
                 "stderr": result.stderr,
-                "execution_time": execution_time
+                "execution_time": execution_time,
+                "cpu_seconds": result.cpu_seconds,
+                "timeout": timeout,
+                "timed_out": timed_out,
             }
-            if isinstance(execution_time, (int, float)):
-                logs = json.loads(job.logs) if job.logs else []
-                logs.append(log_entry)
-                job.logs = json.dumps(logs)
-            else:
-                logger.error(f"Invalid execution_time for job '{job.name}' (ID: {job.id}): {execution_time}")
+            if not isinstance(execution_time, (int, float)):
+                logger.error(f"Invalid execution_time for job '{job_name}' (ID: {job_id}): {execution_time}")
+                log_entry = None
                 rc = 8
                 message = "Invalid execution_time"  
-            # Update job status based on execution result
-            if result.returncode == 0:
-                job.status = "complete"
-                logger.info(f"Job '{job.name}' completed successfully.")
-                
-                # --- New code: Update all parent jobs ---
-                try:
-                    dependencies = json.loads(job.dependencies) if job.dependencies else []
-                except Exception as e:
-                    logger.error(f"Error parsing dependencies for job '{job.name}': {e}")
-                    dependencies = []
-                if dependencies:
-                    parent_jobs = session.query(Job).filter(Job.id.in_(dependencies)).all()
-                    for parent in parent_jobs:
-                        if parent.status == "complete":
-                            parent.status = "scheduled"
-                            logger.info(f"Parent job '{parent.name}' status updated from complete to scheduled.")
-                # --- End new code ---
-                
+            # Update job status based on execution result; parents of a completed job are
+            # reset to scheduled when the run is written
+            if result.returncode == 0 and not timed_out:
+                status = "complete"
+                logger.info(f"Job '{job_name}' completed successfully.")
+            elif timed_out:
+                status = "timed_out"
+                logger.error(f"Job '{job_name}' timed out after {timeout:g}s; its process group was killed.")
+                rc = 8
+                message = "Job timed out"
             else:
-                job.status = "failed"
-                logger.error(f"Job '{job.name}' failed with return code {result.returncode}.")
+                status = "failed"
+                logger.error(f"Job '{job_name}' failed with return code {result.returncode}.")
                 rc = 8
                 message = "Job failed"
-            
-            job.last_run = end_time
-            session.commit()
-            logger.info(f"Job '{job.name}' (ID: {job.id}) status updated to '{job.status}'.")
+
+            def published(write):
+                logger.info(f"Job '{job_name}' (ID: {job_id}) status updated to '{status}'.")
+                self.publish(
+                    job_id, "run",
+                    status=status,
+                    last_run=end_time.isoformat(),
+                    run_count=write.run_count,
+                    next_run=self.get_next_run_time(job_id),
+                )
+                for parent_id in write.reset_parents:
+                    self.publish(parent_id, "status", status="scheduled")
+
+            run_span.set_attribute("run.status", status)
+            if status != "complete":
+                run_span.set_error(message)
+            # In group/async durability this includes waiting for the batch commit
+            with span("run_state.record_run", **{"run_state.durability": run_state_writer.durability}):
+                run_state_writer.record_run(job_id, status, end_time, log_entry, on_commit=published)
             return rc,message
         except Exception as e:
             logger.error(f"Error executing job '{job.name}': {e}")
+            run_span.set_error(f"{type(e).__name__}: {e}")
             if job:
-                job.status = "failed"
-                session.commit()
+                run_state_writer.set_status(
+                    job.id, "failed", on_commit=lambda _: self.publish(job.id, "status", status="failed")
+                )
             return 8,"Job failed"
+    
+    def _load_logs(self, job_id: int):
+        session = SessionLocal()
+        try:
+            logs = session.query(Job.logs).filter(Job.id == job_id).scalar()
+            return json.loads(logs) if logs else []
         finally:
             session.close()
     
     def get_next_run_time(self, job_id: int):
-        try:
-            aps_job = self.scheduler.get_job(str(job_id))
-            if aps_job:
-                next_run_time = getattr(aps_job, 'next_run_time', None)
-                logger.debug(f"APS Job: {aps_job.name}, next_run_time: {next_run_time}")
-                session = SessionLocal()
-                db_job = session.query(Job).filter(Job.id == job_id).first()
-                if db_job and db_job.status == "inactive":
-                    session.close()
-                    return None
-                session.close()
-                return next_run_time.isoformat() if next_run_time else None
-            else:
-                logger.debug(f"No APS job found for job_id: {job_id}")
-                return None
-        except JobLookupError:
-            logger.error(f"Job ID {job_id} not found in scheduler.")
+        next_run_time = self.timers.next_fire_time(job_id)
+        if next_run_time is None or job_state.status(job_id) == "inactive":
             return None
+        return next_run_time.isoformat()
+    
+    @property
+    def schedule_version(self):
+        # Moves whenever any job's next run time changes (fires included), unlike the change version
+        return self.timers.generation
+    
+    def next_runs_since(self, schedule_version: int):
+        # job_id -> next run time of the jobs whose next run changed after schedule_version
+        return {
+            job_id: None if next_run_time is None or job_state.status(job_id) == "inactive" else next_run_time.isoformat()
+            for job_id, next_run_time in self.timers.changed_since(schedule_version).items()
+        }
     
     def stop(self):
+        self._monitor_stop.set()
         try:
-            self.scheduler.shutdown()
+            self.timers.stop()
+            self.file_watcher.stop()
+            self.dispatcher.shutdown()
+            # Commit run state still buffered by the write-behind writer
+            run_state_writer.stop()
+            python_pool.shutdown()
             logger.info("Scheduler stopped.")
         except Exception as e:
             logger.error(f"Error stopping scheduler: {e}")
     
     def delete_job(self, job_id: int):
-        try:
-            self.scheduler.remove_job(str(job_id))
-            logger.info(f"Removed job with ID {job_id} from scheduler.")
-        except JobLookupError:
+        event_trigger = self._remove_event_trigger(job_id)
+        if not event_trigger and not self.timers.remove(job_id):
             logger.error(f"Job ID {job_id} not found in scheduler.")
-        except Exception as e:
-            logger.error(f"Error removing job ID {job_id}: {e}")
+            return
+        self.fire_times.invalidate(job_id)
+        logger.info(f"Removed job with ID {job_id} from scheduler.")
+        self.publish(job_id, "next_run", next_run=None)
+    
+    def delete_jobs(self, job_ids):
+        # Bulk removal counterpart of schedule_jobs
+        for job_id in job_ids:
+            self.fire_times.invalidate(job_id)
+            self._remove_event_trigger(job_id)
+            self.timers.remove(job_id)
+        if job_ids:
+            logger.info(f"Removed {len(job_ids)} jobs from scheduler.")
+            event_bus.publish({"type": "resync"})
+    
+    def forecast(self, start: datetime.datetime, end: datetime.datetime, limit: int = 1000):
+        # Fire times of all active jobs in [start, end), in time order, with per-minute load
+        start, end = self._localize(start), self._localize(end)
+        return forecast(self._active_triggers(), self.fire_times, start, end, limit)
+    
+    def collisions(self, start: datetime.datetime, end: datetime.datetime, top: int = 10):
+        # Busiest minutes and seconds in [start, end), after spreading
+        start, end = self._localize(start), self._localize(end)
+        return collisions(self._active_triggers(), self.fire_times, start, end, top)
     
+    def _localize(self, value: datetime.datetime):
+        return localize(value, self.timers.timezone) if value.tzinfo is None else value
+    
+    def _active_triggers(self):
+        inactive = {record.id for record in job_state.all() if record.status == "inactive"}
+        return [
+            (job_id, name, trigger)
+            for job_id, name, trigger in self.timers.entries()
+            if job_id not in inactive
+        ]
+    
+    def owner_load(self):
+        # Runs in progress and waiting per owner: this process's dispatcher, or the run queue
+        return owner_load() if self.execution_mode == "queue" else self.dispatcher.load()
+
     def get_job_status(self, job_id: int):
-        session = SessionLocal()
-        try:
-            job = session.query(Job).filter(Job.id == job_id).first()
-            if job:
-                return job.status
-            return "unknown"
-        finally:
-            session.close()
+        return job_state.status(job_id) or "unknown"
 
 # Create a singleton scheduler instance for the API to use.
 job_scheduler = JobScheduler()
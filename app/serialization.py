@@ -0,0 +1,25 @@
+# serialization.py
+import json
+from functools import lru_cache
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib json module is used without it
+    orjson = None
+
+# Default response class for the API: orjson encodes job lists several times faster
+JSONResponseClass = ORJSONResponse if orjson is not None else JSONResponse
+
+def loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def dumps(value) -> str:
+    return orjson.dumps(value).decode() if orjson is not None else json.dumps(value)
+
+@lru_cache(maxsize=16384)
+def parse_cached(text: str):
+    # Schedule and dependency columns repeat across jobs and rarely change, so each distinct
+    # value is decoded once. The result is shared: never mutate it.
+    return loads(text)
@@ -0,0 +1,295 @@
+# simulate.py
+import argparse
+import collections
+import datetime
+import heapq
+import json
+import random
+import time
+
+from sqlalchemy import func
+
+from catalog import CatalogError, load_catalog, normalize_schedule
+from fairshare import FairQueue, owner_key, owner_policies
+from forecast import MAX_FIRES_PER_JOB, capped_jobs, fire_times_between
+from models import Job, RunStat, SessionLocal
+from scheduler import RUN_WORKERS
+from timeouts import ADAPTIVE_WINDOW, percentile, resolve_timeout
+from triggers import EventTrigger, OffsetTrigger, build_trigger
+
+DEFAULT_WORKERS = RUN_WORKERS  # What JobScheduler runs inline fires with
+DEFAULT_DURATION = 1.0  # Seconds, for jobs without run history
+MAX_HOURS = 168
+SATURATED_MINUTES_LISTED = 50
+BUSIEST_JOBS_LISTED = 10
+
+class SimulatedJob:
+    def __init__(self, job_id, name, trigger, durations, success_rate=1.0, dependencies=(), status="scheduled",
+                 owner=None):
+        self.id = job_id
+        self.name = name
+        self.trigger = trigger
+        self.durations = durations  # Sampled with replacement
+        self.success_rate = success_rate
+        self.dependencies = list(dependencies)
+        self.status = status
+        self.owner = owner_key(owner)
+
+def _durations(job, logs, default_duration: float):
+    # Recent run times, capped at the job's current time limit (runs over it are killed)
+    durations = [
+        entry["execution_time"] for entry in logs[-ADAPTIVE_WINDOW:]
+        if isinstance(entry.get("execution_time"), (int, float))
+    ]
+    limit = resolve_timeout(job, logs)
+    if limit:
+        durations = [min(duration, limit) for duration in durations]
+    return durations or [default_duration]
+
+def load_jobs(session, default_duration: float = DEFAULT_DURATION, catalog_entries=()):
+    # The active catalog as SimulatedJobs, triggers built exactly as JobScheduler builds them.
+    # catalog_entries (proposed jobs, as in a catalog file) are added, or replace jobs of the
+    # same name; an entry's optional "duration" (seconds) stands in for run history, its
+    # optional "owner" for the job's owner.
+    # Returns (jobs, number of event-triggered jobs left out, current status of every job).
+    success = {
+        job_id: (count - failures) / count
+        for job_id, count, failures in session.query(
+            RunStat.job_id, func.sum(RunStat.count), func.sum(RunStat.failures)
+        ).filter(RunStat.granularity == "day").group_by(RunStat.job_id)
+        if count
+    }
+    rows = {job.name: job for job in session.query(Job).filter(Job.status != "inactive")}
+    statuses = {job_id: status for job_id, status in session.query(Job.id, Job.status)}
+    specs = {}
+    for job in rows.values():
+        logs = json.loads(job.logs) if job.logs else []
+        specs[job.name] = (job.id, job.schedule, _durations(job, logs, default_duration),
+                           success.get(job.id, 1.0), json.loads(job.dependencies or "[]"), job.status, job.owner)
+    next_id = max(statuses, default=0) + 1
+    for entry in catalog_entries:
+        if not isinstance(entry, dict) or not entry.get("name"):
+            raise CatalogError("Every catalog entry needs a name.")
+        name = entry["name"]
+        if entry.get("status", "scheduled") == "inactive":
+            specs.pop(name, None)
+            continue
+        try:
+            schedule = normalize_schedule(entry.get("schedule"))
+        except CatalogError as e:
+            raise CatalogError(f"Job '{name}': {e}")
+        current = specs.get(name)
+        if current is not None:
+            job_id, durations, success_rate, owner = current[0], current[2], current[3], current[6]
+        else:
+            job_id, durations, success_rate, owner = next_id, [default_duration], 1.0, None
+            next_id += 1
+        if isinstance(entry.get("duration"), (int, float)):
+            durations = [float(entry["duration"])]
+        specs[name] = (job_id, schedule, durations, success_rate, entry.get("dependencies") or [], "scheduled",
+                       entry.get("owner", owner))
+
+    ids_by_name = {name: spec[0] for name, spec in specs.items()}
+    jobs, event_triggered = [], 0
+    for name, (job_id, schedule, durations, success_rate, dependencies, status, owner) in specs.items():
+        try:
+            trigger = build_trigger(schedule, spread_key=job_id)
+        except Exception:
+            continue  # The scheduler skips these too
+        if isinstance(trigger, EventTrigger):
+            event_triggered += 1
+            continue
+        # Dependencies are job IDs; proposed jobs may also name them
+        parents = [ids_by_name.get(parent, parent) for parent in dependencies]
+        jobs.append(SimulatedJob(job_id, name, trigger, durations, success_rate, parents, status, owner))
+    return jobs, event_triggered, statuses
+
+def _summary(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "p50": round(percentile(values, 0.5), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "p99": round(percentile(values, 0.99), 3),
+        "max": round(max(values), 3),
+    }
+
+def simulate(jobs, start: datetime.datetime, hours: float, workers: int = DEFAULT_WORKERS,
+             seed: int = 0, statuses=None, policies=owner_policies):
+    # Discrete-event simulation of `workers` execution slots over [start, start + hours).
+    # Inline and queue execution share the ordering modelled here: fires wait in weighted fair
+    # order across owners (each held to its running limit from policies), a fire is folded into
+    # the job's run that is already waiting, and a job never runs twice at once (FairDispatcher
+    # inline, claim_run in queue mode). statuses holds the starting status of jobs outside
+    # `jobs` that may be dependencies (e.g. inactive ones).
+    started = time.perf_counter()
+    end = start + datetime.timedelta(hours=hours)
+    rng = random.Random(seed)
+    by_id = {job.id: job for job in jobs}
+    status = {**(statuses or {}), **{job.id: job.status for job in jobs}}
+
+    capped = {}  # job_id -> time its fires stop at (MAX_FIRES_PER_JOB reached)
+
+    def fires(job):
+        # (fire time, configured time before spreading, job) for each fire in the window
+        offset = job.trigger.offset.total_seconds() if isinstance(job.trigger, OffsetTrigger) else 0.0
+        for index, fire_time in enumerate(fire_times_between(job.trigger, start, end, MAX_FIRES_PER_JOB + 1)):
+            timestamp = fire_time.timestamp()
+            if index == MAX_FIRES_PER_JOB:
+                capped[job.id] = timestamp
+                return
+            yield timestamp, timestamp - offset, job.id
+
+    pending_fires = heapq.merge(*(fires(job) for job in jobs))
+    finishes = []  # Heap of (time, sequence, job_id)
+    queue = FairQueue(policies.weight)  # Items: (fire time, configured time, job_id)
+    waiting = collections.Counter()  # Runs waiting per job (0 or 1)
+    running = collections.Counter()
+    running_by_owner = collections.Counter()
+    counts = collections.Counter()
+    per_job = collections.defaultdict(collections.Counter)
+    waits, lags, saturated = [], [], set()
+    owner_waits = collections.defaultdict(list)
+    peak_concurrency = peak_demand = 0
+    busy = 0
+    busy_seconds = 0.0
+    last_time = start.timestamp()
+    sequence = 0
+    limits = {}
+
+    def owner_ready(owner):
+        if owner not in limits:
+            limits[owner] = policies.max_running(owner)
+        return not limits[owner] or running_by_owner[owner] < limits[owner]
+
+    def item_ready(item):
+        return not running[item[2]]
+
+    def start_runs(now):
+        nonlocal busy, sequence, peak_concurrency
+        while busy < workers:
+            entry = queue.pop(owner_ready, item_ready)
+            if entry is None:
+                break
+            owner, (fire_time, configured_time, job_id) = entry
+            job = by_id[job_id]
+            waiting[job_id] -= 1
+            wait = now - fire_time
+            waits.append(wait)
+            owner_waits[owner].append(wait)
+            if any(status.get(parent, "complete") != "complete" for parent in job.dependencies):
+                # run_job returns straight away; the slot is free again
+                counts["dependency_waits"] += 1
+                continue
+            counts["runs"] += 1
+            lags.append(now - configured_time)
+            status[job_id] = "running"
+            running[job_id] += 1
+            running_by_owner[owner] += 1
+            busy += 1
+            peak_concurrency = max(peak_concurrency, busy)
+            heapq.heappush(finishes, (now + rng.choice(job.durations), sequence, job_id))
+            sequence += 1
+
+    next_fire = next(pending_fires, None)
+    while next_fire is not None or finishes:
+        if finishes and (next_fire is None or finishes[0][0] <= next_fire[0]):
+            now, _, job_id = heapq.heappop(finishes)
+            busy_seconds += busy * (now - last_time)
+            last_time = now
+            job = by_id[job_id]
+            busy -= 1
+            running[job_id] -= 1
+            running_by_owner[job.owner] -= 1
+            if rng.random() < job.success_rate:
+                status[job_id] = "complete"
+                # A completed run consumes its parents' completion
+                for parent in job.dependencies:
+                    if status.get(parent) == "complete":
+                        status[parent] = "scheduled"
+            else:
+                counts["failures"] += 1
+                status[job_id] = "failed"
+        else:
+            now, configured_time, job_id = next_fire
+            next_fire = next(pending_fires, None)
+            busy_seconds += busy * (now - last_time)
+            last_time = now
+            counts["fires"] += 1
+            if waiting[job_id] >= 1:
+                counts["coalesced"] += 1
+                per_job[job_id]["coalesced"] += 1
+                continue
+            waiting[job_id] += 1
+            queue.push(by_id[job_id].owner, (now, configured_time, job_id))
+            if busy >= workers:
+                saturated.add(int(now // 60) * 60)
+            peak_demand = max(peak_demand, busy + len(queue))
+        start_runs(now)
+
+    window_seconds = max(last_time - start.timestamp(), hours * 3600)
+    elapsed = time.perf_counter() - started
+    busiest = sorted(per_job.items(), key=lambda item: -sum(item[1].values()))[:BUSIEST_JOBS_LISTED]
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "workers": workers,
+        "jobs": len(jobs),
+        "fires": counts["fires"],
+        "runs": counts["runs"],
+        "failures": counts["failures"],
+        "coalesced": counts["coalesced"],
+        "dependency_waits": counts["dependency_waits"],
+        # Fire to free slot, for every fire that got one
+        "queue_wait_seconds": _summary(waits),
+        # Configured (cron) time to start, for runs that started: spreading plus queue wait
+        "fire_lag_seconds": _summary(lags),
+        # Queue wait per owner: what fair sharing keeps predictable
+        "owners": {owner or "-": _summary(values) for owner, values in sorted(owner_waits.items())},
+        "peak_concurrency": peak_concurrency,
+        "peak_demand": peak_demand,
+        "utilization": round(busy_seconds / (workers * window_seconds), 4) if workers and window_seconds else None,
+        "saturated_minutes": len(saturated),
+        "saturated_minute_starts": [
+            datetime.datetime.fromtimestamp(minute, start.tzinfo).isoformat()
+            for minute in sorted(saturated)[:SATURATED_MINUTES_LISTED]
+        ],
+        "busiest_jobs": [
+            {"id": job_id, "name": by_id[job_id].name, **dict(job_counts)} for job_id, job_counts in busiest
+        ],
+        # Jobs with more fires than are simulated: fires, load and waits leave their later ones out
+        "capped_jobs": capped_jobs(capped.items(), {job.id: job.name for job in jobs}, start.tzinfo),
+        "elapsed_seconds": round(elapsed, 3),
+        "speedup": round(hours * 3600 / elapsed) if elapsed else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the job catalog against a number of executor slots.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="execution slots to simulate")
+    parser.add_argument("--hours", type=float, default=24, help=f"hours to simulate (max {MAX_HOURS})")
+    parser.add_argument("--start", help="ISO start time (default: now)")
+    parser.add_argument("--default-duration", type=float, default=DEFAULT_DURATION,
+                        help="seconds per run for jobs without history")
+    parser.add_argument("--catalog", help="catalog file of proposed jobs to add (entries may set 'duration')")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not 0 < args.hours <= MAX_HOURS:
+        parser.error(f"--hours must be in (0, {MAX_HOURS}]")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    start = datetime.datetime.fromisoformat(args.start) if args.start else datetime.datetime.now()
+    start = start.astimezone()
+    session = SessionLocal()
+    try:
+        jobs, event_triggered, statuses = load_jobs(
+            session, args.default_duration, load_catalog(args.catalog) if args.catalog else ()
+        )
+    finally:
+        session.close()
+    report = simulate(jobs, start, args.hours, args.workers, args.seed, statuses)
+    report["event_triggered_jobs"] = event_triggered
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
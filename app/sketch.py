@@ -0,0 +1,71 @@
+# sketch.py
+import json
+import math
+
+class DurationSketch:
+    # Log-bucketed quantile sketch (DDSketch style): every quantile is within RELATIVE_ACCURACY
+    # of the true value, and two sketches merge by adding bucket counts. That makes hourly
+    # buckets roll up into days, and days into any range, without keeping individual runs.
+    RELATIVE_ACCURACY = 0.01
+    MAX_BINS = 1024
+    MIN_VALUE = 1e-6  # Durations at or below this (seconds) are counted as zero
+
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+
+    def __init__(self, bins=None, zeros: int = 0):
+        self.bins = bins or {}
+        self.zeros = zeros
+
+    @property
+    def count(self):
+        return self.zeros + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1):
+        if value <= self.MIN_VALUE:
+            self.zeros += count
+            return
+        key = math.ceil(math.log(value) / self.LOG_GAMMA)
+        self.bins[key] = self.bins.get(key, 0) + count
+        if len(self.bins) > self.MAX_BINS:
+            self._collapse()
+
+    def merge(self, other: "DurationSketch"):
+        self.zeros += other.zeros
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        if len(self.bins) > self.MAX_BINS:
+            self._collapse()
+        return self
+
+    def _collapse(self):
+        # Fold the lowest buckets together; accuracy is only lost for the fastest runs
+        keys = sorted(self.bins)
+        excess = len(keys) - self.MAX_BINS
+        folded = sum(self.bins.pop(key) for key in keys[:excess])
+        self.bins[keys[excess]] += folded
+
+    def quantile(self, q: float):
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                # Midpoint of the bucket (GAMMA^(key-1), GAMMA^key] in relative terms
+                return 2 * self.GAMMA ** key / (self.GAMMA + 1)
+        return 2 * self.GAMMA ** max(self.bins) / (self.GAMMA + 1)
+
+    def to_json(self):
+        return json.dumps({"zeros": self.zeros, "bins": {str(key): count for key, count in self.bins.items()}})
+
+    @classmethod
+    def from_json(cls, text):
+        if not text:
+            return cls()
+        data = json.loads(text)
+        return cls({int(key): count for key, count in data.get("bins", {}).items()}, data.get("zeros", 0))
@@ -0,0 +1,42 @@
+# startup.py
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('uvicorn.error')
+
+class StartupReport:
+    # Where a process's startup time goes: importing the application's modules, then each
+    # initialization step (database, catalog sync, scheduler, ...) in the order they ran
+    def __init__(self):
+        self.import_seconds = None
+        self.phases = {}
+
+    def imported(self, started: float):
+        # started: time.perf_counter() before the application's imports
+        self.import_seconds = time.perf_counter() - started
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def as_dict(self):
+        init_seconds = sum(self.phases.values())
+        return {
+            "import_seconds": round(self.import_seconds, 4) if self.import_seconds is not None else None,
+            "init_seconds": round(init_seconds, 4),
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+        }
+
+    def log(self, process: str):
+        report = self.as_dict()
+        phases = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in report["phases"].items())
+        imports = f"{report['import_seconds']:.3f}s" if report["import_seconds"] is not None else "not measured"
+        logger.info(f"{process} started: imports {imports}, init {report['init_seconds']:.3f}s ({phases or 'nothing'}).")
+
+# Create a singleton report for this process.
+startup_report = StartupReport()
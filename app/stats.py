@@ -0,0 +1,145 @@
+# stats.py
+import datetime
+
+from sqlalchemy import bindparam, tuple_, update
+
+from models import RunStat, add_counts
+from sketch import DurationSketch
+
+GLOBAL_JOB_ID = 0  # Rollups across all jobs
+GRANULARITIES = {"hour": datetime.timedelta(hours=1), "day": datetime.timedelta(days=1)}
+MAX_BUCKETS = 1000  # Per query: 41 days of hours or about 3 years of days
+
+def bucket_start(timestamp: datetime.datetime, granularity: str):
+    if granularity == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def record_runs(session, runs):
+    # Add finished runs, given as (job_id, finished_at, duration, status), to their per-job and
+    # global hour/day buckets. Runs from one batch are combined first, so each bucket row is
+    # written once. Called inside the transaction that writes the runs themselves; other
+    # processes (queue workers) record runs into the same rows.
+    pending = {}
+    for job_id, finished_at, duration, status in runs:
+        for granularity in GRANULARITIES:
+            start = bucket_start(finished_at, granularity)
+            for stat_job_id in (job_id, GLOBAL_JOB_ID):
+                key = (stat_job_id, granularity, start)
+                totals = pending.setdefault(key, {"count": 0, "failures": 0, "timeouts": 0, "sum": 0.0, "sketch": DurationSketch()})
+                totals["count"] += 1
+                totals["failures"] += status != "complete"
+                totals["timeouts"] += status == "timed_out"
+                if isinstance(duration, (int, float)):
+                    totals["sum"] += duration
+                    totals["sketch"].add(duration)
+    if not pending:
+        return 0
+
+    # Counters are added in the database, so concurrent writers (or the first inserts of a
+    # bucket) can't overwrite each other
+    table = RunStat.__table__
+    add_counts(session, table, ("job_id", "granularity", "bucket_start"), ("count", "failures", "timeouts", "duration_sum"), [
+        {"job_id": key[0], "granularity": key[1], "bucket_start": key[2], "count": totals["count"],
+         "failures": totals["failures"], "timeouts": totals["timeouts"], "duration_sum": totals["sum"]}
+        for key, totals in pending.items()
+    ])
+    # The counter writes hold the rows' write locks until commit, so the sketches can be merged in Python
+    rows = session.query(RunStat.id, RunStat.job_id, RunStat.granularity, RunStat.bucket_start, RunStat.duration_sketch).filter(
+        tuple_(RunStat.job_id, RunStat.granularity, RunStat.bucket_start).in_(list(pending))
+    )
+    session.execute(update(table).where(table.c.id == bindparam("row_id")).values(duration_sketch=bindparam("sketch")), [
+        {"row_id": row.id,
+         "sketch": DurationSketch.from_json(row.duration_sketch).merge(pending[(row.job_id, row.granularity, row.bucket_start)]["sketch"]).to_json()}
+        for row in rows
+    ])
+    return len(pending)
+
+def _summary(count, failures, timeouts, duration_sum, sketch, hours):
+    return {
+        "count": count,
+        "failures": failures,
+        "timeouts": timeouts,
+        "success_rate": round((count - failures) / count, 4) if count else None,
+        "mean": round(duration_sum / count, 4) if count else None,
+        "p50": _round(sketch.quantile(0.5)),
+        "p95": _round(sketch.quantile(0.95)),
+        "runs_per_hour": round(count / hours, 4) if hours else None,
+    }
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+def bucket_range(granularity: str, start: datetime.datetime, end: datetime.datetime):
+    step = GRANULARITIES[granularity]
+    starts = []
+    current = bucket_start(start, granularity)
+    while current < end:
+        starts.append(current)
+        current += step
+    return starts
+
+def stats_report(session, job_id: int, granularity: str, start: datetime.datetime, end: datetime.datetime):
+    # Buckets in [start, end) (UTC), zero-filled, plus a summary merged from them. The cost
+    # depends on the number of buckets, never on the number of runs.
+    starts = bucket_range(granularity, start, end)
+    range_start = starts[0] if starts else start
+    rows = {
+        row.bucket_start: row
+        for row in session.query(RunStat).filter(
+            RunStat.job_id == job_id,
+            RunStat.granularity == granularity,
+            RunStat.bucket_start >= range_start,
+            RunStat.bucket_start < end,
+        )
+    }
+    bucket_hours = GRANULARITIES[granularity].total_seconds() / 3600
+    total_sketch = DurationSketch()
+    totals = {"count": 0, "failures": 0, "timeouts": 0, "sum": 0.0}
+    buckets = []
+    for bucket in starts:
+        row = rows.get(bucket)
+        sketch = DurationSketch.from_json(row.duration_sketch if row else None)
+        count, failures, timeouts, duration_sum = (
+            (row.count, row.failures, row.timeouts, row.duration_sum) if row else (0, 0, 0, 0.0)
+        )
+        total_sketch.merge(sketch)
+        totals["count"] += count
+        totals["failures"] += failures
+        totals["timeouts"] += timeouts
+        totals["sum"] += duration_sum
+        buckets.append({"start": bucket.isoformat(), **_summary(count, failures, timeouts, duration_sum, sketch, bucket_hours)})
+    return {
+        "job_id": job_id,
+        "granularity": granularity,
+        "from": range_start.isoformat(),
+        "to": end.isoformat(),
+        "summary": _summary(totals["count"], totals["failures"], totals["timeouts"], totals["sum"],
+                            total_sketch, len(starts) * bucket_hours),
+        "buckets": buckets,
+    }
+
+def sparklines(session, granularity: str, count: int, now: datetime.datetime, job_ids=None):
+    # The last `count` buckets of every job (or of job_ids), as parallel arrays (for JobCard sparklines)
+    end = bucket_start(now, granularity) + GRANULARITIES[granularity]
+    starts = bucket_range(granularity, end - count * GRANULARITIES[granularity], end)
+    index = {bucket: position for position, bucket in enumerate(starts)}
+    jobs = {}
+    query = session.query(RunStat).filter(
+        RunStat.job_id != GLOBAL_JOB_ID,
+        RunStat.granularity == granularity,
+        RunStat.bucket_start >= starts[0],
+    )
+    if job_ids is not None:
+        query = query.filter(RunStat.job_id.in_(job_ids))
+    for row in query:
+        position = index.get(row.bucket_start)
+        if position is None:
+            continue
+        series = jobs.setdefault(row.job_id, {
+            "runs": [0] * len(starts), "failures": [0] * len(starts), "p95": [None] * len(starts),
+        })
+        series["runs"][position] = row.count
+        series["failures"][position] = row.failures
+        series["p95"][position] = _round(DurationSketch.from_json(row.duration_sketch).quantile(0.95))
+    return {"granularity": granularity, "buckets": [bucket.isoformat() for bucket in starts], "jobs": jobs}
@@ -0,0 +1,44 @@
+# timeouts.py
+import math
+import os
+
+# Limit for jobs without their own timeout, in seconds (0 = no limit)
+DEFAULT_TIMEOUT = float(os.environ.get("JOB_TIMEOUT_SECONDS", "0"))
+# Adaptive limits: k x p99 of the job's recent run durations (0 = off)
+ADAPTIVE_FACTOR = float(os.environ.get("JOB_TIMEOUT_ADAPTIVE_FACTOR", "0"))
+ADAPTIVE_MIN_RUNS = int(os.environ.get("JOB_TIMEOUT_ADAPTIVE_MIN_RUNS", "20"))
+ADAPTIVE_FLOOR = float(os.environ.get("JOB_TIMEOUT_ADAPTIVE_FLOOR", "30"))
+ADAPTIVE_WINDOW = 200  # Most recent runs considered
+# Seconds between SIGTERM and SIGKILL when a run is over its limit
+KILL_GRACE_SECONDS = float(os.environ.get("JOB_TIMEOUT_GRACE", "5"))
+
+def percentile(values, fraction: float):
+    # Nearest-rank percentile of a non-empty list
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+def adaptive_timeout(logs, factor: float = ADAPTIVE_FACTOR, min_runs: int = ADAPTIVE_MIN_RUNS,
+                     floor: float = ADAPTIVE_FLOOR):
+    # Derived from runs that finished on their own; timed-out runs would only inflate the limit
+    if factor <= 0:
+        return None
+    durations = [
+        entry["execution_time"]
+        for entry in logs[-ADAPTIVE_WINDOW:]
+        if not entry.get("timed_out") and isinstance(entry.get("execution_time"), (int, float))
+    ]
+    if len(durations) < min_runs:
+        return None
+    return max(floor, factor * percentile(durations, 0.99))
+
+def uses_history(job):
+    # Whether resolve_timeout needs the job's run history
+    return job.timeout is None and ADAPTIVE_FACTOR > 0
+
+def resolve_timeout(job, logs):
+    # A job's own timeout wins (0 disables it). Otherwise the tighter of the adaptive and the
+    # default limit applies, or None when neither is configured.
+    if job.timeout is not None:
+        return job.timeout or None
+    limits = [limit for limit in (adaptive_timeout(logs), DEFAULT_TIMEOUT) if limit]
+    return min(limits) if limits else None
@@ -0,0 +1,244 @@
+# timerqueue.py
+import datetime
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+from apscheduler.util import astimezone
+from tzlocal import get_localzone
+
+logger = logging.getLogger('uvicorn.error')
+
+# A fire more than this many seconds late is skipped (counted as missed); the job's next
+# fire time is computed from now, so a stalled process doesn't replay a backlog of fires
+MISFIRE_GRACE = float(os.environ.get("SCHEDULER_MISFIRE_GRACE_SECONDS", "1"))
+
+class _Timer:
+    __slots__ = ("key", "name", "trigger", "next_fire_time", "generation")
+
+    def __init__(self, key, name, trigger, next_fire_time, generation):
+        self.key = key
+        self.name = name
+        self.trigger = trigger
+        self.next_fire_time = next_fire_time
+        self.generation = generation
+
+class TimerQueue:
+    # Next fire times of every time-based job in a binary heap, served by one thread. Adding,
+    # rescheduling and removing a job are O(log n) (replaced heap entries are skipped when
+    # they surface, and compacted away once they outnumber live ones). The thread sleeps until
+    # the earliest fire time, then hands everything due to on_fire([(key, fire_time), ...])
+    # in one call, before computing any next fire times, so a burst of due jobs costs one
+    # wakeup. Fire times keep sub-second precision (interval schedules, spread offsets).
+    def __init__(self, on_fire, on_rescheduled=None, timezone=None, misfire_grace: float = MISFIRE_GRACE):
+        self.on_fire = on_fire
+        # on_rescheduled(keys): after fired (or missed) jobs have their next fire times
+        self.on_rescheduled = on_rescheduled
+        self.timezone = astimezone(timezone) or get_localzone()
+        self.misfire_grace = misfire_grace
+        self.missed = 0  # Fires skipped for being later than misfire_grace
+        self._timers = {}  # key -> _Timer
+        self._heap = []  # (timestamp, sequence, generation, key)
+        self._sequence = itertools.count()
+        # Bumped whenever a next fire time changes; each timer holds the generation of its last
+        # change, and removed timers leave theirs in _retired, so readers can ask what changed
+        self.generation = 0
+        self._retired = {}  # key -> generation in which its timer was removed
+        self._stale = 0  # Heap entries of replaced or removed timers
+        self._wakeup = threading.Condition()
+        self._sleeping_until = None  # Timestamp the thread sleeps until; None: indefinitely
+        self._thread = None
+        self._stopping = False
+
+    def __len__(self):
+        return len(self._timers)
+
+    def start(self):
+        with self._wakeup:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="timer-queue", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def add(self, key, trigger, name=None):
+        # (Re)place key's timer; returns its first fire time, or None if the trigger never fires
+        return self.add_many([(key, trigger, name)])[0]
+
+    def add_many(self, timers):
+        # Bulk add of (key, trigger, name); one lock acquisition and at most one wakeup
+        now = datetime.datetime.now(self.timezone)
+        computed = {}  # id(trigger) -> first fire time; jobs with the same schedule share a trigger
+        first_fire_times = []
+        for key, trigger, name in timers:
+            if id(trigger) not in computed:
+                try:
+                    computed[id(trigger)] = trigger.get_next_fire_time(None, now)
+                except Exception as e:
+                    # Left without a timer; the other timers are still added
+                    logger.error(f"Error computing the first fire time of '{name}': {e}")
+                    computed[id(trigger)] = None
+            first_fire_times.append((key, trigger, name, computed[id(trigger)]))
+        with self._wakeup:
+            earliest = None
+            for key, trigger, name, fire_time in first_fire_times:
+                self._discard(key)
+                if fire_time is None:
+                    continue
+                timestamp = self._push(_Timer(key, name, trigger, fire_time, self._next_generation()))
+                earliest = timestamp if earliest is None else min(earliest, timestamp)
+            self._wake_for(earliest)
+        return [fire_time for _, _, _, fire_time in first_fire_times]
+
+    def remove(self, key):
+        with self._wakeup:
+            return self._discard(key)
+
+    def next_fire_time(self, key):
+        timer = self._timers.get(key)
+        return timer.next_fire_time if timer else None
+
+    def changed_since(self, generation: int):
+        # key -> next fire time (None once removed) of every timer changed after `generation`
+        with self._wakeup:
+            changed = {timer.key: timer.next_fire_time for timer in self._timers.values() if timer.generation > generation}
+            changed.update((key, None) for key, removed in self._retired.items() if removed > generation)
+            return changed
+
+    def generation_of(self, key):
+        # The generation in which key's next fire time last changed (0 if never scheduled)
+        timer = self._timers.get(key)
+        return timer.generation if timer else self._retired.get(key, 0)
+
+    def entries(self):
+        # (key, name, trigger) of every scheduled timer
+        with self._wakeup:
+            return [(timer.key, timer.name, timer.trigger) for timer in self._timers.values()]
+
+    def _next_generation(self):
+        self.generation += 1
+        return self.generation
+
+    def _push(self, timer):
+        timestamp = timer.next_fire_time.timestamp()
+        self._timers[timer.key] = timer
+        self._retired.pop(timer.key, None)
+        heapq.heappush(self._heap, (timestamp, next(self._sequence), timer.generation, timer.key))
+        return timestamp
+
+    def _discard(self, key):
+        if self._timers.pop(key, None) is None:
+            return False
+        self._retired[key] = self._next_generation()
+        self._stale += 1
+        if self._stale > 1024 and self._stale > len(self._timers):
+            # Rebuild from the live timers; O(n), amortized over the removals that led here
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+            self._stale = 0
+        return True
+
+    def _is_live(self, entry):
+        timer = self._timers.get(entry[3])
+        return timer is not None and timer.generation == entry[2]
+
+    def _wake_for(self, timestamp):
+        # Only wake the thread if this fire time is earlier than what it sleeps until
+        if timestamp is not None and (self._sleeping_until is None or timestamp < self._sleeping_until):
+            self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                due = self._wait_for_due()
+                if due is None:
+                    return
+            if due:
+                self._fire(due)
+
+    def _wait_for_due(self):
+        # Called with the lock held; returns the timers due now, or None once stopping
+        while not self._stopping:
+            while self._heap and not self._is_live(self._heap[0]):
+                heapq.heappop(self._heap)
+                self._stale -= 1
+            if not self._heap:
+                self._sleeping_until = None
+                self._wakeup.wait()
+                continue
+            now = time.time()
+            head = self._heap[0][0]
+            if head > now:
+                self._sleeping_until = head
+                self._wakeup.wait(head - now)
+                continue
+            # Everything due by now goes out together; nothing fires early
+            self._sleeping_until = None
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if self._is_live(entry):
+                    due.append(self._timers[entry[3]])
+                else:
+                    self._stale -= 1
+            return due
+        return None
+
+    def _fire(self, due):
+        now = datetime.datetime.now(self.timezone)
+        batch = []
+        missed = 0
+        for timer in due:
+            if (now - timer.next_fire_time).total_seconds() > self.misfire_grace:
+                missed += 1
+            else:
+                batch.append((timer.key, timer.next_fire_time))
+        if missed:
+            self.missed += missed
+            logger.warning(f"Skipped {missed} fires that were more than {self.misfire_grace:g}s late.")
+        if batch:
+            try:
+                self.on_fire(batch)
+            except Exception as e:
+                logger.error(f"Error dispatching {len(batch)} due jobs: {e}")
+
+        # Next fire times after the previous one (coalescing any that have passed meanwhile),
+        # computed once per shared trigger and previous fire time
+        now = datetime.datetime.now(self.timezone)
+        computed = {}
+        next_fire_times = []
+        for timer in due:
+            computed_key = (id(timer.trigger), timer.next_fire_time)
+            if computed_key not in computed:
+                fire_time = timer.trigger.get_next_fire_time(timer.next_fire_time, now)
+                while fire_time is not None and fire_time < now:
+                    fire_time = timer.trigger.get_next_fire_time(fire_time, now)
+                computed[computed_key] = fire_time
+            next_fire_times.append(computed[computed_key])
+        with self._wakeup:
+            for timer, fire_time in zip(due, next_fire_times):
+                if self._timers.get(timer.key) is not timer:
+                    continue  # Replaced or removed while firing
+                if fire_time is None:
+                    del self._timers[timer.key]  # A one-off (date) trigger that has fired
+                    self._retired[timer.key] = self._next_generation()
+                    continue
+                timer.next_fire_time = fire_time
+                timer.generation = self._next_generation()
+                self._push(timer)
+        if self.on_rescheduled is not None:
+            try:
+                self.on_rescheduled([timer.key for timer in due])
+            except Exception as e:
+                logger.error(f"Error publishing next fire times: {e}")
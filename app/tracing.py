@@ -0,0 +1,293 @@
+# tracing.py
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('uvicorn.error')
+
+# Fraction of root spans (API requests, scheduler fires, worker runs) that are recorded; every
+# span under a recorded root is recorded too. 0 disables tracing, apart from requests that arrive
+# with a sampled W3C traceparent header.
+SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.environ.get("TRACE_FILE_BACKUPS", "3"))
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "job-scheduler")
+
+QUEUE_SIZE = 10000  # Finished spans waiting for export; more are dropped rather than buffered
+BATCH_SIZE = 512
+FLUSH_INTERVAL = 1.0  # Seconds
+MAX_ATTRIBUTE_LENGTH = 1000  # SQL statements and commands are truncated to this
+
+# OpenTelemetry span kinds and status codes
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end", "attributes", "status", "message")
+
+    def __init__(self, trace_id, parent_id, name, kind, attributes):
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes
+        self.status = None
+        self.message = None
+
+    recording = True
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status, self.message = STATUS_ERROR, message
+
+    def finish(self):
+        self.end = time.time_ns()
+        exporter.export(self)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.status is not None:
+            span["status"] = {"code": self.status, **({"message": self.message} if self.message else {})}
+        return span
+
+class _Unsampled:
+    # Stands in for the current span of a trace that is not recorded, so its children aren't either
+    recording = False
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, message):
+        pass
+
+UNSAMPLED = _Unsampled()
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+def current_span():
+    return _current.get()
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    text = str(value)
+    return {"stringValue": text if len(text) <= MAX_ATTRIBUTE_LENGTH else text[:MAX_ATTRIBUTE_LENGTH] + "..."}
+
+def parse_traceparent(header: str):
+    # W3C trace context: 00-<32 hex trace id>-<16 hex parent id>-<flags>; returns
+    # (trace_id, parent_id, sampled), or None when the header is missing or malformed
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, root: bool = False, traceparent: str = None, **attributes):
+    # Records `name` as a child of the current span. With root=True a new trace is started
+    # (sampled at SAMPLE_RATE) unless the current context already has one; a valid incoming
+    # traceparent is continued instead, with its sampling decision.
+    parent = _current.get()
+    if parent is None:
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+        elif root and SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+            trace_id, parent_id, sampled = "%032x" % random.getrandbits(128), None, True
+        else:
+            sampled = False
+        if not sampled:
+            if not root and remote is None:
+                yield UNSAMPLED  # Outside any trace: nothing to record, nothing to propagate
+                return
+            token = _current.set(UNSAMPLED)
+            try:
+                yield UNSAMPLED
+            finally:
+                _current.reset(token)
+            return
+    elif not parent.recording:
+        yield UNSAMPLED
+        return
+    else:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+
+    current = Span(trace_id, parent_id, name, kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        current.finish()
+
+class _OTLPFileExporter:
+    # Writes finished spans from a background thread as OTLP/JSON, one ExportTraceServiceRequest
+    # per line (the OpenTelemetry Collector file exporter format), rotating the file by size
+    def __init__(self, path=TRACE_FILE, max_bytes=TRACE_FILE_MAX_BYTES, backups=TRACE_FILE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._handler = None
+
+    def export(self, finished: Span):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Error exporting {len(batch)} spans to {self.path}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        if self._handler is None:
+            self._handler = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8"
+            )
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "job-scheduler.tracing"}, "spans": [s.to_otlp() for s in batch]}],
+            }]
+        }
+        record = logging.LogRecord("tracing", logging.INFO, __file__, 0, json.dumps(request, separators=(",", ":")), None, None)
+        self._handler.emit(record)
+        self._handler.flush()
+
+    def flush(self):
+        # Block until every span finished so far is written
+        if self._thread is not None:
+            self._queue.join()
+
+exporter = _OTLPFileExporter()
+atexit.register(exporter.flush)
+
+def instrument_engine(engine):
+    # One client span per SQL statement executed while a recorded span is current
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is None or not parent.recording:
+            return
+        db_span = Span(parent.trace_id, parent.span_id, statement.split(None, 1)[0].upper() if statement else "SQL",
+                       KIND_CLIENT, {"db.system": engine.dialect.name, "db.statement": statement})
+        if executemany:
+            db_span.attributes["db.executemany"] = True
+        conn.info.setdefault("trace_spans", []).append(db_span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            db_span = spans.pop()
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                db_span.attributes["db.rowcount"] = cursor.rowcount
+            db_span.finish()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            db_span = spans.pop()
+            db_span.set_error(str(exception_context.original_exception))
+            db_span.finish()
+
+class TracingMiddleware:
+    # One server span per HTTP request; a sampled request's traceparent is echoed back so a slow
+    # response can be looked up in the trace file
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        traceparent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        with span(f"{scope['method']} {scope['path']}", KIND_SERVER, root=True, traceparent=traceparent,
+                  **{"http.method": scope["method"], "http.target": scope["path"]}) as request_span:
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    request_span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        request_span.set_error(f"HTTP {message['status']}")
+                    if request_span.recording:
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (b"traceparent", request_span.traceparent.encode("latin-1"))
+                        ]
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
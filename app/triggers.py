@@ -0,0 +1,166 @@
+# triggers.py
+import datetime
+import functools
+import json
+import os
+import re
+import zlib
+
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+# Spread every job's fires over this many seconds after the cron time (0 = off).
+# A per-job "jitter" key in the schedule overrides it; "jitter": 0 opts a job out.
+SPREAD_WINDOW = float(os.environ.get("SCHEDULER_SPREAD_WINDOW", "0"))
+
+# Schedule "type" values. Cron is the default, so plain cron-field objects keep working.
+TIME_TRIGGER_TYPES = {"cron", "interval", "date"}
+EVENT_TRIGGER_TYPES = {"file", "webhook"}
+TRIGGER_TYPES = TIME_TRIGGER_TYPES | EVENT_TRIGGER_TYPES
+
+# Quiet period after the last change to a watched path before the job fires
+DEFAULT_DEBOUNCE = float(os.environ.get("FILE_TRIGGER_DEBOUNCE_SECONDS", "1"))
+MAX_DEBOUNCE = 3600
+INTERVAL_UNITS = ("weeks", "days", "hours", "minutes", "seconds")
+WEBHOOK_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,100}$")
+
+class EventTrigger:
+    # Fires on an external event instead of at computed times. Not an APScheduler trigger:
+    # the scheduler registers these with its file watcher or webhook table instead.
+    type = None
+
+    def __eq__(self, other):
+        return type(self) is type(other) and vars(self) == vars(other)
+
+class FileTrigger(EventTrigger):
+    # A file (or any file in a directory, optionally matching a glob) was written, created,
+    # moved or deleted, and then left alone for `debounce` seconds
+    type = "file"
+
+    def __init__(self, path: str, debounce: float = DEFAULT_DEBOUNCE, pattern: str = None):
+        self.path = path
+        self.debounce = debounce
+        self.pattern = pattern
+
+    def __str__(self):
+        return f"file[{self.path}{'/' + self.pattern if self.pattern else ''}, debounce={self.debounce:g}s]"
+
+    __repr__ = __str__
+
+class WebhookTrigger(EventTrigger):
+    # POST /triggers/{name}; several jobs can share a name
+    type = "webhook"
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __str__(self):
+        return f"webhook[{self.name}]"
+
+    __repr__ = __str__
+
+def _event_trigger(trigger_type: str, params: dict):
+    if trigger_type == "webhook":
+        name = params.pop("name", None)
+        if not isinstance(name, str) or not WEBHOOK_NAME.match(name):
+            raise ValueError("webhook triggers need a 'name' of letters, digits, '_', '.' or '-'")
+        trigger = WebhookTrigger(name)
+    else:
+        path = params.pop("path", None)
+        if not isinstance(path, str) or not path:
+            raise ValueError("file triggers need a 'path' (a file, or a directory to watch)")
+        debounce = params.pop("debounce", DEFAULT_DEBOUNCE)
+        if not isinstance(debounce, (int, float)) or not 0 <= debounce <= MAX_DEBOUNCE:
+            raise ValueError(f"debounce must be between 0 and {MAX_DEBOUNCE} seconds")
+        pattern = params.pop("pattern", None)
+        if pattern is not None and (not isinstance(pattern, str) or "/" in pattern):
+            raise ValueError("pattern must be a file name glob, e.g. '*.json'")
+        trigger = FileTrigger(path, float(debounce), pattern)
+    if params:
+        raise ValueError(f"Unexpected {trigger_type} trigger fields: {', '.join(sorted(params))}")
+    return trigger
+
+class OffsetTrigger(BaseTrigger):
+    # Shifts every fire time of the wrapped trigger by a fixed offset
+    def __init__(self, trigger, offset: datetime.timedelta):
+        self.trigger = trigger
+        self.offset = offset
+        self.timezone = getattr(trigger, "timezone", None)
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        if previous_fire_time is not None:
+            previous_fire_time -= self.offset
+        fire_time = self.trigger.get_next_fire_time(previous_fire_time, now - self.offset)
+        return fire_time + self.offset if fire_time else None
+
+    def __str__(self):
+        return f"{self.trigger} +{self.offset.total_seconds():g}s"
+
+    def __repr__(self):
+        return f"<OffsetTrigger ({self.trigger!r}, offset={self.offset.total_seconds():g}s)>"
+
+@functools.lru_cache(maxsize=1024)
+def _cron_trigger(fields: str):
+    # Jobs with the same cron fields share one (immutable) trigger, parsed once. Interval
+    # triggers aren't shared: they count from when they were created.
+    return CronTrigger(**json.loads(fields))
+
+def spread_offset(key, window: float):
+    # Stable (process-independent) offset in [0, window) derived from the job key, in milliseconds
+    milliseconds = int(window * 1000)
+    if milliseconds <= 0:
+        return datetime.timedelta(0)
+    digest = zlib.crc32(str(key).encode())
+    return datetime.timedelta(milliseconds=digest % milliseconds)
+
+def build_trigger(schedule: str, spread_key=None):
+    # Turn a job's schedule JSON into an APScheduler trigger, or an EventTrigger for file and
+    # webhook schedules; raises ValueError if it isn't usable. With spread_key (the job ID)
+    # time-based triggers are shifted by the job's spread offset.
+    #   {"minute": "*/5"}                                   cron fields ("type": "cron" optional)
+    #   {"type": "interval", "minutes": 10}                 every 10 minutes
+    #   {"type": "date", "run_date": "2025-01-01T06:00:00"} once
+    #   {"type": "file", "path": "workdir/weather_data.json", "debounce": 2}
+    #   {"type": "webhook", "name": "weather-updated"}      POST /triggers/weather-updated
+    try:
+        schedule_params = json.loads(schedule)
+    except (json.JSONDecodeError, TypeError) as e:
+        raise ValueError(f"Invalid schedule format: {e}")
+    if not isinstance(schedule_params, dict):
+        raise ValueError("Schedule must be a JSON object of cron fields")
+
+    trigger_type = schedule_params.pop("type", "cron")
+    if trigger_type not in TRIGGER_TYPES:
+        raise ValueError(f"Schedule type must be one of {sorted(TRIGGER_TYPES)}")
+    if trigger_type in EVENT_TRIGGER_TYPES:
+        if "jitter" in schedule_params:
+            raise ValueError("jitter only applies to cron, interval and date schedules")
+        return _event_trigger(trigger_type, schedule_params)
+
+    window = schedule_params.pop("jitter", SPREAD_WINDOW)
+    if not isinstance(window, (int, float)) or window < 0:
+        raise ValueError("jitter must be a non-negative number of seconds")
+    if 0 < window < 0.001:
+        # Offsets are whole milliseconds; a shorter SCHEDULER_SPREAD_WINDOW just spreads nothing
+        if window is not SPREAD_WINDOW:
+            raise ValueError("jitter must be 0 or at least 0.001 seconds")
+    try:
+        if trigger_type == "interval":
+            units = [schedule_params.get(unit, 0) for unit in INTERVAL_UNITS]
+            if not all(isinstance(value, (int, float)) and value >= 0 for value in units) or not any(units):
+                raise ValueError(f"interval schedules need a positive {'/'.join(INTERVAL_UNITS)}")
+            trigger = IntervalTrigger(**schedule_params)
+        elif trigger_type == "date":
+            if "run_date" not in schedule_params:
+                raise ValueError("date schedules need a 'run_date'")
+            trigger = DateTrigger(**schedule_params)
+        else:
+            trigger = _cron_trigger(json.dumps(schedule_params, sort_keys=True))
+    except TypeError as e:
+        raise ValueError(str(e))
+
+    if spread_key is not None and window > 0:
+        return OffsetTrigger(trigger, spread_offset(spread_key, window))
+    return trigger
@@ -1,15 +1,152 @@
 # ui.py
-from fastapi import Request
-from fastapi.responses import HTMLResponse
+import os
+import threading
+from collections import OrderedDict
+from math import ceil
+from typing import Optional
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Depends, Query, Request, status
+from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from app import app  # Shared FastAPI instance
-from models import SessionLocal, Job
+from markupsafe import Markup
+
+from api import MAX_PAGE_SIZE, AdminProfiledRoute, load_page, require_authentication
+from models import SessionLocal
+from readmodel import job_state
+from scheduler import job_scheduler
+
+# Server-rendered pages; included by app.create_app()
+router = APIRouter(route_class=AdminProfiledRoute)
 
 templates = Jinja2Templates(directory="templates")
 
-@app.get("/", response_class=HTMLResponse)
-def dashboard(request: Request):
-    session = SessionLocal()
-    jobs = session.query(Job).all()
-    session.close()
-    return templates.TemplateResponse("dashboard.html", {"request": request, "jobs": jobs})
+# Jobs per dashboard page, unless ?per_page= says otherwise
+PAGE_SIZE = int(os.environ.get("DASHBOARD_PAGE_SIZE", "50"))
+# Rendered job rows kept for reuse; one entry per job
+FRAGMENT_CACHE_SIZE = int(os.environ.get("DASHBOARD_FRAGMENT_CACHE_SIZE", "5000"))
+
+STATUSES = ("scheduled", "running", "complete", "failed", "timed_out", "inactive")
+
+class FragmentCache:
+    # Rendered HTML per key, reused while the key's stamp is unchanged. Least recently used
+    # entries are dropped beyond `size`.
+    def __init__(self, size: int = FRAGMENT_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()  # key -> (stamp, html)
+        self._lock = threading.Lock()
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, stamp, html):
+        with self._lock:
+            self._entries[key] = (stamp, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+# Create a singleton cache of dashboard job rows.
+job_rows = FragmentCache()
+
+def render_job_rows(records):
+    # Table rows for records. A job's row is rendered again only after the job was written
+    # (its version changed) or its next run moved; only those jobs are read from the database.
+    next_runs = {record.id: job_scheduler.get_next_run_time(record.id) for record in records}
+    rows = {}
+    stale = []
+    for record in records:
+        html = job_rows.get(record.id, (record.version, next_runs[record.id]))
+        if html is None:
+            stale.append(record)
+        else:
+            rows[record.id] = html
+    if stale:
+        session = SessionLocal()
+        try:
+            jobs = load_page(session, stale)
+        finally:
+            session.close()
+        versions = {record.id: record.version for record in stale}
+        template = templates.get_template("_job_row.html")
+        for job in jobs:
+            job["next_run"] = next_runs[job["id"]]
+            html = Markup(template.render(job=job))
+            job_rows.put(job["id"], (versions[job["id"]], job["next_run"]), html)
+            rows[job["id"]] = html
+    return [rows[record.id] for record in records if record.id in rows]
+
+def dashboard_context(request: Request, q: Optional[str], status_filter: Optional[str], page: int, per_page: int):
+    # One page of the jobs matching the search and status filter, plus what the pager needs
+    matches = job_state.search(q, status=status_filter)
+    pages = max(1, ceil(len(matches) / per_page))
+    page = min(page, pages)
+
+    def page_url(number):
+        params = {key: value for key, value in (("q", q), ("status", status_filter)) if value}
+        params["page"] = number
+        if per_page != PAGE_SIZE:
+            params["per_page"] = per_page
+        return f"?{urlencode(params)}"  # Relative, so links in the refreshed table keep the page's path
+
+    return {
+        "request": request,
+        "rows": render_job_rows(matches[(page - 1) * per_page:page * per_page]),
+        "total": len(matches),
+        "page": page,
+        "pages": pages,
+        "q": q or "",
+        "status": status_filter or "",
+        "statuses": STATUSES,
+        "previous_url": page_url(page - 1) if page > 1 else None,
+        "next_url": page_url(page + 1) if page < pages else None,
+    }
+
+def session_user(request: Request):
+    return request.session.get("user")
+
+@router.get("/", response_class=HTMLResponse)
+def dashboard(
+    request: Request,
+    q: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: Optional[str] = Depends(session_user),
+):
+    if user is None:
+        return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+    context = dashboard_context(request, q, status_filter, page, per_page)
+    return templates.TemplateResponse("dashboard.html", {**context, "user": user})
+
+# Route: Dashboard for API clients (bearer token)
+@router.get("/dashboard", response_class=HTMLResponse)
+def token_dashboard(
+    request: Request,
+    q: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: str = Depends(require_authentication),
+):
+    context = dashboard_context(request, q, status_filter, page, per_page)
+    return templates.TemplateResponse("dashboard.html", {**context, "user": user})
+
+# Route: The job table alone, for refreshing the current page in place
+@router.get("/dashboard/jobs", response_class=HTMLResponse)
+def dashboard_jobs(
+    request: Request,
+    q: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: Optional[str] = Depends(session_user),
+):
+    if user is None:
+        return HTMLResponse("Not authenticated", status_code=status.HTTP_401_UNAUTHORIZED)
+    return templates.TemplateResponse("_job_table.html", dashboard_context(request, q, status_filter, page, per_page))
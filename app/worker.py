@@ -0,0 +1,108 @@
+# worker.py
+import time
+
+_imports_started = time.perf_counter()
+
+import argparse
+import logging
+import os
+import signal
+import socket
+from threading import Event, Thread
+
+from models import get_engine
+from runqueue import LEASE_SECONDS, claim_run, finish_run, heartbeat, requeue_expired
+from scheduler import job_scheduler
+from startup import startup_report
+from writebehind import run_state_writer
+
+startup_report.imported(_imports_started)
+
+logger = logging.getLogger('uvicorn.error')
+
+class RunWorker:
+    # Claims runs from run_queue, executes them with JobScheduler.run_job and reports results.
+    # Start as many of these (processes or pods) as needed against one scheduler. The module's
+    # job_scheduler is never started here, so its timer queue, file watcher and dispatcher stay
+    # idle; run_job only uses it to publish run events.
+    def __init__(self, concurrency: int = 1, lease_seconds: int = LEASE_SECONDS, poll_interval: float = 1.0):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.stopping = Event()
+
+    def run(self):
+        logger.info(f"Worker '{self.worker_id}' started with {self.concurrency} slots.")
+        slots = [
+            Thread(target=self._slot, name=f"worker-slot-{index}", daemon=True)
+            for index in range(self.concurrency)
+        ]
+        for slot in slots:
+            slot.start()
+        while not self.stopping.wait(self.lease_seconds / 2):
+            try:
+                requeue_expired()
+            except Exception as e:
+                logger.error(f"Error re-queueing expired runs: {e}")
+        for slot in slots:
+            slot.join()
+        run_state_writer.stop()
+        logger.info(f"Worker '{self.worker_id}' stopped.")
+
+    def stop(self, *args):
+        # Finish the runs in progress, but don't claim new ones
+        logger.info(f"Worker '{self.worker_id}' shutting down...")
+        self.stopping.set()
+
+    def _slot(self):
+        while not self.stopping.is_set():
+            try:
+                run = claim_run(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Error claiming a run: {e}")
+                run = None
+            if run is None:
+                self.stopping.wait(self.poll_interval)
+                continue
+            self._execute(run)
+
+    def _execute(self, run):
+        done = Event()
+
+        def keep_lease():
+            while not done.wait(self.lease_seconds / 3):
+                if not heartbeat(run.id, self.worker_id, self.lease_seconds):
+                    logger.warning(f"Lost the lease on run {run.id} (job ID {run.job_id}).")
+                    return
+
+        Thread(target=keep_lease, name=f"lease-{run.id}", daemon=True).start()
+        logger.info(f"Worker '{self.worker_id}' executing run {run.id} (job ID {run.job_id}).")
+        try:
+            rc, message = job_scheduler.run_job(run.job_id)
+        except Exception as e:
+            rc, message = 8, f"Worker error: {e}"
+        finally:
+            done.set()
+        finish_run(run.id, self.worker_id, rc == 0, message)
+
+def main():
+    parser = argparse.ArgumentParser(description="Execute queued job runs (SCHEDULER_EXECUTION_MODE=queue).")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("WORKER_CONCURRENCY", "4")),
+                        help="runs executed in parallel by this process")
+    parser.add_argument("--lease", type=int, default=LEASE_SECONDS, help="lease length in seconds")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between polls of an empty queue")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with startup_report.phase("database"):
+        get_engine()
+    with startup_report.phase("executor"):
+        worker = RunWorker(concurrency=args.concurrency, lease_seconds=args.lease, poll_interval=args.poll)
+    startup_report.log("Worker")
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# writebehind.py
+import json
+import logging
+import os
+import threading
+import time
+
+from fairshare import record_usage
+from models import Job, SessionLocal, lock_for_write
+from stats import record_runs
+
+logger = logging.getLogger('uvicorn.error')
+
+# "sync": every write commits in the executor thread (one transaction per write).
+# "group": writes from all executor threads are committed together; callers wait for their batch.
+# "async": callers don't wait; a crash can lose the last RUN_STATE_FLUSH_MS of run state.
+DURABILITY = os.environ.get("RUN_STATE_DURABILITY", "group")
+FLUSH_INTERVAL = float(os.environ.get("RUN_STATE_FLUSH_MS", "5")) / 1000
+BATCH_SIZE = int(os.environ.get("RUN_STATE_BATCH_SIZE", "500"))
+DURABILITY_MODES = {"sync", "group", "async"}
+
+class PendingWrite:
+    # One run-state transition (status only), or a finished run (status, last_run, log entry)
+    def __init__(self, job_id, status, finished_at=None, log_entry=None, on_commit=None, apply_state=True):
+        self.job_id = job_id
+        self.status = status
+        self.finished_at = finished_at
+        self.log_entry = log_entry
+        # False for runs outside the job's live schedule (backfills): the log entry and rollups
+        # are written, but status, last_run and parent jobs are left alone
+        self.apply_state = apply_state
+        self.on_commit = on_commit  # Called with this write once it is committed
+        self.reset_parents = []  # Parent jobs reset to "scheduled" by a completed run
+        self.run_count = None
+        self.error = None
+        self.done = threading.Event()
+
+class RunStateWriter:
+    # Collects run-state writes from executor threads and commits them in batches, so completion
+    # throughput is bounded by batches rather than by one fsync per write
+    def __init__(self, durability=DURABILITY, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"RUN_STATE_DURABILITY must be one of {DURABILITY_MODES}")
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []
+        self._in_flight = 0
+        self._flush_requested = False
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def set_status(self, job_id: int, status: str, on_commit=None):
+        self._submit(PendingWrite(job_id, status, on_commit=on_commit))
+
+    def record_run(self, job_id: int, status: str, finished_at, log_entry, on_commit=None, apply_state=True):
+        self._submit(PendingWrite(job_id, status, finished_at, log_entry, on_commit, apply_state))
+
+    def _submit(self, write):
+        if self.durability == "sync":
+            self._write([write])
+        else:
+            with self._condition:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopping = False
+                    self._thread = threading.Thread(target=self._run, name="run-state-writer", daemon=True)
+                    self._thread.start()
+                self._pending.append(write)
+                self._condition.notify_all()
+            if self.durability == "async":
+                return
+            write.done.wait()
+        if write.error is not None:
+            raise write.error
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                # Group commit: give other executor threads a moment to join this batch
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not (self._stopping or self._flush_requested):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                self._in_flight = len(batch)
+            self._write(batch)
+            with self._condition:
+                self._in_flight = 0
+                self._condition.notify_all()
+
+    def _write(self, batch):
+        # Waiters are released whatever happens, so a failing database can't leave executor
+        # threads (or the writer thread) stuck
+        try:
+            self._commit(batch)
+            for write in batch:
+                if write.error is None and write.on_commit is not None:
+                    try:
+                        write.on_commit(write)
+                    except Exception as e:
+                        logger.error(f"Error after writing run state of job ID {write.job_id}: {e}")
+        except Exception as e:
+            logger.error(f"Error writing run state of {len(batch)} jobs: {e}")
+            for write in batch:
+                if write.error is None:
+                    write.error = e
+        finally:
+            for write in batch:
+                write.done.set()
+
+    def _commit(self, batch):
+        session = None
+        try:
+            session = SessionLocal()
+            # Logs are appended read-modify-write; other processes (queue workers) append too
+            lock_for_write(session)
+            self._apply(session, batch)
+            session.commit()
+        except Exception as e:
+            if session is not None:
+                session.rollback()
+            if len(batch) > 1:
+                # Isolate the bad write so the rest of the batch still lands
+                logger.error(f"Run state batch of {len(batch)} writes failed ({e}); retrying one by one.")
+                session.close()
+                session = None
+                for write in batch:
+                    self._commit([write])
+                return
+            logger.error(f"Error writing run state of job ID {batch[0].job_id}: {e}")
+            batch[0].error = e
+        finally:
+            if session is not None:
+                session.close()
+
+    def _apply(self, session, batch):
+        jobs = {
+            job.id: job
+            for job in session.query(Job).filter(Job.id.in_({write.job_id for write in batch}))
+        }
+        finished, usage = [], []
+        for write in batch:
+            job = jobs.get(write.job_id)
+            if job is None:
+                continue  # Deleted while it ran
+            if write.apply_state:
+                job.status = write.status
+                if write.finished_at is not None:
+                    job.last_run = write.finished_at
+            if write.log_entry is not None:
+                # Append rather than overwrite, so concurrent runs of one job keep every entry
+                # (the transaction holds the write lock, see _commit)
+                logs = json.loads(job.logs) if job.logs else []
+                logs.append(write.log_entry)
+                job.logs = json.dumps(logs)
+                write.run_count = len(logs)
+                finished.append((job.id, write.finished_at, write.log_entry.get("execution_time"), write.status))
+                usage.append((job.owner, write.finished_at, write.log_entry.get("execution_time"),
+                              write.log_entry.get("cpu_seconds"), write.status))
+            if write.apply_state and write.status == "complete" and write.log_entry is not None:
+                # A completed run consumes its parents' completion
+                dependencies = json.loads(job.dependencies) if job.dependencies else []
+                if dependencies:
+                    for parent in session.query(Job).filter(Job.id.in_(dependencies)):
+                        if parent.status == "complete":
+                            parent.status = "scheduled"
+                            write.reset_parents.append(parent.id)
+                            logger.info(f"Parent job '{parent.name}' status updated from complete to scheduled.")
+        # Rollups are updated in the same transaction as the runs they count
+        record_runs(session, finished)
+        record_usage(session, usage)
+
+    def flush(self):
+        # Block until everything submitted so far is committed
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            while self._pending or self._in_flight:
+                if self._thread is None or not self._thread.is_alive():
+                    break
+                self._condition.wait(0.1)
+            self._flush_requested = False
+
+    def stop(self):
+        self.flush()
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+# Create a singleton writer shared by every executor thread.
+run_state_writer = RunStateWriter()
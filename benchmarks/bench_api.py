@@ -0,0 +1,90 @@
+# bench_api.py
+# Latency/throughput of the main API routes against a seeded catalog, driven in-process.
+import argparse
+import asyncio
+import time
+
+from common import latency_summary, peak_rss_mb, quiet, run_metadata, seed_catalog, setup_environment, write_results
+
+async def drive(client, method, url, headers, requests, concurrency):
+    samples = []
+    statuses = {}
+
+    async def runner(count):
+        for _ in range(count):
+            started = time.perf_counter()
+            response = await client.request(method, url, headers=headers)
+            samples.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    per_runner = [requests // concurrency + (1 if index < requests % concurrency else 0) for index in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(runner(count) for count in per_runner if count))
+    elapsed = time.perf_counter() - started
+    return {
+        **latency_summary(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "status_codes": statuses,
+        "bytes": len((await client.request(method, url, headers=headers)).content),
+    }
+
+async def run(args):
+    import httpx
+    from api import jobs_etag
+    from app import create_app
+    from models import SessionLocal, current_change_version
+    from scheduler import job_scheduler
+
+    with quiet():
+        # Register triggers without starting APScheduler, so next_run lookups take the real path
+        job_scheduler.load_jobs()
+
+    session = SessionLocal()
+    version = current_change_version(session)
+    session.close()
+
+    results = {}
+    async with httpx.AsyncClient(app=create_app(), base_url="http://bench") as client:
+        with quiet():
+            login = await client.post("/api/login", data={"username": "admin", "password": "password"})
+        auth = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        scenarios = {
+            "list_jobs": ("GET", "/jobs", auth, args.list_requests),
+            "list_jobs_unchanged_304": (
+                "GET", f"/jobs?since={version}", {**auth, "If-None-Match": jobs_etag(version)}, args.requests,
+            ),
+            "jobs_page_60": ("GET", "/jobs:page?limit=60", auth, args.requests),
+            "jobs_page_search": ("GET", "/jobs:page?limit=60&q=job-1", auth, args.requests),
+            "get_job": ("GET", "/jobs/1", auth, args.requests),
+            "forecast_1h": ("GET", "/schedule/forecast?limit=100", auth, args.list_requests),
+            "health": ("GET", "/health", {}, args.requests),
+        }
+        for name, (method, url, headers, requests) in scenarios.items():
+            with quiet():
+                results[name] = await drive(client, method, url, headers, requests, args.concurrency)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API routes against a synthetic catalog.")
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--history", type=int, default=10, help="log entries per job")
+    parser.add_argument("--log-bytes", type=int, default=200, help="stdout size per log entry")
+    parser.add_argument("--requests", type=int, default=500, help="requests per cheap scenario")
+    parser.add_argument("--list-requests", type=int, default=20, help="requests per full-catalog scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    setup_environment()
+    started = time.perf_counter()
+    seed_catalog(args.jobs, history=args.history, log_bytes=args.log_bytes)
+    seed_seconds = time.perf_counter() - started
+
+    results = run_metadata("api", vars(args))
+    results["seed_seconds"] = round(seed_seconds, 3)
+    results["scenarios"] = asyncio.run(run(args))
+    results["peak_rss_mb"] = peak_rss_mb()
+    write_results(results, args.output)
+
+if __name__ == "__main__":
+    main()
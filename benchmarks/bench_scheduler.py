@@ -0,0 +1,135 @@
+# bench_scheduler.py
+# fire-lag: how late fires start with many jobs due at once.
+# run-job:  cost of one run_job call (wall time, DB commits and statements).
+import argparse
+import collections
+import threading
+import time
+
+from common import latency_summary, peak_rss_mb, quiet, run_metadata, seed_catalog, setup_environment, write_results
+
+def bench_fire_lag(args):
+    from scheduler import job_scheduler
+
+    seed_catalog(args.jobs, schedule={"second": f"*/{args.period}"}, command=args.command)
+
+    # Scheduled times per job, recorded when the timer queue hands a batch of due jobs to the
+    # scheduler and consumed when each job's fire starts
+    scheduled = collections.defaultdict(collections.deque)
+    lags = []
+    batches = []
+    lock = threading.Lock()
+    timers = job_scheduler.timers
+    original_on_fire = timers.on_fire
+
+    def on_fire(batch):
+        with lock:
+            for job_id, fire_time in batch:
+                scheduled[job_id].append(fire_time.timestamp())
+        batches.append(len(batch))
+        original_on_fire(batch)
+
+    original_fire = job_scheduler.fire
+
+    def timed_fire(job_id, source="schedule"):
+        started = time.time()
+        with lock:
+            queue = scheduled[job_id]
+            scheduled_time = queue.popleft() if queue else None
+        if scheduled_time is not None:
+            lags.append(started - scheduled_time)
+        original_fire(job_id, source)
+
+    timers.on_fire = on_fire
+    job_scheduler.fire = timed_fire  # _fire_due looks fire up on the instance
+    with quiet():
+        loading = time.perf_counter()
+        job_scheduler.start()
+        load_seconds = time.perf_counter() - loading
+        time.sleep(args.duration)
+        job_scheduler.stop()
+
+    return {
+        "load_seconds": round(load_seconds, 3),
+        "fires": len(lags),
+        "fires_per_second": round(len(lags) / args.duration, 2),
+        # Fires dropped because they were later than SCHEDULER_MISFIRE_GRACE_SECONDS
+        "missed_fires": timers.missed,
+        "wakeups": len(batches),
+        "max_batch": max(batches, default=0),
+        "fire_lag": latency_summary(lags),
+    }
+
+def bench_run_job(args):
+    from sqlalchemy import event
+    from models import Job, SessionLocal, engine
+    from scheduler import job_scheduler
+
+    # One job per thread, so concurrent runs finish together like a busy executor pool
+    seed_catalog(args.threads, history=args.history, command=args.command)
+    counters = collections.Counter()
+    event.listen(engine, "commit", lambda connection: counters.update(["commits"]))
+    event.listen(engine, "before_cursor_execute", lambda *a: counters.update(["statements"]))
+
+    session = SessionLocal()
+    job_ids = [job_id for (job_id,) in session.query(Job.id).order_by(Job.id)]
+    session.close()
+
+    samples = []
+
+    def run_many(job_id, runs):
+        for _ in range(runs):
+            started = time.perf_counter()
+            job_scheduler.run_job(job_id)
+            samples.append(time.perf_counter() - started)
+
+    # --runs in total; the first threads take the remainder
+    share, remainder = divmod(args.runs, args.threads)
+    threads = [
+        threading.Thread(target=run_many, args=(job_id, share + (index < remainder)))
+        for index, job_id in enumerate(job_ids)
+    ]
+    with quiet():
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        job_scheduler.stop()
+
+    return {
+        "run_job": latency_summary(samples),
+        "runs_per_second": round(len(samples) / elapsed, 2),
+        "commits_per_run": round(counters["commits"] / len(samples), 2),
+        "statements_per_run": round(counters["statements"] / len(samples), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scheduler fire lag and run_job cost.")
+    parser.add_argument("mode", choices=["fire-lag", "run-job"])
+    parser.add_argument("--jobs", type=int, default=1000, help="fire-lag: jobs due at every tick (unless spread)")
+    parser.add_argument("--period", type=int, default=5, help="fire-lag: seconds between fires (divides 60)")
+    parser.add_argument("--duration", type=float, default=30, help="fire-lag: seconds to run the scheduler")
+    parser.add_argument("--spread", type=float, help="fire-lag: SCHEDULER_SPREAD_WINDOW, seconds to spread the jobs over")
+    parser.add_argument("--runs", type=int, default=200, help="run-job: number of runs")
+    parser.add_argument("--threads", type=int, default=1, help="run-job: executor threads running jobs concurrently")
+    parser.add_argument("--durability", choices=["sync", "group", "async"], help="RUN_STATE_DURABILITY for the run")
+    parser.add_argument("--history", type=int, default=0, help="run-job: existing log entries on the job")
+    parser.add_argument("--command", default="true", help="command the jobs execute (e.g. 'sleep 0.1')")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    env = {}
+    if args.durability:
+        env["RUN_STATE_DURABILITY"] = args.durability
+    if args.spread is not None:
+        env["SCHEDULER_SPREAD_WINDOW"] = args.spread
+    setup_environment(**env)
+    results = run_metadata(args.mode, vars(args))
+    results.update(bench_fire_lag(args) if args.mode == "fire-lag" else bench_run_job(args))
+    results["peak_rss_mb"] = peak_rss_mb()
+    write_results(results, args.output)
+
+if __name__ == "__main__":
+    main()
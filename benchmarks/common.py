@@ -0,0 +1,124 @@
+# common.py
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_ROOT, "app")
+
+def setup_environment(workdir=None, **env):
+    # Point the app at a fresh SQLite DB in a temp dir. Must run before any app module is
+    # imported, because models.py reads DATABASE_URL at import time.
+    workdir = workdir or tempfile.mkdtemp(prefix="scheduler-bench-")
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)  # api.py mounts ./static
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.update({key: str(value) for key, value in env.items()})
+    os.chdir(workdir)
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    return workdir
+
+def seed_catalog(jobs: int, history: int = 0, log_bytes: int = 200, schedule=None, command="true", seed=42):
+    # Bulk-insert a synthetic catalog; each job gets `history` log entries with ~log_bytes of stdout
+    from models import Job, SessionLocal
+
+    rng = random.Random(seed)
+    schedules = [schedule] if schedule else [
+        {"minute": "*/5"}, {"minute": "0"}, {"minute": "*/15"}, {"hour": "2", "minute": "30"}, {"minute": "*/1"},
+    ]
+    now = datetime.datetime.utcnow()
+    log_entries = [
+        {
+            "timestamp": (now - datetime.timedelta(minutes=index)).isoformat(),
+            "stdout": "x" * log_bytes,
+            "stderr": "",
+            "execution_time": round(rng.uniform(0.01, 2.0), 3),
+        }
+        for index in range(history)
+    ]
+    logs = json.dumps(log_entries)
+    rows = [
+        {
+            "name": f"bench-job-{index}",
+            "schedule": json.dumps(rng.choice(schedules)),
+            "command": command,
+            "dependencies": "[]",
+            "status": "scheduled",
+            "logs": logs,
+            "version": 1,
+        }
+        for index in range(jobs)
+    ]
+    session = SessionLocal()
+    try:
+        for start in range(0, len(rows), 5000):
+            session.execute(Job.__table__.insert(), rows[start:start + 5000])
+        session.commit()
+    finally:
+        session.close()
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def latency_summary(samples):
+    # samples in seconds -> milliseconds summary
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3) if samples else None,
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3) if samples else None,
+        "max_ms": round(max(samples) * 1000, 3) if samples else None,
+    }
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+@contextlib.contextmanager
+def quiet():
+    # The app prints on every request; keep that out of the benchmark output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def run_metadata(name, params):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "benchmark": name,
+        "params": params,
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "started_at": datetime.datetime.utcnow().isoformat(),
+    }
+
+def write_results(results, output=None):
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, "w") as output_file:
+            output_file.write(text + "\n")
+    print(text)
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,36 @@
+# compare.py
+# Compare two benchmark result files: python compare.py before.json after.json
+import argparse
+import json
+
+def numeric_leaves(data, prefix=""):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key in ("params", "started_at", "commit"):
+                continue
+            yield from numeric_leaves(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        yield prefix, data
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as before_file, open(args.after) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    if before.get("params") != after.get("params"):
+        print("warning: the runs used different parameters")
+
+    after_values = dict(numeric_leaves(after))
+    print(f"{'metric':<50} {'before':>12} {'after':>12} {'change':>9}")
+    for path, old in numeric_leaves(before):
+        new = after_values.get(path)
+        if new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{path:<50} {old:>12g} {new:>12g} {change:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# run_all.py
+# Run the standard benchmark matrix, one process per configuration (each needs a fresh DB),
+# and collect everything into one JSON file that compare.py can diff against another run.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import run_metadata, write_results
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MATRIX = {
+    "api_1k_h10": ["bench_api.py", "--jobs", "1000", "--history", "10"],
+    "api_1k_h200": ["bench_api.py", "--jobs", "1000", "--history", "200"],
+    "api_10k_h10": ["bench_api.py", "--jobs", "10000", "--history", "10", "--list-requests", "5"],
+    "api_50k_h0": ["bench_api.py", "--jobs", "50000", "--history", "0", "--list-requests", "3"],
+    "fire_lag_1k": ["bench_scheduler.py", "fire-lag", "--jobs", "1000", "--duration", "60"],
+    "fire_lag_100k": ["bench_scheduler.py", "fire-lag", "--jobs", "100000", "--period", "10", "--spread", "10", "--duration", "60"],
+    "run_job_true": ["bench_scheduler.py", "run-job", "--command", "true"],
+    "run_job_h500": ["bench_scheduler.py", "run-job", "--history", "500"],
+    "run_job_32t_sync": ["bench_scheduler.py", "run-job", "--threads", "32", "--runs", "1600", "--durability", "sync"],
+    "run_job_32t_group": ["bench_scheduler.py", "run-job", "--threads", "32", "--runs", "1600", "--durability", "group"],
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark matrix.")
+    parser.add_argument("--only", nargs="*", choices=sorted(MATRIX), help="run a subset")
+    parser.add_argument("--output", default="benchmark-results.json")
+    args = parser.parse_args()
+
+    results = run_metadata("all", {"only": args.only})
+    results["runs"] = {}
+    for name in args.only or MATRIX:
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            command = [sys.executable, os.path.join(HERE, MATRIX[name][0]), *MATRIX[name][1:], "--output", output.name]
+            print(f"running {name}...", file=sys.stderr)
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+            with open(output.name) as result_file:
+                results["runs"][name] = json.load(result_file)
+    write_results(results, args.output)
+
+if __name__ == "__main__":
+    main()